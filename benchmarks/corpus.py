@@ -0,0 +1,101 @@
+import os
+import random
+
+# Real terms are mixed into the synthetic vocabulary so that queries look like the ones the agent sends
+DOMAIN_TERMS = [
+    "mechanical", "waves", "tissue", "expansion", "monolayer", "traction", "stress", "strain",
+    "jamming", "fluidization", "reinforcement", "epithelial", "cadherin", "vinculin", "myosin",
+    "actin", "substrate", "stiffness", "velocity", "propagation", "collective", "migration",
+    "kymograph", "microscopy", "adhesion", "junction", "viscoelastic", "rheology", "gradient",
+]
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "zen", "dor", "pha", "qui", "bel", "tran", "sor"]
+
+
+def build_vocabulary(size: int = 5000, seed: int = 0) -> list[str]:
+    """
+    Returns a deterministic vocabulary of pseudo-words, domain terms first.
+    """
+    rng = random.Random(seed)
+    words, seen = list(DOMAIN_TERMS), set(DOMAIN_TERMS)
+    while len(words) < size:
+        word = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+class CorpusGenerator:
+    """
+    Writes synthetic markdown knowledge bases.
+
+    Word frequencies follow a Zipf law, like natural text, so that BM25 postings have a
+    realistic mix of very common and rare terms. Every file starts with a heading and
+    alternates sections and paragraphs, and everything is derived from the seed.
+    """
+    def __init__(self, seed: int = 0, vocabulary_size: int = 5000, words_per_paragraph: tuple[int, int] = (40, 120)):
+        self.seed = seed
+        self.words_per_paragraph = words_per_paragraph
+        self.vocabulary = build_vocabulary(vocabulary_size, seed)
+        self._weights = [1.0 / rank for rank in range(1, len(self.vocabulary) + 1)]
+
+    def paragraph(self, rng: random.Random) -> str:
+        count = rng.randint(*self.words_per_paragraph)
+        words = rng.choices(self.vocabulary, weights=self._weights, k=count)
+        words[0] = words[0].capitalize()
+        return " ".join(words) + "."
+
+    def write(self, kb_dir: str, paragraphs: int, paragraphs_per_file: int = 100, name_prefix: str = "synthetic",
+              seed: int | None = None) -> list[str]:
+        """
+        Writes `paragraphs` paragraphs (headings included) into .md files under `kb_dir`.
+
+        Args:
+            kb_dir: The knowledge base directory, created if needed.
+            paragraphs: The total number of paragraphs to write.
+            paragraphs_per_file: The number of paragraphs per file.
+            name_prefix: The prefix of the file names.
+            seed: Overrides the generator's seed, to add files with different content to a corpus.
+
+        Returns:
+            The paths of the written files.
+        """
+        os.makedirs(kb_dir, exist_ok=True)
+        rng = random.Random(self.seed if seed is None else seed)
+        paths = []
+        written, file_no = 0, 0
+        while written < paragraphs:
+            count = min(paragraphs_per_file, paragraphs - written)
+            blocks = [f"# {rng.choice(DOMAIN_TERMS).capitalize()} study {file_no}"]
+            while len(blocks) < count:
+                if len(blocks) % 10 == 1:
+                    blocks.append(f"## Section {len(blocks) // 10 + 1}: {' '.join(rng.sample(DOMAIN_TERMS, 2))}")
+                else:
+                    blocks.append(self.paragraph(rng))
+            path = os.path.join(kb_dir, f"{name_prefix}_{file_no:05d}.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n\n".join(blocks) + "\n")
+            paths.append(path)
+            written += count
+            file_no += 1
+        return paths
+
+    def queries(self, kb_dir: str, count: int, seed: int | None = None) -> list[str]:
+        """
+        Returns search queries for a generated knowledge base: half are phrases taken from
+        its paragraphs (so they have an exact match), half are random domain-term pairs.
+        """
+        rng = random.Random(self.seed + 1 if seed is None else seed)
+        files = sorted(name for name in os.listdir(kb_dir) if name.endswith(".md"))
+        queries = []
+        for i in range(count):
+            if i % 2 == 0 and files:
+                with open(os.path.join(kb_dir, rng.choice(files)), "r", encoding="utf-8") as f:
+                    paragraphs = [p for p in f.read().split("\n\n") if not p.startswith("#")]
+                words = rng.choice(paragraphs).rstrip(".").split()
+                length = min(len(words), rng.randint(3, 6))
+                start = rng.randint(0, len(words) - length)
+                queries.append(" ".join(words[start:start + length]).lower())
+            else:
+                queries.append(" ".join(rng.sample(DOMAIN_TERMS, 2)))
+        return queries
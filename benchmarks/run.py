@@ -0,0 +1,253 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+# Benchmarks are run as `python -m benchmarks.run` from the repository root
+from benchmarks.corpus import CorpusGenerator
+from benchmarks.stub_server import StubChatServer
+from core.agent import ResearchAgent
+from core.streaming import EVENT_FINAL
+from core.tracing import percentile
+from tools.kb_index import KnowledgeBaseIndex, get_index
+from tools.knowledge_base import search_knowledge_base
+from tools.vector_store import get_vector_index, semantic_search_knowledge_base
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# Scoring every paragraph is only benchmarked on corpora small enough for it to finish quickly
+EXHAUSTIVE_MAX_PARAGRAPHS = 10_000
+
+
+def summarize(durations: list[float]) -> dict:
+    """
+    Returns the count, mean and percentiles of durations given in seconds, in milliseconds.
+    """
+    if not durations:
+        return {"count": 0}
+    # Nearest-rank percentiles, computed as the app's tracer does
+    return {
+        "count": len(durations),
+        "mean_ms": round(sum(durations) / len(durations) * 1000, 3),
+        "p50_ms": round(percentile(durations, 50) * 1000, 3),
+        "p95_ms": round(percentile(durations, 95) * 1000, 3),
+        "p99_ms": round(percentile(durations, 99) * 1000, 3),
+        "max_ms": round(max(durations) * 1000, 3),
+    }
+
+
+def _timed(fn, *args, **kwargs) -> tuple[object, float]:
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def _peak_python_memory(fn, *args, **kwargs) -> int:
+    """
+    Runs `fn` under tracemalloc and returns the peak of Python allocations, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        fn(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _max_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_indexing(kb_dir: str, generator: CorpusGenerator, measure_memory: bool = True) -> dict:
+    """
+    Measures full and incremental indexing of a knowledge base, and loading the index from disk.
+    """
+    index, bm25_seconds = _timed(get_index, kb_dir, force_rebuild=True)
+    paragraphs = len(index.chunks)
+    _, load_seconds = _timed(KnowledgeBaseIndex(kb_dir).load)
+    _, vector_seconds = _timed(get_vector_index, kb_dir)
+
+    # One new file on top of the existing corpus (another seed, or it would be skipped as a duplicate)
+    generator.write(kb_dir, 100, name_prefix="incremental", seed=generator.seed + 1)
+    _, incremental_seconds = _timed(get_index, kb_dir)
+    _, vector_incremental_seconds = _timed(get_vector_index, kb_dir)
+
+    results = {
+        "paragraphs": paragraphs,
+        "bm25_build_s": round(bm25_seconds, 3),
+        "bm25_paragraphs_per_s": round(paragraphs / bm25_seconds, 1) if bm25_seconds else None,
+        "bm25_load_s": round(load_seconds, 3),
+        "bm25_incremental_100_s": round(incremental_seconds, 3),
+        "vector_build_s": round(vector_seconds, 3),
+        "vector_paragraphs_per_s": round(paragraphs / vector_seconds, 1) if vector_seconds else None,
+        "vector_incremental_100_s": round(vector_incremental_seconds, 3),
+    }
+    if measure_memory:
+        # A separate build, since tracing allocations slows it down
+        results["bm25_build_peak_python_mb"] = round(
+            _peak_python_memory(get_index, kb_dir, force_rebuild=True) / 1024 / 1024, 1)
+    return results
+
+
+def bench_search(kb_dir: str, queries: list[str], paragraphs: int) -> dict:
+    """
+    Measures the latency of every search mode over the same queries (after one warm-up query each).
+    """
+    modes = {
+        "bm25_rerank": lambda q: search_knowledge_base.invoke({"query": q, "knowledge_base_dir": kb_dir}),
+        "bm25_only": lambda q: search_knowledge_base.invoke({"query": q, "knowledge_base_dir": kb_dir, "rerank": False}),
+        "semantic": lambda q: semantic_search_knowledge_base.invoke({"query": q, "knowledge_base_dir": kb_dir}),
+    }
+    if paragraphs <= EXHAUSTIVE_MAX_PARAGRAPHS:
+        modes["exhaustive"] = lambda q: search_knowledge_base.invoke(
+            {"query": q, "knowledge_base_dir": kb_dir, "exhaustive": True})
+
+    results = {}
+    for name, search in modes.items():
+        search(queries[0])
+        results[name] = summarize([_timed(search, query)[1] for query in queries])
+    return results
+
+
+def bench_agent(kb_dir: str, turns: int, latency: float, token_delay: float, answer_words: int) -> dict:
+    """
+    Drives full agent turns (one knowledge base search, then a streamed answer) against the stub server.
+
+    Also runs `achat` turns in which the model asks for three searches at once, to
+    measure how well tool calls overlap.
+    """
+    results = {}
+    with StubChatServer(latency=latency, token_delay=token_delay, answer_words=answer_words,
+                        tool_args={"knowledge_base_dir": kb_dir}) as server:
+        agent = ResearchAgent(model="stub", api_key="stub", api_base=server.base_url)
+        ttfts, totals = [], []
+        for turn in range(turns):
+            for event in agent.stream_chat(f"How do mechanical waves propagate in tissue {turn}?"):
+                if event["type"] == EVENT_FINAL:
+                    ttfts.append(event["ttft"])
+                    totals.append(event["total"])
+            agent.history.clear()  # Every turn starts from the same context size
+        agent.close()
+        results["stream_chat"] = {"ttft": summarize([t for t in ttfts if t is not None]), "total": summarize(totals),
+                                  "requests": server.requests}
+
+    with StubChatServer(latency=latency, token_delay=token_delay, answer_words=answer_words,
+                        tool_args={"knowledge_base_dir": kb_dir}, tool_calls_per_turn=3) as server:
+        async def run_turns():
+            agent = ResearchAgent(model="stub", api_key="stub", api_base=server.base_url)
+            durations = []
+            for turn in range(turns):
+                started = time.perf_counter()
+                await agent.achat(f"Compare jamming and fluidization {turn}")
+                durations.append(time.perf_counter() - started)
+                agent.history.clear()
+            await agent.aclose()
+            return durations
+        results["achat_3_tool_calls"] = {"total": summarize(asyncio.run(run_turns()))}
+    return results
+
+
+def run(sizes: list[int], queries: int, turns: int, latency: float, token_delay: float,
+        answer_words: int, measure_memory: bool = True, seed: int = 0, work_dir: str | None = None) -> dict:
+    """
+    Runs the whole suite and returns its results.
+
+    Args:
+        sizes: The corpus sizes to benchmark, in paragraphs.
+        queries: The number of search queries per search mode and size.
+        turns: The number of agent turns per size (0 to skip the agent benchmark).
+        latency: The stub server's delay before every response, in seconds.
+        token_delay: The stub server's delay between streamed chunks, in seconds.
+        answer_words: The length of the stub server's answers.
+        measure_memory: Whether to measure the peak memory of indexing (one extra build).
+        seed: The seed of the synthetic corpora and queries.
+        work_dir: Where to write the corpora; a temporary directory by default.
+
+    Returns:
+        A JSON-serializable dict: run metadata, settings and one entry per size.
+    """
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {"sizes": sizes, "queries": queries, "turns": turns, "latency_s": latency,
+                     "token_delay_s": token_delay, "answer_words": answer_words, "seed": seed},
+        "sizes": {},
+    }
+    base_dir = work_dir or tempfile.mkdtemp(prefix="kb-bench-")
+    try:
+        for size in sizes:
+            kb_dir = os.path.join(base_dir, f"kb_{size}")
+            shutil.rmtree(kb_dir, ignore_errors=True)
+            generator = CorpusGenerator(seed=seed)
+            _, generate_seconds = _timed(generator.write, kb_dir, size)
+            entry = {"generate_s": round(generate_seconds, 3)}
+            print(f"[{size} paragraphs] indexing...", file=sys.stderr)
+            entry["indexing"] = bench_indexing(kb_dir, generator, measure_memory)
+            print(f"[{size} paragraphs] searching...", file=sys.stderr)
+            entry["search"] = bench_search(kb_dir, generator.queries(kb_dir, queries), entry["indexing"]["paragraphs"])
+            if turns:
+                print(f"[{size} paragraphs] agent turns...", file=sys.stderr)
+                entry["agent"] = bench_agent(kb_dir, turns, latency, token_delay, answer_words)
+            entry["max_rss_mb"] = _max_rss_mb()
+            results["sizes"][str(size)] = entry
+    finally:
+        if work_dir is None:
+            shutil.rmtree(base_dir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark knowledge base search, indexing and agent turns")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Corpus sizes in paragraphs (100 to 100000)")
+    parser.add_argument("--queries", type=int, default=50, help="Search queries per mode and size")
+    parser.add_argument("--turns", type=int, default=10, help="Agent turns per size (0 to skip)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub server delay before each response, in seconds")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Stub server delay between streamed chunks, in seconds")
+    parser.add_argument("--answer-words", type=int, default=200, help="Length of the stub server's answers")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="Keep the generated corpora in this directory")
+    parser.add_argument("-o", "--output", help="Result file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.queries, args.turns, args.latency, args.token_delay, args.answer_words,
+                  measure_memory=not args.no_memory, seed=args.seed, work_dir=args.work_dir)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['meta']['commit'] or 'nocommit'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tools.tokens import estimate_tokens
+
+DEFAULT_ANSWER_WORDS = 200
+
+
+def _question(messages: list[dict]) -> str:
+    """
+    Returns the user's question from the last human message, without the mode instruction
+    and document excerpts that `format_turn_input` puts before it.
+    """
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content") or ""
+            if not isinstance(content, str):
+                content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return content.rsplit("USER QUESTION:", 1)[-1].strip()
+    return ""
+
+
+class StubChatServer:
+    """
+    A local server implementing the parts of the OpenAI chat-completions API the agent uses,
+    with configurable latency, for benchmarks and offline tests.
+
+    For each turn, when the request offers tools and no tool result has been sent since the
+    last user message, the stub asks for `tool_calls_per_turn` calls of `tool_name` with the
+    user's question as the query. Otherwise it answers with a structured response that ends
+    with a `**Final Answer:**` section. Both streaming (server-sent events) and plain
+    responses are supported.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, token_delay: float = 0.0,
+                 answer_words: int = DEFAULT_ANSWER_WORDS, tool_name: str | None = "search_knowledge_base",
+                 tool_args: dict | None = None, tool_calls_per_turn: int = 1):
+        """
+        Args:
+            host: The interface to listen on.
+            port: The port to listen on; 0 picks a free one (see `base_url`).
+            latency: Seconds to wait before the first byte of every response.
+            token_delay: Seconds to wait between two streamed chunks.
+            answer_words: The length of the final answers.
+            tool_name: The tool to call before answering, or None to answer directly.
+            tool_args: Extra arguments of the tool calls, e.g. {"knowledge_base_dir": ...}.
+            tool_calls_per_turn: How many calls of the tool to request in the same step.
+        """
+        self.latency = latency
+        self.token_delay = token_delay
+        self.answer_words = answer_words
+        self.tool_name = tool_name
+        self.tool_args = tool_args or {}
+        self.tool_calls_per_turn = tool_calls_per_turn
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubChatServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-chat-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubChatServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # --- Responses ---
+
+    def reply(self, body: dict) -> tuple[str, list[dict]]:
+        """
+        Decides the response to a chat-completions request.
+
+        Returns:
+            A tuple containing the answer text and the tool calls (one of them is empty).
+        """
+        messages = body.get("messages", [])
+        question = _question(messages)
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        tool_done = any(m.get("role") == "tool" for m in messages[last_user + 1:])
+        offered = {tool.get("function", {}).get("name") for tool in body.get("tools") or []}
+
+        if self.tool_name in offered and not tool_done:
+            query = " ".join(question.split()[:8]) or "research"
+            calls = [{"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                      "function": {"name": self.tool_name, "arguments": json.dumps({"query": query, **self.tool_args})}}
+                     for _ in range(self.tool_calls_per_turn)]
+            return "", calls
+
+        filler = " ".join(["analysis"] * max(0, self.answer_words - 20))
+        answer = (f"**Reasoning:**\n1. **Conceptual Model:** {question[:200]}\n2. **Analysis from Model:** {filler}\n\n"
+                  f"**Final Answer:**\nThis is a synthetic answer about {question[:80] or 'the question'}.")
+        return answer, []
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                text, tool_calls = stub.reply(body)
+                prompt_tokens = estimate_tokens(json.dumps(body.get("messages", [])))
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": estimate_tokens(text or "tool"),
+                         "total_tokens": prompt_tokens + estimate_tokens(text or "tool")}
+                if body.get("stream"):
+                    self._stream(body, text, tool_calls, usage)
+                else:
+                    self._complete(body, text, tool_calls, usage)
+
+            def _complete(self, body, text, tool_calls, usage):
+                message = {"role": "assistant", "content": text or None}
+                if tool_calls:
+                    message["tool_calls"] = tool_calls
+                payload = json.dumps({
+                    "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model", "stub"), "usage": usage,
+                    "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body, text, tool_calls, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+                def send(data):
+                    raw = f"data: {data}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(raw):x}\r\n".encode("ascii") + raw + b"\r\n")
+                    self.wfile.flush()
+
+                def chunk(delta, finish_reason=None, **extra):
+                    return json.dumps({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                                       "model": body.get("model", "stub"),
+                                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra})
+
+                if tool_calls:
+                    send(chunk({"role": "assistant", "tool_calls": [{"index": i, **call} for i, call in enumerate(tool_calls)]}))
+                    send(chunk({}, "tool_calls"))
+                else:
+                    words = text.split(" ")
+                    for i, word in enumerate(words):
+                        send(chunk({"role": "assistant", "content": word if i == 0 else " " + word}))
+                        if stub.token_delay:
+                            time.sleep(stub.token_delay)
+                    send(chunk({}, "stop"))
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    send(json.dumps({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                                     "model": body.get("model", "stub"), "choices": [], "usage": usage}))
+                send("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the OpenAI-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first byte of every response")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--answer-words", type=int, default=DEFAULT_ANSWER_WORDS)
+    parser.add_argument("--tool", default="search_knowledge_base", help="Tool to call before answering ('none' to disable)")
+    parser.add_argument("--tool-calls", type=int, default=1, help="Tool calls requested per step")
+    args = parser.parse_args()
+
+    server = StubChatServer(args.host, args.port, latency=args.latency, token_delay=args.token_delay,
+                            answer_words=args.answer_words, tool_name=None if args.tool == "none" else args.tool,
+                            tool_calls_per_turn=args.tool_calls)
+    print(f"Stub chat-completions server listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
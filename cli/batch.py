@@ -0,0 +1,310 @@
+import asyncio
+import json
+import os
+import random
+import time
+
+import httpx
+import openai
+from rich.console import Console
+
+from cli.reporting import print_prefetch_stats
+from core.agent import ResearchAgent, create_http_clients
+from core.llm_cache import CACHE_MODE_CACHE, CACHE_MODE_REPLAY, DEFAULT_MAX_SIZE_MB, SQLiteLLMCache
+from core.prefetch import KnowledgePrefetcher
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+# Failures worth another attempt: throttling, timeouts, dropped connections and server errors
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    httpx.TransportError,
+    asyncio.TimeoutError,
+)
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+
+class RateLimiter:
+    """
+    Client-side rate limiting: spaces out request starts to at most `per_minute` per minute.
+    """
+    def __init__(self, per_minute: float | None = None):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def parse_item(line: str, line_no: int) -> dict:
+    """
+    Reads one input line.
+
+    An item is a JSON object with a "question" (or "input", or a "title" and "body"),
+    and optionally an "id" (or "request_id") and a "mode". Items without an id are
+    identified by their line number.
+
+    Returns:
+        A dict with "id", "question" and "mode", plus "error" if the line is unusable.
+    """
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"id": f"line-{line_no}", "question": None, "mode": None, "error": f"Invalid JSON: {e}"}
+    if not isinstance(data, dict):
+        return {"id": f"line-{line_no}", "question": None, "mode": None, "error": "Item is not a JSON object"}
+
+    item_id = str(data.get("id") or data.get("request_id") or f"line-{line_no}")
+    question = data.get("question") or data.get("input")
+    if not question and (data.get("title") or data.get("body")):
+        question = "\n\n".join(part for part in (data.get("title"), data.get("body")) if part)
+    item = {"id": item_id, "question": question, "mode": data.get("mode")}
+    if not question:
+        item["error"] = "Item has no question"
+    return item
+
+
+def iter_items(input_path: str):
+    """
+    Yields the items of a JSONL file one at a time, skipping blank lines.
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if line.strip():
+                yield parse_item(line, line_no)
+
+
+def load_completed(output_path: str) -> set[str]:
+    """
+    Returns the ids already answered successfully in an output file, so that a run can resume.
+    A truncated last line (left by a crash) is ignored.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == STATUS_OK:
+                completed.add(record["id"])
+    return completed
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def backoff_delay(attempt: int, error: Exception | None = None) -> float:
+    """
+    Returns how long to wait before retrying: the server's Retry-After if it sent one,
+    otherwise an exponential backoff with jitter.
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+async def process_item(item: dict, agent_factory, limiter: RateLimiter, max_retries: int = 3,
+                       timeout: float | None = None, default_mode: str | None = None) -> dict:
+    """
+    Runs one item through a fresh agent session, retrying transient failures.
+
+    Args:
+        item: An item from `parse_item`.
+        agent_factory: A callable returning a new ResearchAgent.
+        limiter: The rate limiter shared by all workers.
+        max_retries: Additional attempts after a retryable failure.
+        timeout: The maximum duration of one attempt, in seconds.
+        default_mode: The mode used when the item does not set one.
+
+    Returns:
+        The output record of the item.
+    """
+    record = {"id": item["id"], "question": item["question"], "status": STATUS_ERROR,
+              "output": None, "error": item.get("error"), "attempts": 0}
+    if item.get("error"):
+        return record
+
+    started = time.perf_counter()
+    for attempt in range(1, max_retries + 2):
+        await limiter.acquire()
+        record["attempts"] = attempt
+        agent = None
+        try:
+            agent = agent_factory()
+            turn = agent.achat(item["question"], mode=item.get("mode") or default_mode, raise_errors=True)
+            record["output"] = await asyncio.wait_for(turn, timeout)
+            record["status"] = STATUS_OK
+            record["error"] = None
+            break
+        except RETRYABLE_ERRORS as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            if attempt > max_retries:
+                break
+            await asyncio.sleep(backoff_delay(attempt, e))
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            break
+        finally:
+            if agent is not None:
+                cache = getattr(agent, "cache", None)
+                if cache is not None:
+                    record["cache"] = {"hits": cache.hits, "misses": cache.misses}
+                await agent.aclose()
+    record["latency"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+async def run_batch(input_path: str, output_path: str, agent_factory, concurrency: int = 4,
+                    rate_per_minute: float | None = None, max_retries: int = 3, timeout: float | None = 300.0,
+                    default_mode: str | None = None, on_result=None) -> dict:
+    """
+    Runs every item of a JSONL file through the agent and appends one JSON record per item to the output.
+
+    The input is streamed, at most `concurrency` items are in flight at a time, and each
+    record is flushed as soon as its item is done. Items already answered successfully in
+    the output file are skipped, so an interrupted run can simply be started again;
+    failed items are attempted again and their new record is appended (the last record of
+    an id wins).
+
+    Args:
+        input_path: The JSONL file of questions (see `parse_item`).
+        output_path: The JSONL file of results.
+        agent_factory: A callable returning a new ResearchAgent for each attempt.
+        concurrency: The maximum number of items processed at the same time.
+        rate_per_minute: The maximum number of attempts started per minute, or None for no limit.
+        max_retries: Additional attempts after a retryable failure.
+        timeout: The maximum duration of one attempt, in seconds.
+        default_mode: The mode used for items that do not set one.
+        on_result: An optional callable receiving each output record.
+
+    Returns:
+        A dict with the "ok", "failed" and "skipped" counts and the "elapsed" time in seconds.
+    """
+    completed = load_completed(output_path)
+    limiter = RateLimiter(rate_per_minute)
+    pending = asyncio.Queue(maxsize=concurrency * 2)
+    summary = {"ok": 0, "failed": 0, "skipped": 0, "elapsed": 0.0}
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        if out.tell() > 0 and not _ends_with_newline(output_path):
+            out.write("\n")  # Terminate a line truncated by a crash so the next record stays readable
+
+        def write(record: dict):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            summary["ok" if record["status"] == STATUS_OK else "failed"] += 1
+            if on_result is not None:
+                on_result(record)
+
+        async def worker():
+            while True:
+                item = await pending.get()
+                if item is None:
+                    return
+                write(await process_item(item, agent_factory, limiter, max_retries, timeout, default_mode))
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            for item in iter_items(input_path):
+                if item["id"] in completed:
+                    summary["skipped"] += 1
+                    continue
+                await pending.put(item)
+            for _ in workers:
+                await pending.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    summary["elapsed"] = time.perf_counter() - started
+    return summary
+
+
+def run_batch_command(args, cache_path: str | None = None, cache_mode: str = CACHE_MODE_CACHE,
+                      cache_size_mb: float = DEFAULT_MAX_SIZE_MB):
+    """
+    Entry point of `python main.py batch`: runs a JSONL file of questions without any prompt.
+
+    Args:
+        args: The parsed command line.
+        cache_path: The SQLite file of the response cache shared by all sessions, or None.
+        cache_mode: "cache", or "replay" to only serve recorded responses.
+        cache_size_mb: The maximum size of the response cache.
+    """
+    console = Console()
+    if not args.api_key and cache_mode == CACHE_MODE_REPLAY:
+        args.api_key = "unused-in-replay-mode"  # Every response comes from the cache
+    if not args.api_key:
+        console.print("[bold red]Error: No API key. Pass --api-key or set OPENAI_API_KEY.[/bold red]")
+        return 1
+    if not os.path.isfile(args.input):
+        console.print(f"[bold red]Error: Input file not found at {args.input}[/bold red]")
+        return 1
+    output_path = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+
+    def agent_factory():
+        # Each session has its own cache handle, and so its own hit and miss counters
+        cache = SQLiteLLMCache(cache_path, mode=cache_mode, max_size_mb=cache_size_mb) if cache_path else None
+        return ResearchAgent(model=args.model, api_key=args.api_key, api_base=args.api_base,
+                             http_client=http_client, http_async_client=http_async_client, cache=cache,
+                             prefetcher=prefetcher)
+
+    def on_result(record: dict):
+        if record["status"] == STATUS_OK:
+            console.print(f"[green]✓ {record['id']}[/green] [dim]({record['latency']}s, {record['attempts']} attempt(s))[/dim]")
+        else:
+            console.print(f"[red]✗ {record['id']}: {record['error']}[/red]")
+
+    async def main():
+        try:
+            return await run_batch(args.input, output_path, agent_factory, concurrency=args.concurrency,
+                                   rate_per_minute=args.rpm, max_retries=args.retries, timeout=args.timeout,
+                                   default_mode=args.mode, on_result=on_result)
+        finally:
+            await http_async_client.aclose()
+
+    # One prefetcher for all sessions, so that its counters cover the whole run
+    prefetcher = KnowledgePrefetcher() if args.prefetch else None
+    # One pool of connections for all sessions, sized for the concurrency
+    http_client, http_async_client = create_http_clients(max_connections=args.concurrency * 2)
+    console.print(f"[bold cyan]Running {args.input} → {output_path} (concurrency {args.concurrency}"
+                  f"{f', {args.rpm} questions/min' if args.rpm else ''})[/bold cyan]")
+    try:
+        summary = asyncio.run(main())
+    finally:
+        http_client.close()
+
+    processed = summary["ok"] + summary["failed"]
+    rate = processed / summary["elapsed"] * 3600 if summary["elapsed"] > 0 else 0.0
+    console.print(f"[bold]Done: {summary['ok']} answered, {summary['failed']} failed, {summary['skipped']} already done, "
+                  f"in {summary['elapsed']:.1f}s ({rate:.0f} questions/hour).[/bold]")
+    if prefetcher is not None:
+        print_prefetch_stats(console, prefetcher)
+    return 0 if summary["failed"] == 0 else 2
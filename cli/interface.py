@@ -1,16 +1,252 @@
 from rich.console import Console
-from rich.markdown import Markdown
+from rich.live import Live
 from rich.prompt import Prompt
-from langchain_core.messages import HumanMessage
+from rich.table import Table
+from rich.text import Text
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import time
 
-from core.agent import ResearchAgent
-from tools.file_io import read_file, add_file_to_kb, save_session_history
+# The agent, the tools and their dependencies (langchain, openai, faiss) are slow to import:
+# they are imported where they are used, after `preload_modules` loaded them in the background
+from cli.reporting import print_prefetch_stats
+from cli.startup import preload_modules
+from core.defaults import (CACHE_MODE_CACHE, DEFAULT_MAX_SIZE_MB, DEFAULT_TRACE_PATH, EVENT_ERROR, EVENT_FINAL,
+                           EVENT_LLM_START, EVENT_TOKEN, EVENT_TOOL_START)
 
-def run_cli():
+# Spans of the CLI phases, next to the agent's "llm", "tool.<name>" and "agent.*" spans
+SPAN_CLI_COMMAND = "cli.command"
+SPAN_CLI_TURN = "cli.turn"
+SPAN_CLI_RENDER = "cli.render"
+
+def print_kb_status(console: Console, status: dict):
+    """
+    Renders the state of the background ingestion worker for `!kb_status`.
+    """
+    for namespace in status["namespaces"]:
+        index = namespace["index"]
+        if index is None:
+            console.print(f"[italic]Knowledge base index ({namespace['namespace']}): not loaded yet.[/italic]")
+        else:
+            console.print(f"[italic]Knowledge base index ({namespace['namespace']}): {index['files']} file(s), "
+                          f"{index['chunks']} paragraph(s), generation {index['generation']}.[/italic]")
+    watching = status["watching"]
+    console.print(f"[italic]Watching knowledge_base/: {f'every {watching}s' if watching else 'off'}[/italic]")
+
+    if not status["jobs"]:
+        console.print("[italic]No ingestion jobs yet.[/italic]")
+        return
+    table = Table(title="Ingestion jobs")
+    table.add_column("#", justify="right")
+    table.add_column("Source")
+    table.add_column("Status")
+    table.add_column("Progress", justify="right")
+    table.add_column("Added", justify="right")
+    table.add_column("Skipped", justify="right")
+    table.add_column("Errors", justify="right")
+    for job in status["jobs"]:
+        progress = f"{job['done']}/{job['total']}" if job["total"] else "-"
+        table.add_row(str(job["id"]), job["source"], job["status"], progress,
+                      str(job["added"]), str(job["skipped"]), str(len(job["errors"])))
+    console.print(table)
+
+def print_namespaces(console: Console, kb_dir: str, active: list[str] | None):
+    """
+    Renders the knowledge base namespaces and their index shards for `!ns`.
+    """
+    from tools.kb_index import get_index_if_loaded
+    from tools.kb_manifest import scan_directory
+    from tools.kb_namespaces import list_namespaces, namespace_dir
+
+    names = list_namespaces(kb_dir)
+    if not names:
+        console.print("[italic]No knowledge base yet. Use !add_kb <path> to create it.[/italic]")
+        return
+    table = Table(title="Knowledge base namespaces")
+    table.add_column("Namespace")
+    table.add_column("Files", justify="right")
+    table.add_column("Paragraphs", justify="right")
+    table.add_column("Searched")
+    for name in names:
+        shard_dir = namespace_dir(kb_dir, name)
+        index = get_index_if_loaded(shard_dir)
+        table.add_row(name, str(len(scan_directory(shard_dir))), str(len(index.chunks)) if index is not None else "-",
+                      "yes" if active is None or name in active else "")
+    console.print(table)
+    console.print(f"[italic]Searching {'all namespaces' if active is None else ', '.join(active)}. "
+                  f"Use !ns use <name> [<name> ...] or !ns use all to change it.[/italic]")
+
+def print_history_usage(console: Console, history):
+    """
+    Renders the token accounting of the conversation history for `!history`.
+    """
+    usage = history.last_usage
+    if usage is None:
+        console.print("[italic]No turn has been sent yet.[/italic]")
+    else:
+        console.print(f"[italic]Last turn: {usage['sent_tokens']} history tokens sent instead of {usage['raw_tokens']} "
+                      f"({usage['saved_tokens']} saved) — summary {usage['summary_tokens']}, pinned {usage['pinned_tokens']}, "
+                      f"recent {usage['verbatim_tokens']} in {usage['verbatim_messages']} message(s).[/italic]")
+    totals = history.totals
+    console.print(f"[italic]Session: {totals['sent_tokens']} of {totals['raw_tokens']} history tokens sent over {totals['turns']} turn(s); "
+                  f"{history.summarized_upto} message(s) summarized, {len(history.pinned)} pinned, budget {history.token_budget}.[/italic]")
+
+def print_session_documents(console: Console, working_memory):
+    """
+    Renders the documents loaded into the session for `!docs`.
+    """
+    documents = working_memory.list_documents()
+    if not documents:
+        console.print("[italic]No session documents loaded. Use !load_session <path> to load one.[/italic]")
+        return
+    table = Table(title="Session documents")
+    table.add_column("#", justify="right")
+    table.add_column("Name")
+    table.add_column("Paragraphs", justify="right")
+    table.add_column("Tokens", justify="right")
+    for document in documents:
+        table.add_row(str(document["id"]), document["name"], str(document["paragraphs"]), str(document["tokens"]))
+    console.print(table)
+    console.print(f"[italic]Up to {working_memory.token_budget} tokens of relevant excerpts are sent per turn.[/italic]")
+
+def render_streamed_answer(console: Console, events, tracer=None):
+    """
+    Renders the events of `ResearchAgent.stream_chat` as they arrive: tool calls as one-line
+    notes, and the answer as live-updating markdown showing only the final answer once the
+    `**Final Answer:**` marker has streamed in.
+
+    The time spent rendering (not waiting for events) is recorded as a "cli.render" span.
+    """
+    from rich.markdown import Markdown
+    from core.streaming import FinalAnswerStream
+
+    answer = FinalAnswerStream()
+    final = None
+    render_seconds = 0.0
+    with Live(Text("Thinking...", style="bold green"), console=console,
+              refresh_per_second=12, vertical_overflow="visible") as live:
+        for event in events:
+            handling_started = time.perf_counter()
+            if event["type"] == EVENT_LLM_START:
+                # Only the last model call of a turn produces the answer
+                answer.reset()
+            elif event["type"] == EVENT_TOKEN:
+                answer.feed(event["text"])
+                live.update(Markdown(answer.display_text))
+            elif event["type"] == EVENT_TOOL_START:
+                tool_input = " ".join(str(event["input"]).split())
+                console.print(f"[dim]→ {event['name']}({tool_input[:100]}{'...' if len(tool_input) > 100 else ''})[/dim]")
+                live.update(Text("Thinking...", style="bold green"))
+            elif event["type"] == EVENT_FINAL:
+                # The complete output is authoritative, e.g. if the server did not stream
+                answer.reset()
+                answer.feed(event["output"])
+                live.update(Markdown(answer.display_text))
+                final = event
+            elif event["type"] == EVENT_ERROR:
+                live.update(Text(event["message"]))
+            render_seconds += time.perf_counter() - handling_started
+        closing_started = time.perf_counter()
+    render_seconds += time.perf_counter() - closing_started
+    if tracer is not None:
+        tracer.record(SPAN_CLI_RENDER, render_seconds)
+    if final is not None:
+        ttft = f"first token after {final['ttft']:.2f}s, " if final["ttft"] is not None else ""
+        console.print(f"[dim]({ttft}complete after {final['total']:.2f}s)[/dim]")
+
+def print_sessions(console: Console, sessions: list[dict], current_id: str):
+    """
+    Renders the recorded sessions for `!sessions`.
+    """
+    if not sessions:
+        console.print("[italic]No recorded sessions yet.[/italic]")
+        return
+    table = Table(title="Recorded sessions")
+    table.add_column("ID")
+    table.add_column("Last turn")
+    table.add_column("Turns", justify="right")
+    for session in sessions:
+        name = f"{session['id']} (current)" if session["id"] == current_id else session["id"]
+        table.add_row(name, datetime.fromtimestamp(session["updated"]).strftime("%Y-%m-%d %H:%M"),
+                      str(session["turns"] if session["turns"] is not None else "?"))
+    console.print(table)
+
+def print_trace_stats(console: Console, tracer):
+    """
+    Renders the latency percentiles of every traced phase of the session for `!stats`.
+    """
+    if not tracer.enabled:
+        console.print("[italic]Tracing is off. Start without --no-trace to enable it.[/italic]")
+        return
+    stats = tracer.stats()
+    if not stats["phases"]:
+        console.print("[italic]Nothing has been traced yet.[/italic]")
+        return
+    table = Table(title=f"Session latency ({stats['turns']} turn(s))")
+    table.add_column("Phase")
+    table.add_column("Count", justify="right")
+    table.add_column("p50 (ms)", justify="right")
+    table.add_column("p95 (ms)", justify="right")
+    table.add_column("Total (ms)", justify="right")
+    for name, phase in stats["phases"].items():
+        table.add_row(name, str(phase["count"]), f"{phase['p50_ms']:.1f}", f"{phase['p95_ms']:.1f}", f"{phase['total_ms']:.1f}")
+    console.print(table)
+    totals = stats["totals"]
+    console.print(f"[italic]Tokens: {totals['prompt_tokens']} prompt, {totals['completion_tokens']} completion; "
+                  f"tool output: {totals['tool_output_bytes']} bytes.[/italic]")
+    if tracer.writer is not None:
+        console.print(f"[italic]Spans are written to {tracer.writer.path}.[/italic]")
+
+def print_cache_stats(console: Console, cache):
+    """
+    Renders the response cache counters of the session for `!cache`.
+    """
+    if cache is None:
+        console.print("[italic]The response cache is off. Start with --cache to enable it.[/italic]")
+        return
+    stats = cache.stats()
+    console.print(f"[italic]Response cache ({stats['mode']} mode, {stats['path']}): {stats['hits']} hit(s), "
+                  f"{stats['misses']} miss(es) this session ({stats['hit_rate']:.0%} hit rate); "
+                  f"{stats['entries']} response(s), {stats['size_bytes'] / 1024 / 1024:.1f} MB on disk, "
+                  f"{stats['evictions']} evicted this session.[/italic]")
+
+def _build_session(model_name: str, api_key: str, api_base: str, tracer, cache_path: str | None,
+                   cache_mode: str, cache_size_mb: float, prefetch: bool = False):
+    """
+    Builds the agent and the ingestion worker of an interactive session.
+
+    Returns:
+        A tuple containing the ResearchAgent, the IngestionWorker and the SessionStore.
+    """
+    from core.agent import ResearchAgent
+    from core.llm_cache import SQLiteLLMCache
+    from core.prefetch import KnowledgePrefetcher
+    from core.session_store import SessionStore
+    from tools.ingest import IngestionWorker
+
+    cache = SQLiteLLMCache(cache_path, mode=cache_mode, max_size_mb=cache_size_mb) if cache_path else None
+    sessions = SessionStore()
+    agent = ResearchAgent(model=model_name, api_key=api_key, api_base=api_base, cache=cache, tracer=tracer,
+                          session=sessions.new_session(), prefetcher=KnowledgePrefetcher() if prefetch else None)
+    return agent, IngestionWorker(), sessions # The worker imports files into the knowledge base in the background
+
+def run_cli(cache_path: str | None = None, cache_mode: str = CACHE_MODE_CACHE, cache_size_mb: float = DEFAULT_MAX_SIZE_MB,
+            trace_path: str | None = DEFAULT_TRACE_PATH, tracing: bool = True, prefetch: bool = False):
     """
     The main function to run the command-line interface.
+
+    Args:
+        trace_path: The rotating JSONL file spans are written to, or None to keep them in memory only.
+        tracing: Whether to trace the session at all (`!stats`).
+        prefetch: Whether to search the knowledge base for each question before the first model call.
+        cache_path: The SQLite file of the response cache, or None to always call the model.
+        cache_mode: "cache", or "replay" to only serve recorded responses.
+        cache_size_mb: The maximum size of the response cache.
     """
+    # One worker, so that the agent is built only once its modules are imported
+    startup = ThreadPoolExecutor(max_workers=1, thread_name_prefix="startup")
+    startup.submit(preload_modules)
+
     console = Console()
     console.print("[bold cyan]Welcome to the Gemini Research Agent![/bold cyan]")
     console.print("Let's get you set up.")
@@ -23,12 +259,14 @@ def run_cli():
     console.print("\n[bold green]Setup complete. You can now start chatting.[/bold green]")
     console.print("Type 'exit' or 'quit' to end the session.")
 
-    # --- Initialize Agent ---
-    try:
-        agent = ResearchAgent(model=model_name, api_key=api_key, api_base=api_base)
-    except Exception as e:
-        console.print(f"[bold red]Error initializing agent: {e}[/bold red]")
-        return
+    # --- Initialize Agent (in the background, while the user types the first question) ---
+    from core.tracing import TraceWriter, Tracer
+
+    tracer = Tracer(TraceWriter(trace_path) if tracing and trace_path else None, enabled=tracing)
+    pending_session = startup.submit(_build_session, model_name, api_key, api_base, tracer,
+                                     cache_path, cache_mode, cache_size_mb, prefetch)
+    startup.shutdown(wait=False)
+    agent = ingestor = None
 
     # --- Session State ---
     current_mode = "convergent" # Default mode
@@ -37,37 +275,118 @@ def run_cli():
     while True:
         user_input = Prompt.ask("\n[bold]You[/bold]")
 
+        if agent is None:
+            if not pending_session.done():
+                console.print("[italic]Still loading the agent...[/italic]")
+            try:
+                agent, ingestor, sessions = pending_session.result()
+            except Exception as e:
+                console.print(f"[bold red]Error initializing agent: {e}[/bold red]")
+                return
+
+        # Report ingestion jobs that finished while the user was typing
+        for job in ingestor.pop_finished():
+            color = "red" if job["status"] == "failed" else "green"
+            console.print(f"[{color}]Ingestion job #{job['id']} {job['status']}: {job['added']} added, {job['skipped']} skipped, {len(job['errors'])} error(s).[/{color}]")
+            for error in job["errors"]:
+                console.print(f"[red]  {error}[/red]")
+
         if user_input.lower() in ["exit", "quit"]:
+            ingestor.stop()
+            agent.close()
+            if agent.session.message_count:
+                console.print(f"[italic]This session is saved as {agent.session.id}; continue it later with !resume {agent.session.id}[/italic]")
+            if tracer.writer is not None:
+                tracer.writer.close()
             console.print("[bold cyan]Goodbye![/bold cyan]")
             break
         
         # --- Command Handling ---
         if user_input.startswith("!"):
+            command_started = time.perf_counter()
             if user_input.startswith("!load_session "):
                 filepath = user_input.split(" ", 1)[1]
                 console.print(f"[italic]Attempting to load file into session memory: {filepath}[/italic]")
+                from tools.file_io import read_file
                 content, error = read_file(filepath)
                 if error:
                     console.print(f"[bold red]{error}[/bold red]")
                 else:
-                    memory_content = f"""I have just loaded the following document into my working memory for this session. 
-It is now part of our conversation history. 
-Please acknowledge you have read it, then await my specific questions about it.
-
---- DOCUMENT START ---
-{content}
---- DOCUMENT END ---"""
-                    agent.chat_history.append(HumanMessage(content=memory_content))
-                    console.print(f"[bold green]Successfully loaded document into agent's working memory.[/bold green]")
-            
+                    document = agent.working_memory.add_document(filepath, content)
+                    console.print(f"[bold green]Loaded '{document.name}' as session document #{document.id} "
+                                  f"({len(document.paragraphs)} paragraphs, ~{document.tokens} tokens). "
+                                  f"Only the parts relevant to each question will be sent.[/bold green]")
+
+            elif user_input.strip() == "!docs":
+                print_session_documents(console, agent.working_memory)
+
+            elif user_input.startswith("!unload "):
+                ref = user_input.split(" ", 1)[1].strip()
+                if ref == "all":
+                    agent.working_memory.clear()
+                    console.print("[italic yellow]Unloaded all session documents.[/italic yellow]")
+                else:
+                    document = agent.working_memory.find(ref)
+                    if document is None:
+                        console.print(f"[bold red]Error: No session document matches '{ref}'. Use !docs to list them.[/bold red]")
+                    else:
+                        agent.working_memory.remove_document(document.id)
+                        console.print(f"[italic yellow]Unloaded session document #{document.id} ({document.name}).[/italic yellow]")
+
             elif user_input.startswith("!add_kb "):
                 filepath = user_input.split(" ", 1)[1]
-                console.print(f"[italic]Attempting to add file to knowledge base: {filepath}[/italic]")
-                success_msg, error_msg = add_file_to_kb(filepath)
+                from tools.kb_namespaces import DEFAULT_NAMESPACE
+                # Files go to the searched namespace when exactly one is selected
+                namespace = agent.namespaces[0] if agent.namespaces and len(agent.namespaces) == 1 else DEFAULT_NAMESPACE
+                job_id, error_msg = ingestor.submit(filepath, namespace=namespace)
                 if error_msg:
                     console.print(f"[bold red]{error_msg}[/bold red]")
                 else:
-                    console.print(f"[bold green]{success_msg}[/bold green]")
+                    console.print(f"[bold green]Queued ingestion job #{job_id} for {filepath} (namespace {namespace}). You can keep chatting; use !kb_status to follow progress.[/bold green]")
+
+            elif user_input.strip() == "!ns" or user_input.startswith("!ns "):
+                from tools.kb_namespaces import create_namespace, resolve_namespaces
+                args = user_input.split()[1:]
+                if not args or args == ["list"]:
+                    print_namespaces(console, ingestor.kb_dir, agent.namespaces)
+                elif args[0] == "create" and len(args) == 2:
+                    success_msg, error_msg = create_namespace(ingestor.kb_dir, args[1])
+                    if error_msg:
+                        console.print(f"[bold red]{error_msg}[/bold red]")
+                    else:
+                        console.print(f"[bold green]{success_msg} Select it with !ns use {args[1]}[/bold green]")
+                elif args[0] == "use" and len(args) > 1:
+                    if args[1:] == ["all"]:
+                        agent.namespaces = None
+                        console.print("[italic yellow]Searching all knowledge base namespaces.[/italic yellow]")
+                    else:
+                        namespaces, error_msg = resolve_namespaces(ingestor.kb_dir, args[1:])
+                        if error_msg:
+                            console.print(f"[bold red]{error_msg}[/bold red]")
+                        else:
+                            agent.namespaces = namespaces
+                            console.print(f"[italic yellow]Searching the knowledge base namespace(s): {', '.join(namespaces)}[/italic yellow]")
+                else:
+                    console.print("[bold red]Error: Usage: !ns [list] | !ns create <name> | !ns use <name> [<name> ...] | !ns use all[/bold red]")
+
+            elif user_input.strip() == "!kb_status":
+                print_kb_status(console, ingestor.status())
+
+            elif user_input.startswith("!kb_watch "):
+                arg = user_input.split(" ", 1)[1].strip().lower()
+                if arg == "off":
+                    ingestor.unwatch()
+                    console.print("[italic yellow]Stopped watching the knowledge base directory.[/italic yellow]")
+                else:
+                    try:
+                        interval = float(arg)
+                        if interval <= 0:
+                            raise ValueError
+                    except ValueError:
+                        console.print("[bold red]Error: Usage: !kb_watch <seconds|off>[/bold red]")
+                    else:
+                        ingestor.watch(interval)
+                        console.print(f"[italic yellow]Watching the knowledge base directory every {interval}s.[/italic yellow]")
 
             elif user_input.startswith("!save_session"):
                 args = user_input.split(" ", 1)
@@ -78,12 +397,53 @@ Please acknowledge you have read it, then await my specific questions about it.
                     filepath = f"session_history_{timestamp}.md"
                 
                 console.print(f"[italic]Saving session to {filepath}...[/italic]")
-                success_msg, error_msg = save_session_history(agent.chat_history, filepath)
+                from tools.file_io import save_session_history
+                # Exported from the session log, which has every turn even after a !resume
+                success_msg, error_msg = save_session_history(list(agent.session.iter_messages()), filepath)
                 if error_msg:
                     console.print(f"[bold red]{error_msg}[/bold red]")
                 else:
                     console.print(f"[bold green]{success_msg}[/bold green]")
 
+            elif user_input.startswith("!resume "):
+                session_id = user_input.split(" ", 1)[1].strip()
+                session = sessions.open(session_id)
+                if session is None:
+                    console.print(f"[bold red]Error: No recorded session '{session_id}'. Use !sessions to list them.[/bold red]")
+                else:
+                    loaded = agent.resume_session(session)
+                    summary_note = ", plus a summary of the earlier ones" if agent.history.summary else ""
+                    console.print(f"[bold green]Resumed session {session.id} ({session.state.get('turns', '?')} turn(s)): "
+                                  f"loaded the {loaded} most recent message(s){summary_note}.[/bold green]")
+
+            elif user_input.strip() == "!sessions":
+                print_sessions(console, sessions.list_sessions(), agent.session.id)
+
+            elif user_input.strip() == "!history":
+                print_history_usage(console, agent.history)
+
+            elif user_input.strip() == "!stats":
+                print_trace_stats(console, tracer)
+                if agent.prefetcher is not None:
+                    print_prefetch_stats(console, agent.prefetcher)
+
+            elif user_input.strip() == "!cache":
+                print_cache_stats(console, agent.cache)
+
+            elif user_input.strip() == "!pin":
+                last_answer = next((m for m in reversed(agent.chat_history) if m.type == "ai"), None)
+                if last_answer is None:
+                    console.print("[bold red]Error: There is no answer to pin yet.[/bold red]")
+                else:
+                    agent.history.pin(last_answer)
+                    agent.session.save_state(agent.history)
+                    console.print("[italic yellow]Pinned the last answer; it will be sent with every turn.[/italic yellow]")
+
+            elif user_input.strip() == "!unpin":
+                agent.history.unpin_all()
+                agent.session.save_state(agent.history)
+                console.print("[italic yellow]Removed all pinned messages.[/italic yellow]")
+
             elif user_input.startswith("!mode "):
                 mode_name = user_input.split(" ", 1)[1].lower()
                 if mode_name in ["convergent", "divergent"]:
@@ -93,24 +453,10 @@ Please acknowledge you have read it, then await my specific questions about it.
                     console.print(f"[bold red]Error: Invalid mode. Please choose 'convergent' or 'divergent'.[/bold red]")
 
             else:
-                console.print("[bold red]Error: Unknown command. Available commands: !load_session <path>, !add_kb <path>, !save_session [path], !mode <name>[/bold red]")
+                console.print("[bold red]Error: Unknown command. Available commands: !load_session <path>, !docs, !unload <id|name|all>, !add_kb <path>, !ns [list|create|use], !kb_status, !kb_watch <seconds|off>, !save_session [path], !sessions, !resume <id>, !history, !stats, !cache, !pin, !unpin, !mode <name>[/bold red]")
+            tracer.record(SPAN_CLI_COMMAND, time.perf_counter() - command_started, command=user_input.split(" ", 1)[0])
             continue # Skip the chat part and wait for next input
 
-        # Inject mode instruction into the user input
-        mode_instruction = f"[SYSTEM INSTRUCTION: For this turn, you MUST operate in {current_mode.upper()} mode.]"
-        final_input = f"{mode_instruction}\n\nUSER QUESTION: {user_input}"
-
-        with console.status("[bold green]Thinking...[/bold green]"): 
-            raw_response = agent.chat(final_input)
-        
-        # Extract only the final answer part for clean display
-        final_answer_marker = "**Final Answer:**"
-        if final_answer_marker in raw_response:
-            final_answer = raw_response.split(final_answer_marker, 1)[1].strip()
-        else:
-            final_answer = raw_response # Fallback for tool calls or other formats
-
         console.print("\n[bold cyan]Agent:[/bold cyan]")
-        markdown_output = Markdown(final_answer)
-        console.print(markdown_output)
-
+        with tracer.span(SPAN_CLI_TURN):
+            render_streamed_answer(console, agent.stream_chat(user_input, mode=current_mode), tracer)
@@ -0,0 +1,12 @@
+from rich.console import Console
+
+
+def print_prefetch_stats(console: Console, prefetcher):
+    """
+    Renders how many knowledge base searches the prefetch made unnecessary, for `!stats` and batch runs.
+    """
+    stats = prefetcher.stats()
+    console.print(f"[italic]Knowledge base prefetch: results sent in {stats['prefetched']} of {stats['turns']} turn(s); "
+                  f"{stats['avoided']} of them needed no search tool call ({stats['avoided_rate']:.0%} round trips saved), "
+                  f"{stats['searched_after_prefetch']} searched anyway. Turns without results that searched: "
+                  f"{stats['searched_without_prefetch']}.[/italic]")
@@ -0,0 +1,393 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rich.console import Console
+
+# The agent (langchain, openai) is imported when the server starts, not when main.py parses its arguments
+from core.defaults import CACHE_MODE_CACHE, CACHE_MODE_REPLAY, DEFAULT_MAX_SIZE_MB, EVENT_FINAL
+from tools.kb_index import get_index, get_index_if_loaded
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+MODES = ("convergent", "divergent")
+# Sessions without a request for this long are closed (their log stays on disk)
+DEFAULT_IDLE_TIMEOUT = 30 * 60
+DEFAULT_MAX_SESSIONS = 32
+EVICTION_INTERVAL = 30.0
+MAX_REQUEST_BYTES = 1 << 20
+
+
+class ServerSession:
+    """
+    One chat session of the server: an agent with its own history, and the session's mode.
+    """
+    def __init__(self, session_id: str, agent, mode: str):
+        self.id = session_id
+        self.agent = agent
+        self.mode = mode
+        self.turns = 0
+        self.created = time.time()
+        self.last_active = time.monotonic()
+        # Held while a turn runs, so a session answers one message at a time; a closed session keeps it forever
+        self.busy = threading.Lock()
+
+    def to_dict(self) -> dict:
+        return {"session_id": self.id, "mode": self.mode, "turns": self.turns, "created": round(self.created, 3),
+                "idle_seconds": round(time.monotonic() - self.last_active, 1), "busy": self.busy.locked()}
+
+
+class SessionManager:
+    """
+    The sessions hosted by the server.
+
+    Sessions are created by `agent_factory(session_id)`, which is expected to give every
+    agent the shared HTTP clients, so that all sessions use one connection pool. The
+    knowledge base index needs no sharing: tools load it once per process (see
+    `tools.kb_index.get_index`). Sessions idle for longer than `idle_timeout` are closed
+    by `evict_idle`, which a background thread runs every EVICTION_INTERVAL seconds.
+    Closing a session takes its `busy` lock, so a turn in flight is never closed under it.
+    """
+    def __init__(self, agent_factory, idle_timeout: float = DEFAULT_IDLE_TIMEOUT, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        self.agent_factory = agent_factory
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.evicted = 0
+        self._sessions: dict[str, ServerSession] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._evictor = None
+
+    def create(self, mode: str = "convergent") -> ServerSession | None:
+        """
+        Opens a new session, or returns None if the server is full even after evicting idle sessions.
+        """
+        with self._lock:
+            full = len(self._sessions) >= self.max_sessions
+        if full:
+            self.evict_idle()
+        session_id = uuid.uuid4().hex[:12]
+        session = ServerSession(session_id, self.agent_factory(session_id), mode)
+        with self._lock:
+            if len(self._sessions) < self.max_sessions:
+                self._sessions[session_id] = session
+                return session
+        session.agent.close()
+        return None
+
+    def get(self, session_id: str) -> ServerSession | None:
+        """
+        Returns an open session and marks it as active, or None if there is none with this id.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_active = time.monotonic()
+        return session
+
+    def is_open(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def list_sessions(self) -> list[dict]:
+        with self._lock:
+            return [session.to_dict() for session in self._sessions.values()]
+
+    def close_session(self, session_id: str) -> bool:
+        """
+        Closes a session, after its turn in flight if any; returns False if there is none with this id.
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.busy.acquire()
+        session.agent.close()
+        return True
+
+    def evict_idle(self, now: float | None = None) -> list[str]:
+        """
+        Closes the sessions that have been idle for longer than `idle_timeout`, except those running a turn.
+
+        Returns:
+            The ids of the closed sessions.
+        """
+        now = time.monotonic() if now is None else now
+        evicted = []
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if now - session.last_active > self.idle_timeout and session.busy.acquire(blocking=False):
+                    evicted.append(self._sessions.pop(session_id))
+            self.evicted += len(evicted)
+        for session in evicted:
+            session.agent.close()
+        return [session.id for session in evicted]
+
+    def start_eviction(self, interval: float = EVICTION_INTERVAL):
+        def run():
+            while not self._stop.wait(interval):
+                self.evict_idle()
+        self._evictor = threading.Thread(target=run, name="session-evictor", daemon=True)
+        self._evictor.start()
+
+    def close(self):
+        """
+        Stops the eviction thread and closes every session.
+        """
+        self._stop.set()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.agent.close()
+
+
+class ResearchServer:
+    """
+    A local HTTP server hosting many chat sessions over one knowledge base index and one
+    pool of model connections.
+
+    Endpoints (JSON bodies and responses):
+
+    - `POST /sessions` {"mode"}: opens a session and returns its "session_id".
+    - `GET /sessions`: lists the open sessions.
+    - `POST /sessions/<id>/chat` {"message", "stream"}: answers a message. Streamed
+      responses (the default) are newline-delimited JSON events, as yielded by
+      `ResearchAgent.stream_chat`; the last one is "final" or "error".
+    - `POST /sessions/<id>/mode` {"mode"}: switches the session to "convergent" or "divergent".
+    - `DELETE /sessions/<id>`: closes a session.
+    - `GET /health`: the number of sessions and the state of the knowledge base index.
+    """
+    def __init__(self, manager: SessionManager, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 knowledge_base_dir: str = "knowledge_base"):
+        self.manager = manager
+        self.knowledge_base_dir = knowledge_base_dir
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self.manager.start_eviction()
+        self._server.serve_forever()
+
+    def start(self) -> "ResearchServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="research-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.manager.close()
+
+    def __enter__(self) -> "ResearchServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def health(self) -> dict:
+        index = get_index_if_loaded(self.knowledge_base_dir)
+        return {"status": "ok", "sessions": len(self.manager.list_sessions()), "evicted": self.manager.evicted,
+                "index": None if index is None else {"files": len(index.manifest.entries), "chunks": len(index.chunks),
+                                                     "generation": index.generation}}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _read_json(self) -> dict | None:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_REQUEST_BYTES:
+                    return None
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return None
+                return body if isinstance(body, dict) else None
+
+            def _route(self) -> tuple[ServerSession | None, str | None, bool]:
+                """
+                Splits `/sessions/<id>[/<action>]`; returns (session, action, matched).
+                """
+                parts = self.path.strip("/").split("/")
+                if len(parts) not in (2, 3) or parts[0] != "sessions":
+                    return None, None, False
+                return server.manager.get(parts[1]), parts[2] if len(parts) == 3 else None, True
+
+            def do_GET(self):
+                path = self.path.rstrip("/")
+                if path == "/health":
+                    self._send_json(200, server.health())
+                elif path == "/sessions":
+                    self._send_json(200, {"sessions": server.manager.list_sessions()})
+                else:
+                    self._send_json(404, {"error": "Not found"})
+
+            def do_DELETE(self):
+                session, action, matched = self._route()
+                if not matched or action is not None:
+                    self._send_json(404, {"error": "Not found"})
+                elif session is None or not server.manager.close_session(session.id):
+                    self._send_json(404, {"error": "Unknown session"})
+                else:
+                    self._send_json(200, {"session_id": session.id, "closed": True})
+
+            def do_POST(self):
+                body = self._read_json()
+                if body is None:
+                    self._send_json(400, {"error": "The body must be a JSON object"})
+                    return
+                if self.path.rstrip("/") == "/sessions":
+                    mode = body.get("mode", "convergent")
+                    if mode not in MODES:
+                        self._send_json(400, {"error": f"Invalid mode. Choose one of: {', '.join(MODES)}"})
+                        return
+                    session = server.manager.create(mode)
+                    if session is None:
+                        self._send_json(503, {"error": "Too many open sessions"})
+                    else:
+                        self._send_json(201, session.to_dict())
+                    return
+
+                session, action, matched = self._route()
+                if not matched or action not in ("chat", "mode"):
+                    self._send_json(404, {"error": "Not found"})
+                elif session is None:
+                    self._send_json(404, {"error": "Unknown session"})
+                elif action == "mode":
+                    if body.get("mode") not in MODES:
+                        self._send_json(400, {"error": f"Invalid mode. Choose one of: {', '.join(MODES)}"})
+                        return
+                    session.mode = body["mode"]
+                    self._send_json(200, session.to_dict())
+                else:
+                    self._chat(session, body)
+
+            def _chat(self, session: ServerSession, body: dict):
+                message = body.get("message")
+                if not isinstance(message, str) or not message.strip():
+                    self._send_json(400, {"error": "'message' must be a non-empty string"})
+                    return
+                if not session.busy.acquire(blocking=False):
+                    if server.manager.is_open(session.id):
+                        self._send_json(409, {"error": "This session is already answering a message"})
+                    else:
+                        self._send_json(404, {"error": "Unknown session"})  # Closed since it was looked up
+                    return
+                try:
+                    if not body.get("stream", True):
+                        try:
+                            output = session.agent.chat(message, mode=session.mode, raise_errors=True)
+                        except Exception as e:
+                            self._send_json(500, {"session_id": session.id, "error": f"An error occurred: {e}"})
+                        else:
+                            session.turns += 1
+                            self._send_json(200, {"session_id": session.id, "output": output})
+                    else:
+                        self._stream(session, message)
+                finally:
+                    session.last_active = time.monotonic()
+                    session.busy.release()
+
+            def _stream(self, session: ServerSession, message: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                connected = True
+                for event in session.agent.stream_chat(message, mode=session.mode):
+                    if event["type"] == EVENT_FINAL:
+                        session.turns += 1
+                    if not connected:
+                        continue  # The turn still runs to its end, so that it is recorded in the history
+                    line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+                    try:
+                        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+                        self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        connected = False
+                if connected:
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+
+        return Handler
+
+
+def run_server_command(args, cache_path: str | None = None, cache_mode: str = CACHE_MODE_CACHE,
+                       cache_size_mb: float = DEFAULT_MAX_SIZE_MB):
+    """
+    Entry point of `python main.py serve`: hosts chat sessions over HTTP until interrupted.
+
+    Args:
+        args: The parsed command line.
+        cache_path: The SQLite file of the response cache shared by all sessions, or None.
+        cache_mode: "cache", or "replay" to only serve recorded responses.
+        cache_size_mb: The maximum size of the response cache.
+    """
+    from core.agent import ResearchAgent, create_http_clients
+    from core.llm_cache import SQLiteLLMCache
+    from core.prefetch import KnowledgePrefetcher
+    from core.session_store import DEFAULT_SESSIONS_DIR, SessionLog
+    from core.tracing import TraceWriter, Tracer
+
+    console = Console()
+    if not args.api_key and cache_mode == CACHE_MODE_REPLAY:
+        args.api_key = "unused-in-replay-mode"  # Every response comes from the cache
+    if not args.api_key:
+        console.print("[bold red]Error: No API key. Pass --api-key or set OPENAI_API_KEY.[/bold red]")
+        return 1
+
+    # One pool of connections, one trace file and one prefetcher for all sessions
+    http_client, http_async_client = create_http_clients(max_connections=args.max_sessions * 2)
+    writer = TraceWriter(args.trace) if not args.no_trace and args.trace else None
+    prefetcher = KnowledgePrefetcher() if args.prefetch else None
+
+    def agent_factory(session_id: str) -> ResearchAgent:
+        # Each session has its own cache handle, tracer and log, named after the session
+        cache = SQLiteLLMCache(cache_path, mode=cache_mode, max_size_mb=cache_size_mb) if cache_path else None
+        return ResearchAgent(model=args.model, api_key=args.api_key, api_base=args.api_base,
+                             http_client=http_client, http_async_client=http_async_client, cache=cache,
+                             tracer=Tracer(writer, enabled=not args.no_trace, session_id=session_id),
+                             session=SessionLog(DEFAULT_SESSIONS_DIR, session_id), prefetcher=prefetcher)
+
+    if os.path.isdir("knowledge_base"):
+        index = get_index("knowledge_base")  # Loaded once, before the first session needs it
+        console.print(f"[italic]Knowledge base index: {len(index.manifest.entries)} file(s), {len(index.chunks)} paragraph(s).[/italic]")
+    manager = SessionManager(agent_factory, idle_timeout=args.idle_timeout, max_sessions=args.max_sessions)
+    server = ResearchServer(manager, host=args.host, port=args.port)
+    console.print(f"[bold cyan]Serving research sessions on {server.base_url} "
+                  f"(at most {args.max_sessions}, closed after {args.idle_timeout:.0f}s idle)[/bold cyan]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        http_client.close()
+        asyncio.run(http_async_client.aclose())
+        if writer is not None:
+            writer.close()
+    return 0
@@ -0,0 +1,104 @@
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+# Imported on a background thread while the user answers the setup prompts, so that
+# building the agent afterwards does not wait for langchain, openai or faiss
+BACKGROUND_MODULES = ("core.agent", "tools.file_io", "tools.ingest", "rich.markdown")
+# Import time allowed before the first prompt is shown (`--profile-startup` fails above it)
+STARTUP_BUDGET_MS = 1500
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def preload_modules(modules: tuple[str, ...] = BACKGROUND_MODULES) -> dict[str, float]:
+    """
+    Imports `modules` and returns how long each one took, in seconds (0 if it was already loaded).
+    """
+    durations = {}
+    for name in modules:
+        started = time.perf_counter()
+        importlib.import_module(name)
+        durations[name] = time.perf_counter() - started
+    return durations
+
+
+def parse_importtime(output: str) -> list[dict]:
+    """
+    Parses the report of `python -X importtime` into one entry per imported module.
+
+    Returns:
+        A list of dicts with the module "name", its "depth" in the import tree (0 for
+        the statements that were run), and its "self_us" and "cumulative_us" times.
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # The header line
+        raw_name = fields[2].rstrip()
+        name = raw_name.lstrip()
+        entries.append({"name": name, "depth": (len(raw_name) - len(name) - 1) // 2,
+                        "self_us": int(fields[0]), "cumulative_us": int(fields[1])})
+    return entries
+
+
+def profile_imports(prompt_module: str = "main", background_modules: tuple[str, ...] = BACKGROUND_MODULES) -> dict:
+    """
+    Imports the startup modules in a fresh interpreter under `-X importtime`.
+
+    Returns:
+        A dict with, for "prompt" (what runs before the first prompt) and "background"
+        (what `preload_modules` imports), the total time in milliseconds and the self
+        time of every top-level package, slowest first.
+    """
+    statement = f"import {prompt_module}; " + "; ".join(f"import {name}" for name in background_modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True,
+                            text=True, cwd=REPO_ROOT, check=True)
+    phases = {"prompt": {"total_ms": 0.0, "packages": {}}, "background": {"total_ms": 0.0, "packages": {}}}
+    phase = "prompt"
+    for entry in parse_importtime(result.stderr):
+        packages = phases[phase]["packages"]
+        package = entry["name"].split(".")[0]
+        packages[package] = packages.get(package, 0.0) + entry["self_us"] / 1000
+        if entry["depth"] == 0:
+            phases[phase]["total_ms"] += entry["cumulative_us"] / 1000
+            if entry["name"] == prompt_module:
+                phase = "background"  # The modules reported from now on are the background ones
+    for summary in phases.values():
+        summary["total_ms"] = round(summary["total_ms"], 1)
+        summary["packages"] = dict(sorted(((name, round(ms, 1)) for name, ms in summary["packages"].items()),
+                                          key=lambda item: item[1], reverse=True))
+    return phases
+
+
+def print_startup_profile(console: Console | None = None, top: int = 12, budget_ms: float = STARTUP_BUDGET_MS) -> int:
+    """
+    Prints the import-time breakdown of `--profile-startup`.
+
+    Returns:
+        The exit status: 0 if the imports before the first prompt fit in `budget_ms`, 1 otherwise.
+    """
+    console = console or Console()
+    phases = profile_imports()
+    titles = {"prompt": "Before the first prompt", "background": "In the background, while the user types"}
+    for phase, summary in phases.items():
+        table = Table(title=f"{titles[phase]}: {summary['total_ms']:.0f} ms")
+        table.add_column("Package")
+        table.add_column("Self (ms)", justify="right")
+        for name, ms in list(summary["packages"].items())[:top]:
+            table.add_row(name, f"{ms:.1f}")
+        console.print(table)
+
+    prompt_ms = phases["prompt"]["total_ms"]
+    if prompt_ms > budget_ms:
+        console.print(f"[bold red]Startup imports take {prompt_ms:.0f} ms, over the {budget_ms:.0f} ms budget.[/bold red]")
+        return 1
+    console.print(f"[green]Startup imports take {prompt_ms:.0f} ms, within the {budget_ms:.0f} ms budget.[/green]")
+    return 0
@@ -1,27 +1,124 @@
+import asyncio
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.tools import tool
 
-from core.prompt_manager import get_system_prompt
+from core.history import HistoryManager, LLMSummarizer
+from core.llm_cache import SQLiteLLMCache
+from core.prefetch import KnowledgePrefetcher
+from core.tracing import SPAN_PREFETCH, SPAN_PREPARE, SPAN_TURN, Tracer, disabled_tracer
+from core.session_store import SessionLog
+from core.streaming import EVENT_ERROR, EVENT_FINAL, QueueCallbackHandler
+from core.prompt_manager import format_turn_input, get_system_prompt
+from core.working_memory import WorkingMemory
 from tools.knowledge_base import search_knowledge_base
-from tools.file_io import write_file
+from tools.vector_store import semantic_search_knowledge_base
+from tools.file_io import append_to_file, apply_patch, read_file_range, replace_lines, write_file
+
+# Connections kept open to the model endpoint, shared by the turns of one agent
+HTTP_MAX_CONNECTIONS = 20
+HTTP_MAX_KEEPALIVE = 10
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+# Threads running tool calls (knowledge base searches, file writes) for `achat`
+TOOL_WORKERS = 4
+
+
+def create_http_clients(max_connections: int = HTTP_MAX_CONNECTIONS) -> tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Creates the pooled (sync, async) HTTP clients used to reach the model endpoint.
+
+    Args:
+        max_connections: The maximum number of simultaneous connections of each client.
+
+    Returns:
+        A tuple containing the synchronous and the asynchronous client.
+    """
+    limits = httpx.Limits(max_connections=max_connections,
+                          max_keepalive_connections=min(max_connections, HTTP_MAX_KEEPALIVE))
+    return (httpx.Client(limits=limits, timeout=HTTP_TIMEOUT),
+            httpx.AsyncClient(limits=limits, timeout=HTTP_TIMEOUT))
+
+
+def _offloaded(tool, executor: ThreadPoolExecutor):
+    """
+    Returns a copy of a synchronous tool whose async entry point runs it on `executor`,
+    so that several tool calls of one step can run at the same time without blocking the event loop.
+    """
+    async def run(**kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(tool.func, **kwargs))
+    return tool.model_copy(update={"coroutine": run})
+
+def _namespaced(tool, get_namespaces):
+    """
+    Returns a copy of a knowledge base search tool that searches the namespaces given by
+    `get_namespaces()` when the model does not name any.
+    """
+    def run(**kwargs):
+        if kwargs.get("namespaces") is None:
+            kwargs["namespaces"] = get_namespaces()
+        return tool.func(**kwargs)
+    return tool.model_copy(update={"func": run})
 
 class ResearchAgent:
     """
     The core of the research agent, now powered by LangChain's Agent Executor.
     """
-    def __init__(self, model: str, api_key: str, api_base: str, temperature: float = 0.1):
+    def __init__(self, model: str, api_key: str, api_base: str, temperature: float = 0.1,
+                 history_token_budget: int = 6000, summarizer=None, documents_token_budget: int = 1200,
+                 http_client: httpx.Client | None = None, http_async_client: httpx.AsyncClient | None = None,
+                 cache: SQLiteLLMCache | None = None, tracer: Tracer | None = None, session: SessionLog | None = None,
+                 prefetcher: KnowledgePrefetcher | None = None):
+        # Pooled clients reuse TLS connections across turns instead of reconnecting for every call.
+        # Clients passed in are shared with other agents and are left open by `close`.
+        self._owns_http_clients = http_client is None and http_async_client is None
+        if self._owns_http_clients:
+            http_client, http_async_client = create_http_clients()
+        self.http_client = http_client
+        self.http_async_client = http_async_client
         self.llm = ChatOpenAI(
             model=model,
             openai_api_key=api_key,
             openai_api_base=api_base,
-            temperature=temperature
+            temperature=temperature,
+            streaming=True,  # Tokens reach callback handlers as they arrive; invoke() still returns the whole message
+            stream_usage=True,  # Ask for token counts in streamed responses too, for tracing
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+            cache=cache,  # Identical requests (messages, tools, model parameters) are answered from disk
         )
-        self.tools = [search_knowledge_base, write_file]
-        self.chat_history = []
+        self.cache = cache  # Owned by the agent, closed with it
+        self.tracer = tracer or disabled_tracer()
+        # Documents loaded with !load_session; only the parts relevant to each turn are sent
+        self.working_memory = WorkingMemory(token_budget=documents_token_budget)
+        # The knowledge base namespaces searched by default (see `tools.kb_namespaces`), or None for all of them
+        self.namespaces = None
+        self.tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="agent-tool")
+        search_tools = [_namespaced(t, lambda: self.namespaces) for t in [search_knowledge_base, semantic_search_knowledge_base]]
+        self.tools = [_offloaded(t, self.tool_executor) for t in
+                      [*search_tools, write_file, read_file_range, append_to_file, replace_lines, apply_patch,
+                       self._make_session_search_tool()]]
+        # Older turns are summarized by the model itself unless a local summarizer is supplied
+        self.history = HistoryManager(token_budget=history_token_budget,
+                                      summarizer=summarizer or LLMSummarizer(self.llm))
+
+        self.session = session  # Every finished turn is appended to this log, if set
+        # Searches the knowledge base for each question before the first model call, if set
+        self.prefetcher = prefetcher
 
+        self.agent_executor = self._build_executor()
+        self.last_latency = None  # {"ttft": seconds to the first token, "total": seconds} of the last streamed turn
+
+    def _build_executor(self) -> AgentExecutor:
         # This prompt template is designed for tool-using agents
         prompt = ChatPromptTemplate.from_messages([
             ("system", get_system_prompt()),
@@ -31,23 +128,212 @@ class ResearchAgent:
         ])
 
         agent = create_openai_tools_agent(self.llm, self.tools, prompt)
-        self.agent_executor = AgentExecutor(agent=agent, tools=self.tools, verbose=False) # verbose=True lets us see the agent's thoughts
+        # The model is invoked rather than streamed so that the response cache is consulted;
+        # tokens still reach the callbacks because the model is created with streaming=True
+        # The intermediate steps tell which tools a turn called (see `_record_turn`)
+        return AgentExecutor(agent=agent, tools=self.tools, stream_runnable=False, return_intermediate_steps=True,
+                             verbose=False) # verbose=True lets us see the agent's thoughts
+
+    @property
+    def chat_history(self) -> list:
+        """
+        The full conversation transcript. Only a token-budgeted view of it is sent to the model.
+        """
+        return self.history.messages
+
+    def _make_session_search_tool(self):
+        working_memory = self.working_memory
+
+        @tool
+        def search_session_documents(query: str, top_k: int = 5) -> str:
+            """
+            Searches the documents the user loaded into this session and returns the most relevant paragraphs.
+            Use it to read parts of a session document that were not included in the current message.
+
+            Args:
+                query: The words to look for.
+                top_k: The maximum number of paragraphs to return.
 
-    def chat(self, user_input: str) -> str:
+            Returns:
+                A formatted string containing the matching paragraphs, or a message if nothing was found.
+            """
+            if not working_memory.documents:
+                return "No document is loaded in this session."
+            hits = working_memory.search(query, top_k=top_k)
+            if not hits:
+                return f"No paragraph of the session documents matches '{query}'."
+            results_str = f"Found {len(hits)} paragraph(s) for '{query}':\n"
+            for hit in hits:
+                results_str += f"\n--- [{hit['doc_id']}] {hit['name']}, paragraph {hit['paragraph_no']} ---\n{hit['text']}\n"
+            return results_str
+
+        return search_session_documents
+
+    def _prefetch(self, user_input: str) -> str:
+        with self.tracer.span(SPAN_PREFETCH) as span:
+            try:
+                knowledge_context = self.prefetcher.fetch(user_input, self.namespaces)
+            except Exception as e:  # A failed prefetch only costs the turn its head start
+                span.set(error=type(e).__name__)
+                return ""
+            span.set(hit=bool(knowledge_context))
+            return knowledge_context
+
+    def _turn_input(self, user_input: str, mode: str | None) -> dict:
+        with self.tracer.span(SPAN_PREPARE):
+            # The knowledge base is searched while the history is prepared, which may summarize older turns
+            pending = self.tool_executor.submit(self._prefetch, user_input) if self.prefetcher is not None else None
+            documents_context = self.working_memory.build_context(user_input)
+            chat_history = self.history.build_context()
+            knowledge_context = pending.result() if pending is not None else ""
+            return {
+                "input": format_turn_input(user_input, mode, documents_context, knowledge_context),
+                "chat_history": chat_history,
+                "prefetched": bool(knowledge_context),
+            }
+
+    def _run_config(self, *handlers) -> dict:
+        """
+        Returns the executor config of one turn: the given callback handlers, plus the tracer's if it is enabled.
+        """
+        callbacks = list(handlers)
+        tracing_handler = self.tracer.callback_handler()
+        if tracing_handler is not None:
+            callbacks.append(tracing_handler)
+        return {"callbacks": callbacks}
+
+    def _record_turn(self, user_input: str, mode: str | None, response: dict):
+        if self.prefetcher is not None:
+            self.prefetcher.record_turn(response["prefetched"], [action.tool for action, _ in response["intermediate_steps"]])
+        # Document excerpts and prefetched results are selected again for every turn, so they are not kept
+        messages = [HumanMessage(content=format_turn_input(user_input, mode)), AIMessage(content=response['output'])]
+        for message in messages:
+            self.history.append(message)
+        if self.session is not None:
+            self.session.record_turn(messages, self.history)
+
+    def resume_session(self, session: SessionLog) -> int:
+        """
+        Continues a recorded session: its recent turns, summary and pins replace the current history,
+        and the next turns are appended to its log.
+
+        Returns:
+            The number of messages loaded into the history.
+        """
+        loaded = session.restore(self.history)
+        if self.session is not None and self.session is not session:
+            self.session.close()
+        self.session = session
+        return loaded
+
+    def chat(self, user_input: str, mode: str | None = None, raise_errors: bool = False) -> str:
         """
         Invokes the agent executor to get a response.
+
+        Args:
+            user_input: The user's question.
+            mode: The operating mode for this turn ("convergent" or "divergent"), if any.
+            raise_errors: Raise exceptions instead of returning them as the answer.
         """
+        self.tracer.new_turn()
         try:
-            response = self.agent_executor.invoke({
-                "input": user_input,
-                "chat_history": self.chat_history
-            })
-            
-            # Save history
-            self.chat_history.append(HumanMessage(content=user_input))
-            self.chat_history.append(AIMessage(content=response['output']))
+            with self.tracer.span(SPAN_TURN):
+                response = self.agent_executor.invoke(self._turn_input(user_input, mode), config=self._run_config())
+            self._record_turn(user_input, mode, response)
+            return response['output']
+        except Exception as e:
+            if raise_errors:
+                raise
+            return f"An error occurred: {e}"
+
+    async def achat(self, user_input: str, mode: str | None = None, raise_errors: bool = False) -> str:
+        """
+        Asynchronous version of `chat`.
 
+        When the model asks for several tools in one step, the executor runs them
+        concurrently, each on the agent's tool thread pool, so the step takes about as
+        long as its slowest tool call. Preparing the turn (document retrieval, history
+        summarization) is also done off the event loop.
+
+        Args:
+            user_input: The user's question.
+            mode: The operating mode for this turn ("convergent" or "divergent"), if any.
+            raise_errors: Raise exceptions instead of returning them as the answer, e.g. to retry the turn.
+        """
+        self.tracer.new_turn()
+        try:
+            with self.tracer.span(SPAN_TURN):
+                loop = asyncio.get_running_loop()
+                turn_input = await loop.run_in_executor(self.tool_executor, self._turn_input, user_input, mode)
+                response = await self.agent_executor.ainvoke(turn_input, config=self._run_config())
+            self._record_turn(user_input, mode, response)
             return response['output']
         except Exception as e:
+            if raise_errors:
+                raise
             return f"An error occurred: {e}"
 
+    def stream_chat(self, user_input: str, mode: str | None = None):
+        """
+        Invokes the agent executor and yields its progress as it happens.
+
+        The executor runs on a background thread; model tokens and tool calls are
+        forwarded through a queue (see `core.streaming.QueueCallbackHandler`).
+
+        Args:
+            user_input: The user's question.
+            mode: The operating mode for this turn ("convergent" or "divergent"), if any.
+
+        Yields:
+            Event dicts with a "type" among llm_start, token ("text"), tool_start ("name", "input")
+            and tool_end ("name", "output"). The last event is either final ("output", "ttft", "total")
+            or error ("message"). The latencies of the turn are also kept in `last_latency`.
+        """
+        events = queue.Queue()
+        started_at = time.perf_counter()
+        handler = QueueCallbackHandler(events, started_at)
+        self.tracer.new_turn()
+
+        def run():
+            try:
+                with self.tracer.span(SPAN_TURN, streamed=True) as span:
+                    response = self.agent_executor.invoke(self._turn_input(user_input, mode),
+                                                          config=self._run_config(handler))
+                    span.set(ttft_ms=round(handler.ttft * 1000, 3) if handler.ttft is not None else None)
+                events.put({"type": EVENT_FINAL, "output": response['output'], "response": response})
+            except Exception as e:
+                events.put({"type": EVENT_ERROR, "message": f"An error occurred: {e}"})
+
+        threading.Thread(target=run, name="agent-stream", daemon=True).start()
+
+        while True:
+            event = events.get()
+            if event["type"] == EVENT_FINAL:
+                self._record_turn(user_input, mode, event.pop("response"))
+                self.last_latency = {"ttft": handler.ttft, "total": time.perf_counter() - started_at}
+                yield {**event, **self.last_latency}
+                return
+            elif event["type"] == EVENT_ERROR:
+                yield event
+                return
+            yield event
+
+    def close(self):
+        """
+        Closes the pooled HTTP connections, the tool threads, the response cache and the session log.
+        """
+        self.tool_executor.shutdown(wait=False)
+        if self.session is not None:
+            self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self._owns_http_clients:
+            self.http_client.close()
+
+    async def aclose(self):
+        """
+        Like `close`, also closing the asynchronous HTTP client; call it from the event loop that used it.
+        """
+        self.close()
+        if self._owns_http_clients:
+            await self.http_async_client.aclose()
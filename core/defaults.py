@@ -0,0 +1,22 @@
+import os
+
+# Settings read by the command line before the agent stack is imported; the modules
+# that use them (core.llm_cache, core.tracing, core.streaming) import langchain, so
+# they import these from here rather than the other way round.
+
+CACHE_MODE_CACHE = "cache"    # Serve recorded responses, call the model and record on a miss
+CACHE_MODE_REPLAY = "replay"  # Serve recorded responses only; a miss is an error
+CACHE_MODES = (CACHE_MODE_CACHE, CACHE_MODE_REPLAY)
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "llm_cache.sqlite")
+DEFAULT_MAX_SIZE_MB = 200
+
+DEFAULT_TRACE_PATH = os.path.join(".cache", "traces.jsonl")
+
+# Event types yielded by ResearchAgent.stream_chat
+EVENT_LLM_START = "llm_start"
+EVENT_TOKEN = "token"
+EVENT_TOOL_START = "tool_start"
+EVENT_TOOL_END = "tool_end"
+EVENT_FINAL = "final"
+EVENT_ERROR = "error"
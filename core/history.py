@@ -0,0 +1,172 @@
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from core.prompt_manager import get_summary_prompt
+from tools.tokens import estimate_tokens
+
+# Extra tokens the chat format spends on every message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _message_text(message: BaseMessage) -> str:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        content += "".join(f"\n{tc['name']}({tc['args']})" for tc in tool_calls)
+    return content
+
+
+def local_summarizer(previous_summary: str, messages: list[BaseMessage], max_chars: int = 2000) -> str:
+    """
+    Summarizes messages without calling a model, by keeping the opening of each one.
+
+    Args:
+        previous_summary: The running summary so far ("" if none).
+        messages: The messages to fold into the summary, oldest first.
+        max_chars: The maximum length of the returned summary; the oldest lines are dropped first.
+
+    Returns:
+        The updated running summary.
+    """
+    lines = [previous_summary] if previous_summary else []
+    for message in messages:
+        role = "User" if isinstance(message, HumanMessage) else "Assistant" if isinstance(message, AIMessage) else "Note"
+        text = " ".join(_message_text(message).split())
+        lines.append(f"- {role}: {text[:200]}{'...' if len(text) > 200 else ''}")
+    summary = "\n".join(lines)
+    return summary[-max_chars:]
+
+
+class LLMSummarizer:
+    """
+    Summarizes messages with the chat model itself, falling back to `local_summarizer` on errors.
+    """
+    def __init__(self, llm):
+        self.llm = llm
+
+    def __call__(self, previous_summary: str, messages: list[BaseMessage]) -> str:
+        transcript = "\n\n".join(
+            f"{'USER' if isinstance(m, HumanMessage) else 'ASSISTANT'}: {_message_text(m)}" for m in messages)
+        prompt = get_summary_prompt(previous_summary, transcript)
+        try:
+            return self.llm.invoke([HumanMessage(content=prompt)]).content.strip()
+        except Exception:
+            return local_summarizer(previous_summary, messages)
+
+
+class HistoryManager:
+    """
+    Keeps the conversation within a token budget.
+
+    The full transcript is kept in `messages`, but what is sent to the model each turn
+    (`build_context`) is made of three parts:
+
+    - pinned messages, always sent as they are;
+    - a running summary of older turns, produced by a pluggable summarizer;
+    - the most recent turns, verbatim.
+
+    When the recent turns no longer fit in the budget, the oldest of them are folded
+    into the summary, whole turns at a time.
+    """
+    def __init__(self, token_budget: int = 6000, min_recent_messages: int = 4,
+                 summarizer=None, token_counter=None):
+        """
+        Args:
+            token_budget: The maximum number of history tokens to send per turn.
+            min_recent_messages: Messages always kept verbatim, even over budget.
+            summarizer: A callable (previous_summary, messages) -> summary; defaults to `local_summarizer`.
+            token_counter: A callable text -> token count; defaults to `estimate_tokens`.
+        """
+        self.token_budget = token_budget
+        self.min_recent_messages = min_recent_messages
+        self.summarizer = summarizer or local_summarizer
+        self.count_tokens = token_counter or estimate_tokens
+        self.messages: list[BaseMessage] = []
+        self.pinned: list[BaseMessage] = []
+        self.summary = ""
+        self.summarized_upto = 0     # messages[:summarized_upto] are covered by the summary
+        self.last_usage = None
+        self.totals = {"turns": 0, "sent_tokens": 0, "raw_tokens": 0}
+
+    def append(self, message: BaseMessage):
+        self.messages.append(message)
+
+    def pin(self, message: BaseMessage):
+        """
+        Pins a message so that it is sent with every turn and never summarized.
+        """
+        self.pinned.append(message)
+
+    def unpin_all(self):
+        self.pinned.clear()
+
+    def clear(self):
+        self.messages.clear()
+        self.pinned.clear()
+        self.summary = ""
+        self.summarized_upto = 0
+
+    def message_tokens(self, message: BaseMessage) -> int:
+        return self.count_tokens(_message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+
+    def _summary_message(self) -> SystemMessage | None:
+        if not self.summary:
+            return None
+        return SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}")
+
+    def _turn_starts(self, start: int) -> list[int]:
+        """
+        Returns the indexes of the human messages at or after `start`, where turns can be cut.
+        """
+        return [i for i in range(start, len(self.messages)) if isinstance(self.messages[i], HumanMessage)]
+
+    def build_context(self) -> list[BaseMessage]:
+        """
+        Returns the messages to send to the model for the next turn, compacting older turns if needed,
+        and records the token accounting of that turn in `last_usage`.
+        """
+        pinned_ids = {id(m) for m in self.pinned}
+        pinned_tokens = sum(self.message_tokens(m) for m in self.pinned)
+
+        def recent_tokens(start: int) -> int:
+            return sum(self.message_tokens(m) for m in self.messages[start:] if id(m) not in pinned_ids)
+
+        summary_message = self._summary_message()
+        summary_tokens = self.message_tokens(summary_message) if summary_message else 0
+        if pinned_tokens + summary_tokens + recent_tokens(self.summarized_upto) > self.token_budget:
+            # Fold whole turns into the summary until the rest fits, keeping a minimum of recent messages
+            latest_cut = len(self.messages) - self.min_recent_messages
+            cut = self.summarized_upto
+            for start in self._turn_starts(self.summarized_upto + 1):
+                if start > latest_cut:
+                    break
+                cut = start
+                # Budget the future summary at its current size; it is re-measured below
+                if pinned_tokens + summary_tokens + recent_tokens(cut) <= self.token_budget:
+                    break
+            if cut > self.summarized_upto:
+                folded = [m for m in self.messages[self.summarized_upto:cut] if id(m) not in pinned_ids]
+                self.summary = self.summarizer(self.summary, folded)
+                self.summarized_upto = cut
+                summary_message = self._summary_message()
+                summary_tokens = self.message_tokens(summary_message) if summary_message else 0
+
+        recent = [m for m in self.messages[self.summarized_upto:] if id(m) not in pinned_ids]
+        context = ([summary_message] if summary_message else []) + list(self.pinned) + recent
+
+        verbatim_tokens = sum(self.message_tokens(m) for m in recent)
+        raw_tokens = pinned_tokens + sum(self.message_tokens(m) for m in self.messages if id(m) not in pinned_ids)
+        sent_tokens = summary_tokens + pinned_tokens + verbatim_tokens
+        self.last_usage = {
+            "sent_tokens": sent_tokens,
+            "raw_tokens": raw_tokens,
+            "saved_tokens": raw_tokens - sent_tokens,
+            "summary_tokens": summary_tokens,
+            "pinned_tokens": pinned_tokens,
+            "verbatim_tokens": verbatim_tokens,
+            "verbatim_messages": len(recent),
+            "summarized_messages": self.summarized_upto,
+        }
+        self.totals["turns"] += 1
+        self.totals["sent_tokens"] += sent_tokens
+        self.totals["raw_tokens"] += raw_tokens
+        return context
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from core.defaults import CACHE_MODE_CACHE, CACHE_MODE_REPLAY, CACHE_MODES, DEFAULT_CACHE_PATH, DEFAULT_MAX_SIZE_MB
+
+# Eviction frees a little more than needed so that it does not run on every insert
+EVICTION_TARGET_RATIO = 0.9
+
+
+class CacheMissError(LookupError):
+    """
+    Raised in replay mode when no response was recorded for a request.
+    """
+
+
+# Message fields that describe a particular response rather than the conversation
+_VOLATILE_MESSAGE_FIELDS = ("id", "usage_metadata", "response_metadata")
+
+
+def _strip_volatile_fields(node):
+    if isinstance(node, dict):
+        kwargs = node.get("kwargs")
+        if node.get("lc") == 1 and isinstance(kwargs, dict):
+            node["kwargs"] = {k: v for k, v in kwargs.items() if k not in _VOLATILE_MESSAGE_FIELDS}
+        for value in node.values():
+            _strip_volatile_fields(value)
+    elif isinstance(node, list):
+        for value in node:
+            _strip_volatile_fields(value)
+    return node
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """
+    Returns the cache key of a request: a hash of the serialized messages (tool schemas
+    included) and of the model name and parameters.
+
+    Message ids and usage figures are left out of the key: they differ between a
+    response and its cached copy, and earlier responses are part of later requests.
+    """
+    try:
+        prompt = json.dumps(_strip_volatile_fields(json.loads(prompt)), sort_keys=True, ensure_ascii=False)
+    except json.JSONDecodeError:
+        pass
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+def _serialize_generations(generations) -> str:
+    return json.dumps([{"message": message_to_dict(g.message)} if isinstance(g, ChatGeneration) else {"text": g.text}
+                       for g in generations], ensure_ascii=False)
+
+
+def _deserialize_generations(value: str) -> list:
+    return [ChatGeneration(message=messages_from_dict([item["message"]])[0]) if "message" in item
+            else Generation(text=item["text"]) for item in json.loads(value)]
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    A persistent LangChain response cache stored in one SQLite file.
+
+    Responses are keyed by `cache_key`. The file is shared by every agent that points to
+    it (WAL mode allows several processes), while the hit and miss counters belong to
+    this instance, i.e. to one session. When the stored responses exceed `max_size_mb`,
+    the least recently used ones are evicted.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, mode: str = CACHE_MODE_CACHE,
+                 max_size_mb: float = DEFAULT_MAX_SIZE_MB):
+        """
+        Args:
+            path: The SQLite file; its directory is created if needed.
+            mode: CACHE_MODE_CACHE, or CACHE_MODE_REPLAY for offline, deterministic runs.
+            max_size_mb: The maximum total size of the stored responses.
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}'. Choose one of: {', '.join(CACHE_MODES)}")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Lookups come from the executor threads of the agent, hence one connection guarded by a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used_at)")
+
+    def lookup(self, prompt: str, llm_string: str):
+        key = cache_key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                with self._conn:
+                    self._conn.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (time.time(), key))
+        if row is None:
+            if self.mode == CACHE_MODE_REPLAY:
+                raise CacheMissError(f"No recorded response for this request in {self.path} (replay mode).")
+            return None
+        return _deserialize_generations(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val):
+        if self.mode == CACHE_MODE_REPLAY:
+            return
+        value = _serialize_generations(return_val)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, value, size, created_at, last_used_at) "
+                               "VALUES (?, ?, ?, ?, ?)",
+                               (cache_key(prompt, llm_string), value, len(value.encode("utf-8")), now, now))
+            self._evict()
+
+    def _evict(self):
+        """
+        Deletes the least recently used responses once the cache is over its size limit.
+        Must be called with the lock held, inside a transaction.
+        """
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICTION_TARGET_RATIO
+        freed, keys = 0, []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used_at"):
+            if total - freed <= target:
+                break
+            keys.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self.evictions += len(keys)
+
+    def clear(self, **kwargs):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of this session and the size of the shared cache file.
+        """
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,90 @@
+import os
+import threading
+
+from tools.kb_index import get_index
+from tools.kb_namespaces import fan_out, resolve_namespaces
+from tools.snippets import format_results
+
+# Tools whose calls a prefetch is meant to make unnecessary
+SEARCH_TOOLS = ("search_knowledge_base", "semantic_search_knowledge_base")
+
+PREFETCH_TOP_K = 3
+PREFETCH_TOKEN_BUDGET = 600
+# Chunks covering less of the question than this (idf-weighted, see `InvertedIndex.search`) are not sent
+PREFETCH_MIN_COVERAGE = 0.2
+
+
+class KnowledgePrefetcher:
+    """
+    Searches the knowledge base for the user's question before the first model call of a
+    turn, so that the model can answer from the results instead of spending a round trip
+    on a `search_knowledge_base` call. The model can still call the tools for more.
+
+    The prefetcher counts, over the turns it served, how many got results and how many
+    of those still needed a search tool call: the others are round trips saved. One
+    prefetcher can be shared by several agents (e.g. the sessions of a batch run).
+    """
+    def __init__(self, knowledge_base_dir: str = "knowledge_base", top_k: int = PREFETCH_TOP_K,
+                 max_tokens: int = PREFETCH_TOKEN_BUDGET, min_coverage: float = PREFETCH_MIN_COVERAGE):
+        self.knowledge_base_dir = knowledge_base_dir
+        self.top_k = top_k
+        self.max_tokens = max_tokens
+        self.min_coverage = min_coverage
+        self.turns = 0
+        self.prefetched = 0  # Turns sent prefetched results
+        self.searched_after_prefetch = 0  # ... that still called a search tool
+        self.searched_without_prefetch = 0  # Turns without results that called a search tool
+        self._lock = threading.Lock()
+
+    def fetch(self, question: str, namespaces: list[str] | None = None) -> str:
+        """
+        Returns the context block of the best knowledge base snippets for a question, or ""
+        if the knowledge base is missing or nothing covers enough of the question.
+        Only the given namespaces are searched (all of them by default).
+        """
+        if not os.path.isdir(self.knowledge_base_dir):
+            return ""
+        shards, error_msg = resolve_namespaces(self.knowledge_base_dir, namespaces)
+        if error_msg:
+            return ""
+        # BM25 scores are only comparable within a shard, so those of several namespaces are normalized before merging
+        matches = fan_out(lambda shard_dir: get_index(shard_dir).search(question, top_k=self.top_k),
+                          self.knowledge_base_dir, shards, normalize=True)
+        matches = [match for match in matches if match["coverage"] >= self.min_coverage][:self.top_k]
+        if not matches:
+            return ""
+        for match in matches:
+            match["score"] = round(match["score"], 2)
+        results = format_results(question, matches, top_k=self.top_k, max_tokens=self.max_tokens)
+        return ("--- KNOWLEDGE BASE (retrieved in advance) ---\n"
+                "These snippets were found in the knowledge base for this question before you started. "
+                "Answer from them if they are enough; call `search_knowledge_base` only if you need more.\n"
+                f"{results}\n--- END OF KNOWLEDGE BASE RESULTS ---")
+
+    def record_turn(self, prefetched: bool, tools_called: list[str]):
+        """
+        Counts a finished turn: whether it was sent prefetched results, and the tools the model called.
+        """
+        searched = any(name in SEARCH_TOOLS for name in tools_called)
+        with self._lock:
+            self.turns += 1
+            if prefetched:
+                self.prefetched += 1
+                self.searched_after_prefetch += searched
+            else:
+                self.searched_without_prefetch += searched
+
+    def stats(self) -> dict:
+        """
+        Returns the counters, with the number and share of prefetched turns that needed no search call.
+        """
+        with self._lock:
+            avoided = self.prefetched - self.searched_after_prefetch
+            return {
+                "turns": self.turns,
+                "prefetched": self.prefetched,
+                "searched_after_prefetch": self.searched_after_prefetch,
+                "searched_without_prefetch": self.searched_without_prefetch,
+                "avoided": avoided,
+                "avoided_rate": avoided / self.prefetched if self.prefetched else 0.0,
+            }
@@ -83,3 +83,39 @@ Based on the limitations we identified in the Serra-Picamal paper, here are two
     3.  **Quantitative Analysis:** Calculate wave speed from the slope of the "X" pattern in kymographs and plot it as a function of stiffness and adhesion strength.
 *   **Expected Outcome & Significance:** We expect to find a clear relationship between these physical parameters and the wave speed. This would elevate the original discovery from a specific observation to a general physical phenomenon of collective cell behavior, providing a theoretical basis for controlling tissue dynamics by engineering its microenvironment.
 """
+
+def get_summary_prompt(previous_summary: str, transcript: str) -> str:
+    """
+    Returns the prompt used to fold older conversation turns into the running summary.
+    """
+    previous = previous_summary if previous_summary else "(none yet)"
+    return f"""You are maintaining a running summary of a research conversation between a user and their research advisor, "Archimedes".
+Update the summary with the new conversation excerpt below.
+
+Keep: the user's research goals and background, documents and papers discussed, key findings, hypotheses, decisions, open questions and any commitments made.
+Drop: greetings, repetition and the advisor's formatting.
+Write concise bullet points, at most 250 words in total, in the language of the conversation.
+
+--- CURRENT SUMMARY ---
+{previous}
+
+--- NEW EXCERPT ---
+{transcript}
+
+Return only the updated summary."""
+
+def format_turn_input(question: str, mode: str | None = None, documents_context: str = "", knowledge_context: str = "") -> str:
+    """
+    Returns the human message of one turn: the mode instruction, the excerpts of the
+    session documents relevant to this turn, the knowledge base results prefetched for
+    it, and the user's question.
+    """
+    parts = []
+    if mode:
+        parts.append(f"[SYSTEM INSTRUCTION: For this turn, you MUST operate in {mode.upper()} mode.]")
+    if documents_context:
+        parts.append(documents_context)
+    if knowledge_context:
+        parts.append(knowledge_context)
+    parts.append(f"USER QUESTION: {question}" if parts else question)
+    return "\n\n".join(parts)
@@ -0,0 +1,220 @@
+import json
+import os
+import re
+import time
+import uuid
+
+from langchain_core.messages import BaseMessage, HumanMessage, message_to_dict, messages_from_dict
+
+DEFAULT_SESSIONS_DIR = "sessions"
+# Size of the blocks read backwards from the end of a log when resuming
+TAIL_BLOCK_BYTES = 64 * 1024
+# Without a saved state, resuming loads the latest turns worth up to this many times the history budget
+TAIL_BUDGET_FACTOR = 2
+
+_SESSION_ID_RE = re.compile(r"^[0-9a-f]{8,32}$")
+
+
+def _read_records_backwards(path: str, block_size: int = TAIL_BLOCK_BYTES):
+    """
+    Yields the JSON records of a log, newest first, reading the file backwards in blocks.
+
+    A last line that was cut short by a crash is skipped.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b""
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b"\n")
+            remainder = lines.pop(0)  # May be the end of a line that starts in the previous block
+            for line in reversed(lines):
+                record = _parse_record(line)
+                if record is not None:
+                    yield record
+        record = _parse_record(remainder)
+        if record is not None:
+            yield record
+
+
+def _parse_record(line: bytes) -> dict | None:
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+class SessionLog:
+    """
+    The append-only log of one chat session: `<id>.jsonl` holds every message as it was
+    recorded, and `<id>.state.json` a small snapshot of what is needed to resume it (the
+    running summary, the pinned messages and where the unsummarized turns start).
+
+    Recording a turn appends its messages and rewrites the snapshot, so its cost does not
+    depend on the length of the session. Resuming reads the log backwards, only as far as
+    the first message the summary does not cover.
+    """
+    def __init__(self, directory: str, session_id: str):
+        self.id = session_id
+        self.path = os.path.join(directory, f"{session_id}.jsonl")
+        self.state_path = os.path.join(directory, f"{session_id}.state.json")
+        self.state = self._load_state()
+        self.message_count = self.state.get("message_count", 0)
+        self.offset = self.message_count  # Log index of the first message held by the history
+        self._file = None
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _open_for_append(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "ab")
+            # A crash may have cut the last record short; the next one must start on its own line
+            if self._file.tell() > 0:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._file.write(b"\n")
+        return self._file
+
+    def append(self, messages: list[BaseMessage]):
+        """
+        Appends messages to the log and flushes them to disk.
+        """
+        lines = []
+        for message in messages:
+            lines.append(json.dumps({"index": self.message_count, "ts": round(time.time(), 3),
+                                     "message": message_to_dict(message)}, ensure_ascii=False))
+            self.message_count += 1
+        f = self._open_for_append()
+        f.write(("\n".join(lines) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+    def save_state(self, history):
+        """
+        Atomically rewrites the resume snapshot from a HistoryManager.
+        """
+        self.state = {
+            "id": self.id,
+            "updated": round(time.time(), 3),
+            "message_count": self.message_count,
+            "turns": self.state.get("turns", 0),
+            "summary": history.summary,
+            "summarized_upto": self.offset + history.summarized_upto,
+            "pinned": [message_to_dict(m) for m in history.pinned],
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def record_turn(self, messages: list[BaseMessage], history):
+        """
+        Appends the messages of a finished turn and updates the snapshot.
+        """
+        self.append(messages)
+        self.state["turns"] = self.state.get("turns", 0) + 1
+        self.save_state(history)
+
+    def restore(self, history) -> int:
+        """
+        Loads the session into a HistoryManager, replacing its content: the running summary,
+        the pinned messages and the messages the summary does not cover yet.
+
+        Returns:
+            The number of messages loaded.
+        """
+        summarized_upto = self.state.get("summarized_upto")
+        token_cap = history.token_budget * TAIL_BUDGET_FACTOR
+        tail, tokens = [], 0
+        if os.path.exists(self.path):
+            for record in _read_records_backwards(self.path):
+                if summarized_upto is not None and record["index"] < summarized_upto:
+                    break
+                message = messages_from_dict([record["message"]])[0]
+                tail.append((record["index"], message))
+                tokens += history.message_tokens(message)
+                # Without a snapshot, stop at a turn boundary once the budget is well covered
+                if summarized_upto is None and tokens > token_cap and isinstance(message, HumanMessage):
+                    break
+        tail.reverse()
+
+        history.clear()
+        history.messages.extend(message for _, message in tail)
+        history.summary = self.state.get("summary", "")
+        # A pinned message that is also among the loaded ones must be the same object, or it would be sent twice
+        loaded = {json.dumps(message_to_dict(message), sort_keys=True): message for _, message in tail}
+        for pinned in self.state.get("pinned", []):
+            history.pinned.append(loaded.get(json.dumps(pinned, sort_keys=True)) or messages_from_dict([pinned])[0])
+        self.message_count = max(self.message_count, tail[-1][0] + 1 if tail else 0)
+        self.offset = tail[0][0] if tail else self.message_count
+        return len(tail)
+
+    def iter_messages(self):
+        """
+        Yields every message of the session, oldest first (e.g. for a markdown export).
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            for line in f:
+                record = _parse_record(line)
+                if record is not None:
+                    yield messages_from_dict([record["message"]])[0]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SessionStore:
+    """
+    The directory of session logs.
+    """
+    def __init__(self, directory: str = DEFAULT_SESSIONS_DIR):
+        self.directory = directory
+
+    def new_session(self) -> SessionLog:
+        """
+        Returns the log of a new session; its files are created when the first turn is recorded.
+        """
+        return SessionLog(self.directory, uuid.uuid4().hex[:12])
+
+    def open(self, session_id: str) -> SessionLog | None:
+        """
+        Returns the log of an existing session, or None if there is none with this id.
+        """
+        if not _SESSION_ID_RE.match(session_id):
+            return None
+        log = SessionLog(self.directory, session_id)
+        if not os.path.exists(log.path):
+            return None
+        return log
+
+    def list_sessions(self) -> list[dict]:
+        """
+        Returns the recorded sessions, most recently updated first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        sessions = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".jsonl"):
+                continue
+            log = SessionLog(self.directory, name[:-len(".jsonl")])
+            sessions.append({"id": log.id, "updated": os.path.getmtime(log.path),
+                             "turns": log.state.get("turns"), "messages": log.state.get("message_count")})
+        return sorted(sessions, key=lambda s: s["updated"], reverse=True)
@@ -0,0 +1,72 @@
+import queue
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from core.defaults import EVENT_ERROR, EVENT_FINAL, EVENT_LLM_START, EVENT_TOKEN, EVENT_TOOL_END, EVENT_TOOL_START
+
+FINAL_ANSWER_MARKER = "**Final Answer:**"
+
+
+class QueueCallbackHandler(BaseCallbackHandler):
+    """
+    Forwards model tokens and tool calls from the agent executor thread to a queue.
+
+    Every event is a dict with a "type" (one of the EVENT_* constants) and the
+    time it happened ("t", in seconds since `started_at`).
+    """
+    def __init__(self, events: queue.Queue, started_at: float | None = None):
+        self.events = events
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.ttft = None  # Seconds from `started_at` to the first token
+
+    def _put(self, event_type: str, **fields):
+        self.events.put({"type": event_type, "t": time.perf_counter() - self.started_at, **fields})
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._put(EVENT_LLM_START)
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._put(EVENT_LLM_START)
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        # Tool-call chunks arrive as empty tokens; they are reported by on_tool_start instead
+        if token:
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self.started_at
+            self._put(EVENT_TOKEN, text=token)
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self._put(EVENT_TOOL_START, name=(serialized or {}).get("name", "tool"), input=input_str)
+
+    def on_tool_end(self, output, **kwargs):
+        self._put(EVENT_TOOL_END, name=kwargs.get("name", "tool"), output=str(output))
+
+
+class FinalAnswerStream:
+    """
+    Splits a streamed response into reasoning and final answer as the tokens arrive.
+
+    Until the `**Final Answer:**` marker has been seen, the whole text is shown; from
+    then on only what follows the marker is, which is what the CLI used to extract from
+    the complete response.
+    """
+    def __init__(self, marker: str = FINAL_ANSWER_MARKER):
+        self.marker = marker
+        self.text = ""
+
+    def reset(self):
+        self.text = ""
+
+    def feed(self, token: str):
+        self.text += token
+
+    @property
+    def has_final_answer(self) -> bool:
+        return self.marker in self.text
+
+    @property
+    def display_text(self) -> str:
+        if self.has_final_answer:
+            return self.text.split(self.marker, 1)[1].strip()
+        return self.text
@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from logging.handlers import RotatingFileHandler
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from core.defaults import DEFAULT_TRACE_PATH
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+# Span names
+SPAN_LLM = "llm"
+SPAN_TOOL = "tool"
+SPAN_TURN = "agent.turn"
+SPAN_PREPARE = "agent.prepare"
+SPAN_PREFETCH = "agent.prefetch"
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    Returns the nearest-rank percentile `q` (0-100) of a non-empty list.
+    """
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+class TraceWriter:
+    """
+    Appends spans as JSON lines to a size-rotated file (`path`, `path.1`, ...).
+    One writer can be shared by the tracers of several sessions.
+    """
+    def __init__(self, path: str = DEFAULT_TRACE_PATH, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def write(self, span: dict):
+        # `handle` takes the handler's lock, so spans written from several threads never race a rollover
+        self._handler.handle(logging.makeLogRecord({"msg": json.dumps(span, ensure_ascii=False)}))
+
+    def close(self):
+        self._handler.close()
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    A timed section of a turn; attributes can be added while it runs.
+    """
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.started_at = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self.name, time.perf_counter() - self.started_at, **self.attrs)
+        return False
+
+
+class Tracer:
+    """
+    Records the spans of one session: LLM calls, tool invocations, agent and CLI phases.
+
+    Every span is kept in memory for `stats` and, if a writer is set, appended to the
+    trace file. A disabled tracer does nothing: `span` returns a shared no-op object
+    and `callback_handler` returns None, so the agent adds no callback at all.
+    """
+    def __init__(self, writer: TraceWriter | None = None, enabled: bool = True, session_id: str | None = None):
+        self.enabled = enabled
+        self.writer = writer
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+        self.turn = 0
+        self._durations: dict[str, list[float]] = {}
+        self._totals = {"prompt_tokens": 0, "completion_tokens": 0, "tool_output_bytes": 0}
+        self._lock = threading.Lock()
+
+    def new_turn(self) -> int:
+        """
+        Starts a new turn; the spans recorded from now on carry its number.
+        """
+        self.turn += 1
+        return self.turn
+
+    def span(self, name: str, **attrs):
+        """
+        Returns a context manager timing a section of code as a span named `name`.
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def record(self, name: str, duration: float, **attrs):
+        """
+        Records a span that was timed elsewhere.
+
+        Args:
+            name: The span name, e.g. "llm", "tool" or "cli.render".
+            duration: The wall time, in seconds.
+            **attrs: Extra attributes, e.g. token counts.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._durations.setdefault(name, []).append(duration)
+            for key in self._totals:
+                self._totals[key] += attrs.get(key) or 0
+        if self.writer is not None:
+            self.writer.write({"ts": round(time.time() - duration, 6), "session": self.session_id, "turn": self.turn,
+                               "name": name, "duration_ms": round(duration * 1000, 3), **attrs})
+
+    def callback_handler(self) -> "TracingCallbackHandler | None":
+        return TracingCallbackHandler(self) if self.enabled else None
+
+    def stats(self) -> dict:
+        """
+        Returns, for every span name, the count, p50, p95 and total duration of the session
+        in milliseconds, and the session's token and tool output totals.
+        """
+        with self._lock:
+            durations = {name: list(values) for name, values in self._durations.items()}
+            totals = dict(self._totals)
+        phases = {}
+        for name, values in sorted(durations.items()):
+            phases[name] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "total_ms": round(sum(values) * 1000, 1),
+            }
+        return {"phases": phases, "totals": totals, "turns": self.turn}
+
+
+def _token_usage(response) -> tuple[int | None, int | None]:
+    """
+    Reads the prompt and completion tokens of an LLM result, wherever the provider reported them.
+    """
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens"), usage.get("output_tokens")
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Turns LangChain callbacks into "llm" spans and "tool.<name>" spans.
+    """
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._starts = {}  # run_id -> (perf_counter at start, attrs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = (time.perf_counter(), {})
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = (time.perf_counter(), {})
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        started = self._starts.get(run_id)
+        if started is not None and "ttft_ms" not in started[1]:
+            started[1]["ttft_ms"] = round((time.perf_counter() - started[0]) * 1000, 3)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._starts.pop(run_id, None)
+        if started is None:
+            return
+        prompt_tokens, completion_tokens = _token_usage(response)
+        self.tracer.record(SPAN_LLM, time.perf_counter() - started[0], prompt_tokens=prompt_tokens,
+                           completion_tokens=completion_tokens, **started[1])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            self.tracer.record(SPAN_LLM, time.perf_counter() - started[0], error=type(error).__name__, **started[1])
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._starts[run_id] = (time.perf_counter(), {"tool": (serialized or {}).get("name", "tool")})
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            output_bytes = len(str(getattr(output, "content", output)).encode("utf-8"))
+            self.tracer.record(f"{SPAN_TOOL}.{started[1]['tool']}", time.perf_counter() - started[0],
+                               tool_output_bytes=output_bytes, **started[1])
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            self.tracer.record(f"{SPAN_TOOL}.{started[1]['tool']}", time.perf_counter() - started[0],
+                               error=type(error).__name__, **started[1])
+
+
+_DISABLED = Tracer(enabled=False)
+
+
+def disabled_tracer() -> Tracer:
+    return _DISABLED
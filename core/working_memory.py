@@ -0,0 +1,158 @@
+import os
+import re
+import itertools
+
+from tools.tokens import estimate_tokens
+from tools.kb_index import InvertedIndex, split_paragraphs
+
+_HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+
+# Headings listed per document in the outline
+MAX_OUTLINE_HEADINGS = 20
+# Opening paragraphs sent per document when no paragraph matches the question
+FALLBACK_PARAGRAPHS = 3
+
+
+class SessionDocument:
+    """
+    A document loaded with `!load_session`, split into paragraphs.
+    """
+    def __init__(self, doc_id: int, path: str, paragraphs: list[str], chunk_ids: list[int]):
+        self.id = doc_id
+        self.path = path
+        self.name = os.path.basename(path)
+        self.paragraphs = paragraphs
+        self.chunk_ids = chunk_ids
+        self.tokens = sum(estimate_tokens(p) for p in paragraphs)
+        self.outline = []
+        for para in paragraphs:
+            match = _HEADING_RE.match(para.splitlines()[0])
+            if match:
+                self.outline.append(("  " * (len(match.group(1)) - 1)) + match.group(2))
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "name": self.name, "path": self.path,
+                "paragraphs": len(self.paragraphs), "tokens": self.tokens}
+
+
+class WorkingMemory:
+    """
+    Holds the documents of the current session in an ephemeral, in-memory BM25 index.
+
+    Instead of sending whole documents with every turn, `build_context` selects the
+    paragraphs relevant to the current question, within a token budget, and adds a
+    short outline of each document so the model knows what else is available.
+    """
+    def __init__(self, token_budget: int = 1200):
+        self.token_budget = token_budget
+        self.documents: dict[int, SessionDocument] = {}
+        self.index = InvertedIndex()
+        self._doc_ids = itertools.count(1)
+        self._chunk_docs = {}  # chunk_id -> (document, paragraph number)
+
+    def add_document(self, path: str, content: str) -> SessionDocument:
+        """
+        Splits a document into paragraphs and indexes them for this session.
+
+        Args:
+            path: The path the document was loaded from; its basename is used as the display name.
+            content: The full text of the document.
+
+        Returns:
+            The new SessionDocument.
+        """
+        paragraphs = split_paragraphs(content)
+        doc_id = next(self._doc_ids)
+        chunk_ids = [self.index.add_chunk(os.path.basename(path), para) for para in paragraphs]
+        document = SessionDocument(doc_id, path, paragraphs, chunk_ids)
+        for number, chunk_id in enumerate(chunk_ids, start=1):
+            self._chunk_docs[chunk_id] = (document, number)
+        self.documents[doc_id] = document
+        return document
+
+    def find(self, ref: str) -> SessionDocument | None:
+        """
+        Finds a loaded document by id (as shown by `list_documents`) or by file name.
+        """
+        ref = ref.strip()
+        if ref.isdigit() and int(ref) in self.documents:
+            return self.documents[int(ref)]
+        for document in self.documents.values():
+            if ref in (document.name, document.path):
+                return document
+        return None
+
+    def remove_document(self, doc_id: int) -> SessionDocument:
+        document = self.documents.pop(doc_id)
+        for chunk_id in document.chunk_ids:
+            self.index.remove_chunk(chunk_id)
+            del self._chunk_docs[chunk_id]
+        return document
+
+    def clear(self):
+        for doc_id in list(self.documents):
+            self.remove_document(doc_id)
+
+    def list_documents(self) -> list[dict]:
+        return [document.to_dict() for document in self.documents.values()]
+
+    def search(self, query: str, top_k: int = 5) -> list[dict]:
+        """
+        Returns the most relevant paragraphs of the session documents for a query.
+
+        Returns:
+            A list of {"doc_id", "name", "paragraph_no", "text", "score"} dicts, best first.
+        """
+        results = []
+        for hit in self.index.search(query, top_k=top_k):
+            document, number = self._chunk_docs[hit["chunk_id"]]
+            results.append({"doc_id": document.id, "name": document.name, "paragraph_no": number,
+                            "text": hit["paragraph"], "score": hit["score"]})
+        return results
+
+    def build_context(self, question: str) -> str:
+        """
+        Builds the document context to send with one turn: an outline of every loaded
+        document and the paragraphs most relevant to the question, within the token budget.
+        When nothing matches the question, the opening paragraphs of each document are used.
+
+        Args:
+            question: The user's question for this turn.
+
+        Returns:
+            The context block, or "" if no document is loaded.
+        """
+        if not self.documents:
+            return ""
+
+        lines = ["--- SESSION DOCUMENTS ---",
+                 "The user loaded these documents into this session. Only the excerpts most relevant to the "
+                 "current question are shown; call `search_session_documents` to read other parts.", ""]
+        for document in self.documents.values():
+            lines.append(f"[{document.id}] {document.name} ({len(document.paragraphs)} paragraphs)")
+            outline = document.outline[:MAX_OUTLINE_HEADINGS]
+            if outline:
+                more = " ..." if len(document.outline) > MAX_OUTLINE_HEADINGS else ""
+                lines.append("Outline: " + " | ".join(h.strip() for h in outline) + more)
+        lines.append("")
+        budget = self.token_budget - estimate_tokens("\n".join(lines))
+
+        hits = self.search(question, top_k=50)
+        if not hits:
+            hits = []
+            for document in self.documents.values():
+                for number, text in enumerate(document.paragraphs[:FALLBACK_PARAGRAPHS], start=1):
+                    hits.append({"doc_id": document.id, "name": document.name, "paragraph_no": number, "text": text})
+
+        excerpts = []
+        for hit in hits:
+            excerpt = f"--- [{hit['doc_id']}] {hit['name']}, paragraph {hit['paragraph_no']} ---\n{hit['text']}"
+            cost = estimate_tokens(excerpt)
+            if cost > budget:
+                continue
+            excerpts.append(excerpt)
+            budget -= cost
+        lines.append("Relevant excerpts:" if excerpts else "No excerpt fits the context budget.")
+        lines.extend(excerpts)
+        lines.append("--- END OF SESSION DOCUMENTS ---")
+        return "\n".join(lines)
@@ -1,6 +1,85 @@
+import argparse
+import os
 
 from cli.interface import run_cli
+from core.defaults import CACHE_MODE_CACHE, CACHE_MODE_REPLAY, DEFAULT_CACHE_PATH, DEFAULT_MAX_SIZE_MB, DEFAULT_TRACE_PATH
+from cli.server import DEFAULT_HOST, DEFAULT_IDLE_TIMEOUT, DEFAULT_MAX_SESSIONS, DEFAULT_PORT
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH, default=None, metavar="PATH",
+                        help=f"Answer repeated model requests from an on-disk cache (default file: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--replay", action="store_true",
+                        help="Only serve responses recorded in the cache; a request that was never recorded fails")
+    parser.add_argument("--cache-size-mb", type=float, default=DEFAULT_MAX_SIZE_MB,
+                        help="Size above which the least recently used responses are evicted")
+
+
+def add_model_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"), help="API key (default: $OPENAI_API_KEY)")
+    parser.add_argument("--api-base", default=os.environ.get("OPENAI_API_BASE", "https://dashscope.aliyuncs.com/compatible-mode/v1"),
+                        help="API base URL (default: $OPENAI_API_BASE)")
+    parser.add_argument("--model", default="qwen-plus", help="Model name")
+
+
+def add_prefetch_argument(parser: argparse.ArgumentParser):
+    parser.add_argument("--prefetch", action="store_true",
+                        help="Search the knowledge base for each question before the first model call and send the best results with it")
 
-if __name__ == "__main__":
-    run_cli()
 
+def cache_options(args) -> dict:
+    """
+    Returns the cache settings of the command line; --replay implies --cache.
+    """
+    path = args.cache or (DEFAULT_CACHE_PATH if args.replay else None)
+    mode = CACHE_MODE_REPLAY if args.replay else CACHE_MODE_CACHE
+    return {"cache_path": path, "cache_mode": mode, "cache_size_mb": args.cache_size_mb}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Gemini Research Agent")
+    add_cache_arguments(parser)
+    add_prefetch_argument(parser)
+    parser.add_argument("--trace", default=DEFAULT_TRACE_PATH, metavar="PATH",
+                        help=f"Rotating JSONL file of latency and token spans (default: {DEFAULT_TRACE_PATH})")
+    parser.add_argument("--no-trace", action="store_true", help="Disable tracing; !stats then reports nothing")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print how long the startup imports take, by package, and exit (status 1 if over budget)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch = subparsers.add_parser("batch", help="Answer a JSONL file of questions without any prompt")
+    batch.add_argument("input", help="JSONL file with one question per line")
+    batch.add_argument("-o", "--output", help="JSONL file of results (default: <input>.results.jsonl); existing results are resumed")
+    add_model_arguments(batch)
+    batch.add_argument("--mode", choices=["convergent", "divergent"], help="Mode for items that do not set one")
+    batch.add_argument("-c", "--concurrency", type=int, default=4, help="Questions processed at the same time")
+    batch.add_argument("--rpm", type=float, default=None, help="Maximum questions (attempts) started per minute")
+    batch.add_argument("--retries", type=int, default=3, help="Retries after a transient failure")
+    batch.add_argument("--timeout", type=float, default=300.0, help="Maximum seconds per attempt")
+    add_cache_arguments(batch)
+    add_prefetch_argument(batch)
+
+    serve = subparsers.add_parser("serve", help="Host many chat sessions over HTTP, sharing one knowledge base index")
+    serve.add_argument("--host", default=DEFAULT_HOST, help=f"Interface to listen on (default: {DEFAULT_HOST})")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    add_model_arguments(serve)
+    serve.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                       help="Seconds without a request after which a session is closed")
+    serve.add_argument("--max-sessions", type=int, default=DEFAULT_MAX_SESSIONS, help="Sessions open at the same time")
+    add_cache_arguments(serve)
+    add_prefetch_argument(serve)
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    if args.profile_startup:
+        from cli.startup import print_startup_profile
+        raise SystemExit(print_startup_profile())
+    if args.command == "batch":
+        from cli.batch import run_batch_command
+        raise SystemExit(run_batch_command(args, **cache_options(args)))
+    if args.command == "serve":
+        from cli.server import run_server_command
+        raise SystemExit(run_server_command(args, **cache_options(args)))
+    run_cli(**cache_options(args), trace_path=args.trace, tracing=not args.no_trace, prefetch=args.prefetch)
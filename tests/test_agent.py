@@ -0,0 +1,77 @@
+import asyncio
+import time
+from typing import Any
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+from core.agent import ResearchAgent, _offloaded
+
+class _ToolCallingFakeModel(BaseChatModel):
+    """
+    Replies with the given messages in turn, tool calls included.
+    """
+    messages: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "tool-calling-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=next(self.messages))])
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+@tool
+def slow_lookup(topic: str) -> str:
+    """
+    Looks a topic up, slowly.
+
+    Args:
+        topic: The topic to look up.
+    """
+    time.sleep(0.4)
+    return f"notes on {topic}"
+
+def _agent_with_fake_model(messages):
+    agent = ResearchAgent(model="test", api_key="test", api_base="http://127.0.0.1:9/v1")
+    agent.llm = _ToolCallingFakeModel(messages=iter(messages))
+    agent.tools = [_offloaded(slow_lookup, agent.tool_executor)]
+    agent.agent_executor = agent._build_executor()
+    return agent
+
+def test_achat_runs_tool_calls_of_one_step_concurrently():
+    """
+    Tests that two tool calls requested in the same step take about as long as one.
+    """
+    # Arrange
+    agent = _agent_with_fake_model([
+        AIMessage(content="", tool_calls=[
+            {"name": "slow_lookup", "args": {"topic": "waves"}, "id": "call_1"},
+            {"name": "slow_lookup", "args": {"topic": "jamming"}, "id": "call_2"},
+        ]),
+        AIMessage(content="**Final Answer:** Both looked up."),
+    ])
+
+    # Act
+    started = time.perf_counter()
+    answer = asyncio.run(agent.achat("Compare waves and jamming"))
+    elapsed = time.perf_counter() - started
+
+    # Assert
+    assert answer == "**Final Answer:** Both looked up."
+    assert elapsed < 0.75
+    assert len(agent.chat_history) == 2
+    agent.close()
+
+def test_offloaded_tool_keeps_synchronous_behaviour():
+    """
+    Tests that the offloaded copy of a tool still works when invoked synchronously and asynchronously.
+    """
+    agent = ResearchAgent(model="test", api_key="test", api_base="http://127.0.0.1:9/v1")
+    offloaded = _offloaded(slow_lookup, agent.tool_executor)
+
+    assert offloaded.invoke({"topic": "x"}) == "notes on x"
+    assert asyncio.run(offloaded.ainvoke({"topic": "y"})) == "notes on y"
+    agent.close()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import time
+from cli.batch import RateLimiter, load_completed, parse_item, run_batch
+
+class _FakeAgent:
+    """
+    Answers after a short delay, failing with a timeout the first `failures` times it is asked a question.
+    """
+    calls = {}
+    active = 0
+    peak = 0
+
+    def __init__(self, failures=0):
+        self.failures = failures
+
+    async def achat(self, question, mode=None, raise_errors=False):
+        attempts = _FakeAgent.calls[question] = _FakeAgent.calls.get(question, 0) + 1
+        _FakeAgent.active += 1
+        _FakeAgent.peak = max(_FakeAgent.peak, _FakeAgent.active)
+        try:
+            await asyncio.sleep(0.05)
+            if attempts <= self.failures:
+                raise asyncio.TimeoutError()
+            return f"answer to {question} ({mode})"
+        finally:
+            _FakeAgent.active -= 1
+
+    async def aclose(self):
+        pass
+
+def _write_input(path, count):
+    path.write_text("".join(json.dumps({"id": f"q{i}", "question": f"question {i}"}) + "\n" for i in range(count)))
+
+def _reset_fake():
+    _FakeAgent.calls, _FakeAgent.active, _FakeAgent.peak = {}, 0, 0
+
+def test_parse_item_accepts_several_layouts():
+    """
+    Tests the supported item fields and the errors reported for unusable lines.
+    """
+    assert parse_item('{"id": 7, "question": "Why?", "mode": "divergent"}', 1) == {"id": "7", "question": "Why?", "mode": "divergent"}
+    assert parse_item('{"request_id": "r1", "title": "T", "body": "B"}', 2)["question"] == "T\n\nB"
+    assert parse_item('{"input": "Hi"}', 3)["id"] == "line-3"
+    assert "error" in parse_item("{broken", 4)
+    assert "error" in parse_item('{"id": "x"}', 5)
+
+def test_run_batch_bounds_concurrency_and_writes_every_result(tmp_path):
+    """
+    Tests that no more than `concurrency` items run at once and that every item gets one record.
+    """
+    # Arrange
+    _reset_fake()
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_input(input_path, 10)
+
+    # Act
+    summary = asyncio.run(run_batch(str(input_path), str(output_path), _FakeAgent, concurrency=3, default_mode="convergent"))
+
+    # Assert
+    records = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert summary["ok"] == 10 and summary["failed"] == 0
+    assert sorted(r["id"] for r in records) == [f"q{i}" for i in range(10)]
+    assert records[0]["output"].endswith("(convergent)")
+    assert _FakeAgent.peak == 3
+
+def test_run_batch_retries_transient_failures(tmp_path, monkeypatch):
+    """
+    Tests that a retryable error is retried and that the number of attempts is recorded.
+    """
+    _reset_fake()
+    monkeypatch.setattr("cli.batch.backoff_delay", lambda attempt, error=None: 0)
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_input(input_path, 1)
+
+    asyncio.run(run_batch(str(input_path), str(output_path), lambda: _FakeAgent(failures=2), max_retries=3))
+
+    record = json.loads(output_path.read_text())
+    assert record["status"] == "ok"
+    assert record["attempts"] == 3
+
+def test_run_batch_resumes_after_interruption(tmp_path):
+    """
+    Tests that items already answered are skipped and that a truncated last line does not break resuming.
+    """
+    # Arrange
+    _reset_fake()
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_input(input_path, 4)
+    output_path.write_text(json.dumps({"id": "q0", "status": "ok"}) + "\n"
+                           + json.dumps({"id": "q1", "status": "error"}) + "\n" + '{"id": "q2", "sta')
+
+    # Act
+    summary = asyncio.run(run_batch(str(input_path), str(output_path), _FakeAgent))
+
+    # Assert
+    assert summary == {**summary, "ok": 3, "failed": 0, "skipped": 1}
+    assert set(_FakeAgent.calls) == {"question 1", "question 2", "question 3"}
+    assert load_completed(str(output_path)) == {"q0", "q1", "q2", "q3"}
+
+def test_rate_limiter_spaces_out_requests():
+    """
+    Tests that the limiter starts requests at most `per_minute` per minute.
+    """
+    async def acquire_three():
+        limiter = RateLimiter(per_minute=600)  # one every 0.1s
+        started = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire()
+        return time.monotonic() - started
+
+    assert 0.18 <= asyncio.run(acquire_three()) < 0.5
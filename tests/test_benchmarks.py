@@ -0,0 +1,72 @@
+from benchmarks.corpus import CorpusGenerator
+from benchmarks.run import summarize
+from benchmarks.stub_server import StubChatServer
+from core.agent import ResearchAgent
+from tools.kb_index import get_index, split_paragraphs
+from tools.knowledge_base import search_knowledge_base
+
+def test_corpus_generator_is_deterministic_and_sized(tmp_path):
+    """
+    Tests that a generated knowledge base has the requested number of paragraphs and only depends on the seed.
+    """
+    # Arrange / Act
+    first = CorpusGenerator(seed=3).write(str(tmp_path / "a"), 250)
+    second = CorpusGenerator(seed=3).write(str(tmp_path / "b"), 250)
+
+    # Assert
+    contents = [open(p, encoding="utf-8").read() for p in first]
+    paragraphs = [para for content in contents for para in split_paragraphs(content)]
+    assert len(first) == 3
+    assert contents == [open(p, encoding="utf-8").read() for p in second]
+    assert len(paragraphs) == 250
+    # Headings become the breadcrumbs of the chunks; every other paragraph is a chunk of its own
+    assert len(get_index(str(tmp_path / "a")).chunks) == sum(not para.startswith("#") for para in paragraphs)
+
+def test_generated_queries_find_their_paragraphs(tmp_path):
+    """
+    Tests that the phrase queries of a generated corpus are found by the knowledge base search.
+    """
+    kb_dir = str(tmp_path / "kb")
+    generator = CorpusGenerator(seed=1)
+    generator.write(kb_dir, 200)
+
+    phrase_query = generator.queries(kb_dir, 2)[0]
+    result = search_knowledge_base.invoke({"query": phrase_query, "knowledge_base_dir": kb_dir})
+
+    assert result.startswith("Found")
+    assert "(Similarity Score: 100)" in result
+
+def test_summarize_reports_nearest_rank_percentiles():
+    """
+    Tests the percentile summary used in the benchmark results.
+    """
+    summary = summarize([i / 1000 for i in range(1, 101)])  # 1 ms to 100 ms
+
+    assert summary["count"] == 100
+    assert summary["p50_ms"] == 50.0
+    assert summary["p95_ms"] == 95.0
+    assert summary["max_ms"] == 100.0
+    assert summarize([]) == {"count": 0}
+
+def test_agent_turn_against_stub_server(tmp_path):
+    """
+    Tests a full agent turn against the stub server: one tool call, then a streamed final answer.
+    """
+    # Arrange
+    kb_dir = str(tmp_path / "kb")
+    CorpusGenerator().write(kb_dir, 50)
+
+    with StubChatServer(tool_args={"knowledge_base_dir": kb_dir}, answer_words=30) as server:
+        agent = ResearchAgent(model="stub", api_key="stub", api_base=server.base_url)
+
+        # Act
+        events = list(agent.stream_chat("How do mechanical waves propagate?"))
+        agent.close()
+
+    # Assert
+    types = [event["type"] for event in events]
+    assert types.count("tool_start") == 1
+    assert types.count("token") > 10
+    assert events[-1]["type"] == "final"
+    assert "**Final Answer:**" in events[-1]["output"]
+    assert server.requests == 2
@@ -0,0 +1,131 @@
+import tracemalloc
+from tools import chunker
+from tools.chunker import iter_chunks, read_spans
+from tools.kb_index import KnowledgeBaseIndex
+
+DOCUMENT = """# Mechanical waves
+
+Xavier Serra-Picamal, Vito Conte
+
+---
+
+## Results
+
+Cells migrate towards the free space.
+
+| Time | Velocity |
+|------|----------|
+| 0 h  | 10 um/h  |
+
+$$
+v = \\frac{dx}{dt}
+
+\\sigma = E \\varepsilon
+$$
+
+### Kymographs
+
+- first item
+- second item
+"""
+
+def _write(tmp_path, content, name="doc.md"):
+    path = tmp_path / name
+    path.write_bytes(content.encode("utf-8"))
+    return str(path)
+
+def test_chunks_carry_breadcrumbs_and_exact_offsets(tmp_path):
+    """
+    Tests that headings become breadcrumbs, that math blocks are kept whole and that offsets point at the chunk text.
+    """
+    # Arrange
+    path = _write(tmp_path, DOCUMENT)
+
+    # Act
+    chunks = list(iter_chunks(path))
+
+    # Assert
+    raw = open(path, "rb").read()
+    assert all(raw[c["start"]:c["end"]].decode("utf-8") == c["text"] for c in chunks)
+    assert read_spans(path, [(c["start"], c["end"]) for c in chunks]) == [c["text"] for c in chunks]
+    assert [c["heading"] for c in chunks] == ["Mechanical waves", "Mechanical waves > Results", "Mechanical waves > Results",
+                                              "Mechanical waves > Results > Kymographs"]
+    assert chunks[0]["text"] == "Xavier Serra-Picamal, Vito Conte"
+    assert chunks[1]["text"].startswith("Cells migrate") and "| 0 h" in chunks[1]["text"]
+    assert chunks[2]["text"].startswith("$$") and chunks[2]["text"].endswith("$$")
+    assert chunks[3]["text"] == "- first item\n- second item"
+
+def test_long_blocks_are_split_within_the_size_bound(tmp_path):
+    """
+    Tests that oversized paragraphs are split at sentence ends, and CJK text between characters.
+    """
+    # Arrange
+    english = " ".join(f"Sentence number {i} describes the traction field." for i in range(100))
+    chinese = "力学波在组织扩张过程中传播" * 200
+    path = _write(tmp_path, english + "\n\n" + chinese + "\n")
+
+    # Act
+    chunks = list(iter_chunks(path, max_bytes=500))
+
+    # Assert
+    assert all(len(c["text"].encode("utf-8")) <= 500 for c in chunks)
+    english_chunks = [c for c in chunks if c["text"].startswith("Sentence")]
+    assert all(c["text"].endswith("field.") for c in english_chunks)
+    assert " ".join(c["text"] for c in english_chunks) == english
+    assert "".join(c["text"] for c in chunks if not c["text"].startswith("Sentence")) == chinese
+
+def test_memory_mapped_reading_gives_the_same_chunks(tmp_path, monkeypatch):
+    """
+    Tests that large files, read through a memory map, are chunked exactly like small ones.
+    """
+    # Arrange
+    path = _write(tmp_path, DOCUMENT * 20 + "x" * 5000)
+    buffered = list(iter_chunks(path))
+
+    # Act
+    monkeypatch.setattr(chunker, "MMAP_MIN_BYTES", 0)
+    mapped = list(iter_chunks(path))
+
+    # Assert
+    assert mapped == buffered
+
+def test_chunking_a_large_file_uses_bounded_memory(tmp_path):
+    """
+    Tests that streaming a multi-megabyte file does not hold it in memory.
+    """
+    # Arrange
+    paragraph = "Epithelial monolayers expand as mechanical waves propagate across the tissue. " * 8
+    path = tmp_path / "dump.md"
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(6000):
+            f.write(f"## Section {i}\n\n{paragraph}\n\n")
+
+    # Act
+    tracemalloc.start()
+    count = sum(1 for _ in iter_chunks(str(path)))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # Assert
+    assert path.stat().st_size > 3_000_000
+    assert count == 6000
+    assert peak < 200_000
+
+def test_index_keeps_offsets_instead_of_text(tmp_path):
+    """
+    Tests that the knowledge base index stores chunk offsets and reads the text back for search results.
+    """
+    # Arrange
+    kb_dir = tmp_path / "kb"
+    kb_dir.mkdir()
+    _write(kb_dir, DOCUMENT)
+    index = KnowledgeBaseIndex(str(kb_dir))
+
+    # Act
+    index.build()
+    results = index.search("kymographs first item")
+
+    # Assert
+    assert all("text" not in chunk for chunk in index.chunks.values())
+    assert results[0]["paragraph"] == "- first item\n- second item"
+    assert results[0]["heading"] == "Mechanical waves > Results > Kymographs"
@@ -0,0 +1,40 @@
+from tools.cow_dict import CopyOnWriteDict
+
+def test_copies_are_independent():
+    """
+    Tests that writes and deletions on a copy are not seen by the original, and the other way round.
+    """
+    # Arrange
+    original = CopyOnWriteDict({"a": 1, "b": 2})
+
+    # Act
+    copy = original.copy()
+    copy["c"] = 3
+    del copy["a"]
+    original["b"] = 20
+
+    # Assert
+    assert copy.to_dict() == {"b": 2, "c": 3}
+    assert original.to_dict() == {"a": 1, "b": 20}
+    assert len(copy) == 2 and len(original) == 2
+    assert "a" not in copy and copy.get("a") is None
+
+def test_layers_are_merged_and_deletion_markers_dropped():
+    """
+    Tests that repeated copies keep the number of layers logarithmic and drop deleted keys when merging into the bottom layer.
+    """
+    # Arrange
+    snapshot = CopyOnWriteDict({key: key for key in range(100)})
+
+    # Act
+    for key in range(100):
+        del snapshot[key]
+        snapshot[100 + key] = key
+        snapshot = snapshot.copy()
+
+    # Assert
+    assert snapshot.to_dict() == {100 + key: key for key in range(100)}
+    assert len(snapshot) == 100
+    assert len(snapshot._layers) <= 10
+    assert sum(len(layer) for layer in snapshot._layers) < 300
+    assert snapshot.getter()(150) == 50
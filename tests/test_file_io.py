@@ -1,5 +1,9 @@
 import os
-from tools.file_io import read_file, write_file
+import pytest
+from tools import kb_index
+from tools.file_io import add_file_to_kb, append_to_file, apply_patch, read_file, read_file_range, replace_lines, write_file
+from tools.knowledge_base import search_knowledge_base
+
 
 def test_write_and_read_file_success(tmp_path):
     """
@@ -23,6 +27,7 @@ def test_write_and_read_file_success(tmp_path):
     assert error is None
     assert read_content == content_to_write
 
+
 def test_read_file_not_found():
     """
     Tests that reading a non-existent file returns an appropriate error.
@@ -35,4 +40,167 @@ def test_read_file_not_found():
 
     # Assert: Check that the content is None and an error message is returned
     assert content is None
-    assert "File not found" in error
\ No newline at end of file
+    assert "File not found" in error
+
+
+def test_add_file_to_kb_skips_identical_content(tmp_path):
+    """
+    Tests that a file whose content is already in the knowledge base is not copied again.
+    """
+    # Arrange
+    kb_dir = tmp_path / "kb"
+    source = tmp_path / "paper.md"
+    source.write_text("Mechanical waves in tissue expansion.", encoding="utf-8")
+    renamed = tmp_path / "paper_copy.md"
+    renamed.write_text("Mechanical waves in tissue expansion.", encoding="utf-8")
+
+    # Act
+    first_msg, first_error = add_file_to_kb(str(source), kb_dir=str(kb_dir))
+    second_msg, second_error = add_file_to_kb(str(renamed), kb_dir=str(kb_dir))
+
+    # Assert
+    assert first_error is None and second_error is None
+    assert "indexed 1 paragraph(s)" in first_msg
+    assert "Skipped 'paper_copy.md'" in second_msg
+    assert not (kb_dir / "paper_copy.md").exists()
+
+
+def test_add_file_to_kb_reindexes_a_file_replaced_under_the_same_name(tmp_path, monkeypatch):
+    """
+    Tests that re-adding a changed file with the same name indexes the new content, without rescanning the knowledge base.
+    """
+    # Arrange
+    kb_dir = tmp_path / "kb"
+    source = tmp_path / "animals.md"
+    source.write_text("Zebras graze on the savanna.", encoding="utf-8")
+    add_file_to_kb(str(source), kb_dir=str(kb_dir))
+    source.write_text("Elephants remember the watering holes of the savanna.", encoding="utf-8")
+
+    # Act
+    with monkeypatch.context() as patched:
+        patched.setattr(kb_index, "scan_directory", lambda kb_dir: pytest.fail("the knowledge base was rescanned"))
+        message, error = add_file_to_kb(str(source), kb_dir=str(kb_dir))
+    elephants = search_knowledge_base.invoke({"query": "elephants", "knowledge_base_dir": str(kb_dir)})
+    zebras = search_knowledge_base.invoke({"query": "zebras", "knowledge_base_dir": str(kb_dir)})
+
+    # Assert
+    assert error is None and "indexed 1 paragraph(s)" in message
+    assert "Elephants remember the watering holes" in elephants
+    assert "Elephants" not in zebras and "Zebras" not in zebras
+
+
+def _draft(tmp_path, lines=300):
+    path = tmp_path / "draft.md"
+    path.write_text("".join(f"Line {i} of the draft.\n" for i in range(1, lines + 1)), encoding="utf-8")
+    return path
+
+
+def test_apply_patch_applies_unified_diff_or_nothing(tmp_path):
+    """
+    Tests that a unified diff is applied with shifted line numbers, and that a stale one leaves the file unchanged.
+    """
+    # Arrange
+    path = _draft(tmp_path)
+    patch = """--- a/draft.md
++++ b/draft.md
+@@ -9,3 +9,4 @@
+ Line 9 of the draft.
+-Line 10 of the draft.
++Line ten, revised.
++An added line.
+ Line 11 of the draft.
+@@ -255,3 +256,2 @@
+ Line 249 of the draft.
+-Line 250 of the draft.
+ Line 251 of the draft.
+"""
+
+    # Act
+    result = apply_patch.invoke({"filepath": str(path), "patch": patch})
+    patched = path.read_text(encoding="utf-8")
+    stale = apply_patch.invoke({"filepath": str(path), "patch": patch})
+
+    # Assert
+    assert result == f"Successfully applied 2 hunk(s) to {path}"
+    assert "Line 9 of the draft.\nLine ten, revised.\nAn added line.\nLine 11 of the draft.\n" in patched
+    assert "Line 250 of" not in patched and patched.count("\n") == 300
+    assert stale.startswith("Error: Hunk 1 does not apply")
+    assert path.read_text(encoding="utf-8") == patched
+
+
+def test_replace_lines_checks_expected_content_and_keeps_line_endings(tmp_path):
+    """
+    Tests that a line range is replaced in a CRLF file, and refused when the lines are not the expected ones.
+    """
+    # Arrange
+    path = tmp_path / "notes.md"
+    path.write_bytes(b"first\r\nsecond\r\nthird\r\n")
+
+    # Act
+    refused = replace_lines.invoke({"filepath": str(path), "start_line": 2, "end_line": 2,
+                                    "new_content": "x", "expected_content": "other"})
+    result = replace_lines.invoke({"filepath": str(path), "start_line": 2, "end_line": 2,
+                                   "new_content": "2a\n2b", "expected_content": "second"})
+
+    # Assert
+    assert refused.startswith("Error: Lines 2-2 do not match")
+    assert result == f"Successfully replaced 1 line(s) with 2 line(s) in {path}"
+    assert path.read_bytes() == b"first\r\n2a\r\n2b\r\nthird\r\n"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_read_file_range_and_append(tmp_path):
+    """
+    Tests that a range of a long file is read with line numbers and that appending keeps the existing content.
+    """
+    path = _draft(tmp_path)
+
+    excerpt = read_file_range.invoke({"filepath": str(path), "start_line": 299, "max_lines": 5})
+    appended = append_to_file.invoke({"filepath": str(path), "content": "The end.\n"})
+
+    assert excerpt == (f"Lines 299-300 of 300 in {path}:\n   299| Line 299 of the draft.\n   300| Line 300 of the draft.")
+    assert appended.startswith("Successfully appended")
+    assert path.read_text(encoding="utf-8").endswith("Line 300 of the draft.\nThe end.\n")
+
+
+def test_apply_patch_counts_hunk_lines_from_the_header(tmp_path):
+    """
+    Tests that a removed line starting with "-- " at the start of a hunk is removed rather than taken for a file
+    header, and that blank lines after the last hunk are not taken for context lines.
+    """
+    # Arrange
+    path = tmp_path / "notes.md"
+    path.write_text("-- a signature\nbody\n", encoding="utf-8")
+    patch = "--- a/notes.md\n+++ b/notes.md\n@@ -1,2 +1,2 @@\n--- a signature\n+-- a new signature\n body\n\n\n"
+
+    # Act
+    result = apply_patch.invoke({"filepath": str(path), "patch": patch})
+    too_long = apply_patch.invoke({"filepath": str(path), "patch": "@@ -1,1 +1,1 @@\n-body\n+text\n+more\n"})
+
+    # Assert
+    assert result == f"Successfully applied 1 hunk(s) to {path}"
+    assert path.read_text(encoding="utf-8") == "-- a new signature\nbody\n"
+    assert "more lines than its header says" in too_long
+
+
+def test_apply_patch_adds_and_removes_the_final_newline(tmp_path):
+    """
+    Tests that the "\\ No newline at end of file" marker is applied to the side of the hunk it follows.
+    """
+    # Arrange
+    added = tmp_path / "added.md"
+    added.write_text("a\nb", encoding="utf-8")
+    removed = tmp_path / "removed.md"
+    removed.write_text("a\nb\n", encoding="utf-8")
+    kept = tmp_path / "kept.md"
+    kept.write_text("a\nb", encoding="utf-8")
+
+    # Act
+    apply_patch.invoke({"filepath": str(added), "patch": "@@ -2 +2 @@\n-b\n\\ No newline at end of file\n+B\n"})
+    apply_patch.invoke({"filepath": str(removed), "patch": "@@ -2 +2 @@\n-b\n+B\n\\ No newline at end of file\n"})
+    apply_patch.invoke({"filepath": str(kept), "patch": "@@ -1,2 +1,2 @@\n-a\n+A\n b\n\\ No newline at end of file\n"})
+
+    # Assert
+    assert added.read_bytes() == b"a\nB\n"
+    assert removed.read_bytes() == b"a\nB"
+    assert kept.read_bytes() == b"A\nb"
@@ -0,0 +1,149 @@
+import random
+from collections import Counter
+from thefuzz import fuzz
+from tools.chunker import iter_chunks
+from tools.fuzzy_search import FuzzyScorer
+from tools.knowledge_base import find_matches, search_knowledge_base
+
+WORDS = ["mechanical", "wave", "waves", "tissue", "expansion", "traction", "force", "monolayer",
+         "jamming", "cell", "cells", "stress", "strain", "vinculin", "myosin", "力学", "波", "2012",
+         "Serra-Picamal", "PIV", "kymograph", "é", "the", "of", "in", "a"]
+
+def _reference_scores(query, paragraphs, score_cutoff):
+    """
+    The original search_knowledge_base scoring loop, kept as the ground truth.
+    """
+    matches = []
+    for key, para in paragraphs:
+        score = fuzz.partial_ratio(query.lower(), para.lower())
+        if score >= score_cutoff:
+            matches.append((key, score))
+    return matches
+
+def _random_corpus(rng, size):
+    corpus = []
+    for key in range(size):
+        length = rng.choice([1, 2, 5, 20, 80])
+        corpus.append((key, " ".join(rng.choice(WORDS) for _ in range(length))))
+    return corpus
+
+def _random_queries(rng, corpus, count):
+    queries = ["", "x", "MECHANICAL WAVES", "zzzz qqqq", "力学波"]
+    for _ in range(count):
+        if rng.random() < 0.5:
+            # A fragment of an existing paragraph, possibly with a typo
+            text = rng.choice(corpus)[1]
+            start = rng.randrange(len(text))
+            fragment = text[start:start + rng.randint(3, 40)]
+            if fragment and rng.random() < 0.5:
+                pos = rng.randrange(len(fragment))
+                fragment = fragment[:pos] + rng.choice("xyz") + fragment[pos + 1:]
+            queries.append(fragment)
+        else:
+            queries.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))))
+    return queries
+
+def test_scorer_matches_reference_implementation():
+    """
+    Tests that prefiltering never changes the set of matches or their scores.
+    """
+    rng = random.Random(0)
+    corpus = _random_corpus(rng, 300)
+    texts = dict(corpus)
+    scorer = FuzzyScorer(max_workers=1)
+
+    for query in _random_queries(rng, corpus, 60):
+        for score_cutoff in (0, 40, 65, 80, 95, 100):
+            expected = _reference_scores(query, corpus, score_cutoff)
+            assert scorer.score(query, corpus, score_cutoff=score_cutoff) == expected, (query, score_cutoff)
+            # Streaming the corpus and reusing its per-character columns must not change anything either
+            assert scorer.score_corpus(query, list(texts), lambda keys: {key: texts[key] for key in keys},
+                                       score_cutoff=score_cutoff, corpus_id="corpus") == expected
+
+def test_parallel_scoring_matches_reference_implementation():
+    """
+    Tests that fanning the work out to the process pool returns the same matches in the same order.
+    """
+    rng = random.Random(1)
+    corpus = _random_corpus(rng, 400)
+    scorer = FuzzyScorer(max_workers=2)
+    try:
+        for query in _random_queries(rng, corpus, 10):
+            for score_cutoff in (0, 65, 90):
+                expected = _reference_scores(query, corpus, score_cutoff)
+                assert scorer.score(query, corpus, score_cutoff=score_cutoff, parallel=True) == expected
+    finally:
+        scorer.shutdown()
+
+def test_prefilter_skips_paragraphs_that_cannot_match(monkeypatch):
+    """
+    Tests that the character-count bound actually avoids calling partial_ratio.
+    """
+    scorer = FuzzyScorer(max_workers=1)
+    corpus = [(0, "mechanical waves in tissue"), (1, "0123456789"), (2, "力学波")]
+    calls = []
+    original = fuzz.partial_ratio
+    monkeypatch.setattr(fuzz, "partial_ratio", lambda a, b: calls.append(b) or original(a, b))
+
+    matches = scorer.score("mechanical waves", corpus, score_cutoff=80)
+
+    assert matches == [(0, 100)]
+    assert calls == ["mechanical waves in tissue"]
+
+def test_streamed_corpus_only_rereads_paragraphs_that_may_match():
+    """
+    Tests that once the counts of the query characters are known, a streamed corpus only reads the paragraphs whose
+    bound reaches the cutoff, and that no text is cached.
+    """
+    # Arrange
+    scorer = FuzzyScorer(max_workers=1)
+    texts = {0: "mechanical waves in tissue", 1: "0123456789", 2: "力学波", 3: "waves of cells"}
+    read = []
+    def read_texts(keys):
+        read.extend(keys)
+        return {key: texts[key] for key in keys}
+
+    # Act
+    first = scorer.score_corpus("mechanical waves", list(texts), read_texts, score_cutoff=80, corpus_id="corpus")
+    first_read, read[:] = list(read), []
+    second = scorer.score_corpus("mechanical waves", list(texts), read_texts, score_cutoff=80, corpus_id="corpus")
+
+    # Assert
+    assert first == second == [(0, 100)]
+    assert first_read == [0, 1, 2, 3]
+    assert read == [0]
+    assert scorer._cache == {}
+
+def test_exhaustive_search_matches_original_tool_output(tmp_path):
+    """
+    Tests that exhaustive search returns exactly the paragraphs and scores of the original implementation.
+    """
+    # Arrange
+    rng = random.Random(2)
+    kb_dir = tmp_path / "kb"
+    kb_dir.mkdir()
+    paragraphs = []
+    for file_no in range(5):
+        paras = [text for _, text in _random_corpus(rng, 20)]
+        (kb_dir / f"paper_{file_no}.md").write_text("\n\n".join(paras), encoding="utf-8")
+        paragraphs.extend((f"paper_{file_no}.md", chunk["text"]) for chunk in iter_chunks(str(kb_dir / f"paper_{file_no}.md")))
+
+    for query in ["mechanical wave", "vinculin myosin", "kymographs", "力学"]:
+        expected = _reference_scores(query, paragraphs, 70)
+
+        # Act
+        results = search_knowledge_base.invoke({
+            "query": query,
+            "knowledge_base_dir": str(kb_dir),
+            "score_cutoff": 70,
+            "exhaustive": True,
+        })
+
+        # Assert
+        if not expected:
+            assert results == "No relevant information found in the knowledge base."
+            continue
+        assert 0 < int(results.split()[1]) <= len(expected)  # Near-duplicates are not counted
+        # The tool only shows the best few; every match is compared through find_matches
+        matches = find_matches(query, str(kb_dir), score_cutoff=70, exhaustive=True)
+        assert Counter((m["filepath"], m["score"]) for m in matches) == Counter(expected)
@@ -0,0 +1,86 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from core.history import HistoryManager, estimate_tokens, local_summarizer
+
+def _add_turns(history, count, words=50, start=0):
+    for i in range(start, start + count):
+        history.append(HumanMessage(content=f"question {i} " + "word " * words))
+        history.append(AIMessage(content=f"answer {i} " + "word " * words))
+
+def test_estimate_tokens_counts_cjk_characters_individually():
+    """
+    Tests that the offline token estimate handles both English and Chinese text.
+    """
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd" * 10) == 10
+    assert estimate_tokens("力学波") == 3
+
+def test_history_within_budget_is_sent_verbatim():
+    """
+    Tests that nothing is summarized while the history fits in the budget.
+    """
+    history = HistoryManager(token_budget=10_000)
+    _add_turns(history, 3)
+
+    context = history.build_context()
+
+    assert context == history.messages
+    assert history.last_usage["saved_tokens"] == 0
+    assert history.summarized_upto == 0
+
+def test_old_turns_are_folded_into_summary_when_over_budget():
+    """
+    Tests that compaction keeps the recent turns verbatim, summarizes whole older turns and stays in budget.
+    """
+    # Arrange
+    folded_batches = []
+    def summarizer(previous, messages):
+        folded_batches.append(messages)
+        return (previous + " " if previous else "") + f"{len(messages)} messages"
+    history = HistoryManager(token_budget=200, min_recent_messages=2, summarizer=summarizer)
+    _add_turns(history, 10)
+
+    # Act
+    context = history.build_context()
+
+    # Assert
+    assert isinstance(context[0], SystemMessage)
+    assert "messages" in context[0].content
+    assert isinstance(context[1], HumanMessage)
+    assert context[-1] is history.messages[-1]
+    assert history.summarized_upto % 2 == 0
+    assert folded_batches[0] == history.messages[:history.summarized_upto]
+    usage = history.last_usage
+    assert usage["sent_tokens"] <= 200
+    assert usage["raw_tokens"] > usage["sent_tokens"]
+    assert usage["saved_tokens"] == usage["raw_tokens"] - usage["sent_tokens"]
+
+def test_minimum_recent_messages_are_kept_even_over_budget():
+    """
+    Tests that the latest exchange is never summarized away, however small the budget.
+    """
+    history = HistoryManager(token_budget=1, min_recent_messages=2)
+    _add_turns(history, 3, words=500)
+
+    context = history.build_context()
+
+    assert context[-2:] == history.messages[-2:]
+    assert history.summarized_upto == 4
+
+def test_pinned_messages_are_always_sent_and_never_summarized():
+    """
+    Tests that a pinned message survives compaction and is not duplicated.
+    """
+    # Arrange
+    history = HistoryManager(token_budget=150, min_recent_messages=2, summarizer=local_summarizer)
+    _add_turns(history, 1)
+    pinned = history.messages[1]
+    history.pin(pinned)
+    _add_turns(history, 6, start=1)
+
+    # Act
+    context = history.build_context()
+
+    # Assert
+    assert context.count(pinned) == 1
+    assert "answer 0" not in context[0].content
+    assert history.last_usage["pinned_tokens"] > 0
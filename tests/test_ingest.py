@@ -0,0 +1,99 @@
+import os
+import time
+from tools.ingest import IngestionWorker
+from tools.kb_index import get_index, get_index_if_loaded
+
+def _make_source_dir(tmp_path):
+    source_dir = tmp_path / "papers"
+    (source_dir / "nested").mkdir(parents=True)
+    (source_dir / "a.md").write_text("Mechanical waves propagate through the monolayer.", encoding="utf-8")
+    (source_dir / "nested" / "b.md").write_text("Vinculin is recruited under tension.", encoding="utf-8")
+    (source_dir / "nested" / "b_copy.md").write_text("Vinculin is recruited under tension.", encoding="utf-8")
+    (source_dir / "notes.txt").write_text("ignored", encoding="utf-8")
+    return source_dir
+
+def test_submit_directory_imports_and_indexes_in_background(tmp_path):
+    """
+    Tests that a whole directory is imported by the worker and reported through its status.
+    """
+    # Arrange
+    kb_dir = tmp_path / "kb"
+    source_dir = _make_source_dir(tmp_path)
+    worker = IngestionWorker(kb_dir=str(kb_dir), embed=False)
+
+    # Act
+    job_id, error = worker.submit(str(source_dir))
+    assert worker.wait(timeout=10)
+
+    # Assert
+    assert error is None
+    job = worker.status()["jobs"][0]
+    assert job["id"] == job_id
+    assert job["status"] == "done"
+    assert (job["total"], job["added"], job["skipped"]) == (3, 2, 1)
+    assert sorted(p.name for p in kb_dir.glob("*.md")) == ["a.md", "b.md"]
+    assert worker.status()["index"]["files"] == 2
+    assert worker.pop_finished()[0]["id"] == job_id
+    assert worker.pop_finished() == []
+    worker.stop()
+
+def test_submit_rejects_relative_and_missing_paths(tmp_path):
+    """
+    Tests that invalid sources are reported immediately instead of being queued.
+    """
+    worker = IngestionWorker(kb_dir=str(tmp_path / "kb"), embed=False)
+
+    assert worker.submit("relative/path.md")[1].startswith("Error: Source path must be absolute")
+    assert worker.submit(str(tmp_path / "missing.md"))[1].startswith("Error: Source path not found")
+    assert worker.status()["jobs"] == []
+    worker.stop()
+
+def test_watcher_indexes_files_added_outside_the_agent(tmp_path):
+    """
+    Tests that polling picks up a file dropped directly into the knowledge base.
+    """
+    # Arrange
+    kb_dir = tmp_path / "kb"
+    kb_dir.mkdir()
+    get_index(str(kb_dir))
+    worker = IngestionWorker(kb_dir=str(kb_dir), watch_interval=0.05, embed=False)
+
+    # Act
+    (kb_dir / "dropped.md").write_text("Cadherin mediates adhesion.", encoding="utf-8")
+    deadline = time.time() + 10
+    while time.time() < deadline and "dropped.md" not in get_index_if_loaded(str(kb_dir)).manifest.entries:
+        time.sleep(0.05)
+    worker.stop()
+
+    # Assert
+    assert get_index_if_loaded(str(kb_dir)).search("cadherin")[0]["filepath"] == "dropped.md"
+
+def test_watcher_reindexes_files_edited_in_place_and_reports_every_namespace(tmp_path):
+    """
+    Tests that polling notices a file rewritten in place, which leaves the directory mtime unchanged, and that the
+    status lists the index of every namespace.
+    """
+    # Arrange
+    kb_dir = tmp_path / "kb"
+    (kb_dir / "wound").mkdir(parents=True)
+    (kb_dir / "notes.md").write_text("Cadherin mediates adhesion.", encoding="utf-8")
+    (kb_dir / "wound" / "edge.md").write_text("Leader cells pull the edge.", encoding="utf-8")
+    get_index(str(kb_dir))
+    get_index(str(kb_dir / "wound"))
+    dir_mtime_ns = (kb_dir / "wound").stat().st_mtime_ns
+    worker = IngestionWorker(kb_dir=str(kb_dir), watch_interval=0.05, embed=False)
+
+    # Act
+    (kb_dir / "wound" / "edge.md").write_text("Lamellipodia protrude at the edge.", encoding="utf-8")
+    os.utime(kb_dir / "wound", ns=(dir_mtime_ns, dir_mtime_ns))
+    deadline = time.time() + 10
+    while time.time() < deadline and not get_index_if_loaded(str(kb_dir / "wound")).search("lamellipodia"):
+        time.sleep(0.05)
+    worker.stop()
+    status = worker.status()
+
+    # Assert
+    assert get_index_if_loaded(str(kb_dir / "wound")).search("lamellipodia")[0]["filepath"] == "edge.md"
+    assert [namespace["namespace"] for namespace in status["namespaces"]] == ["default", "wound"]
+    assert all(namespace["index"]["files"] == 1 for namespace in status["namespaces"])
+    assert status["index"] == status["namespaces"][0]["index"]
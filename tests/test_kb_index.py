@@ -0,0 +1,247 @@
+import os
+from tools import kb_index
+from tools.kb_index import KnowledgeBaseIndex, get_index, tokenize
+from tools.knowledge_base import search_knowledge_base
+
+def _make_kb(tmp_path):
+    kb_dir = tmp_path / "kb"
+    kb_dir.mkdir()
+    (kb_dir / "waves.md").write_text(
+        "# Mechanical waves\n\nMechanical waves propagate through the expanding monolayer.\n\n"
+        "Traction forces were measured with traction force microscopy.",
+        encoding="utf-8")
+    (kb_dir / "jamming.md").write_text(
+        "# Jamming\n\nThe jamming transition in dense cell collectives resembles granular matter.",
+        encoding="utf-8")
+    return kb_dir
+
+def test_tokenize_lowercases_and_splits_cjk():
+    """
+    Tests that terms are lowercased and CJK characters become single-character terms.
+    """
+    assert tokenize("Mechanical Waves, 2012") == ["mechanical", "waves", "2012"]
+    assert tokenize("力学波") == ["力", "学", "波"]
+
+def test_bm25_ranks_matching_paragraph_first(tmp_path):
+    """
+    Tests that the BM25 search returns the paragraph sharing the most query terms first.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    index = KnowledgeBaseIndex(str(kb_dir))
+    index.build()
+
+    # Act
+    results = index.search("traction force microscopy", top_k=3)
+
+    # Assert
+    assert results[0]["filepath"] == "waves.md"
+    assert results[0]["paragraph"].startswith("Traction forces")
+    assert all(r["score"] > 0 for r in results)
+
+def test_index_is_persisted_and_reloaded(tmp_path):
+    """
+    Tests that a saved index can be loaded back and answers queries identically.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    built = KnowledgeBaseIndex(str(kb_dir))
+    built.build()
+    built.save()
+
+    # Act
+    loaded = KnowledgeBaseIndex(str(kb_dir))
+
+    # Assert
+    assert loaded.load()
+    assert loaded.is_fresh()
+    assert loaded.search("jamming transition") == built.search("jamming transition")
+
+def test_get_index_rebuilds_when_a_file_is_added(tmp_path):
+    """
+    Tests that the cached index notices new files in the knowledge base.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    assert get_index(str(kb_dir)).search("vinculin") == []
+
+    # Act
+    (kb_dir / "vinculin.md").write_text("Vinculin is recruited under tension.", encoding="utf-8")
+    results = get_index(str(kb_dir)).search("vinculin")
+
+    # Assert
+    assert len(results) == 1
+    assert results[0]["filepath"] == "vinculin.md"
+
+def test_search_uses_persisted_index_without_rereading_files(tmp_path, monkeypatch):
+    """
+    Tests that once the index exists on disk, a fresh process does not read the documents again.
+    """
+    # Arrange: build the index, then forget the in-process cache
+    kb_dir = _make_kb(tmp_path)
+    get_index(str(kb_dir))
+    assert os.path.exists(os.path.join(kb_dir, ".index", "bm25.json"))
+    kb_index._INDEXES.clear()
+
+    def fail_build(self):
+        raise AssertionError("index should have been loaded from disk")
+    monkeypatch.setattr(KnowledgeBaseIndex, "build", fail_build)
+
+    # Act
+    results = search_knowledge_base.invoke({
+        "query": "jamming transition",
+        "knowledge_base_dir": str(kb_dir),
+        "score_cutoff": 60,
+    })
+
+    # Assert
+    assert "From: jamming.md" in results
+
+def test_refresh_only_reads_new_files(tmp_path, monkeypatch):
+    """
+    Tests that adding a file to an indexed knowledge base only reads that file.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    index = get_index(str(kb_dir))
+    chunked = []
+    original_iter_chunks = kb_index.iter_chunks
+    monkeypatch.setattr(kb_index, "iter_chunks", lambda path: chunked.append(os.path.basename(path)) or original_iter_chunks(path))
+
+    # Act
+    (kb_dir / "new.md").write_text("Cadherin mediates adhesion.", encoding="utf-8")
+    assert index.refresh()
+
+    # Assert
+    assert chunked == ["new.md"]
+    assert index.search("cadherin")[0]["filepath"] == "new.md"
+
+def test_refresh_drops_chunks_of_deleted_and_changed_files(tmp_path):
+    """
+    Tests that deleted files disappear from the index and changed files are re-indexed.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    index = get_index(str(kb_dir))
+
+    # Act
+    (kb_dir / "jamming.md").unlink()
+    (kb_dir / "waves.md").write_text("Solitary waves were never observed.", encoding="utf-8")
+    index.refresh()
+
+    # Assert
+    assert "jamming.md" not in index.manifest.entries
+    assert index.search("jamming") == []
+    assert index.search("traction") == []
+    assert [r["paragraph"] for r in index.search("waves")] == ["Solitary waves were never observed."]
+    assert "jamming" not in index.postings
+
+def test_touched_file_is_not_reindexed(tmp_path):
+    """
+    Tests that a file whose mtime changed but whose content did not keeps its chunks.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    index = get_index(str(kb_dir))
+    chunk_ids = list(index.manifest.entries["waves.md"]["chunk_ids"])
+
+    # Act
+    os.utime(kb_dir / "waves.md", ns=(1, 1))
+    (kb_dir / "other.txt").write_text("not markdown", encoding="utf-8")
+    index.refresh()
+
+    # Assert
+    assert index.manifest.entries["waves.md"]["chunk_ids"] == chunk_ids
+    assert index.manifest.entries["waves.md"]["mtime_ns"] == 1
+
+def test_file_rewritten_in_place_is_reindexed(tmp_path, monkeypatch):
+    """
+    Tests that a file edited in place, which leaves the directory mtime unchanged, is never read through its old offsets and gets re-indexed.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    index = get_index(str(kb_dir))
+    dir_mtime_ns = os.stat(kb_dir).st_mtime_ns
+
+    # Act
+    (kb_dir / "waves.md").write_text("Elephants never forget; traction forces were not measured at all.", encoding="utf-8")
+    os.utime(kb_dir, ns=(dir_mtime_ns, dir_mtime_ns))
+    stale = [r["paragraph"] for r in index.search("traction")]
+    monkeypatch.setattr(kb_index, "FRESHNESS_CHECK_SECONDS", 3600)
+    fresh = get_index(str(kb_dir))
+
+    # Assert
+    assert stale == [""]
+    assert fresh is not index
+    assert [r["paragraph"] for r in fresh.search("traction")] == ["Elephants never forget; traction forces were not measured at all."]
+    assert fresh.search("mechanical") == []
+
+def test_identical_content_under_another_name_is_not_indexed_twice(tmp_path):
+    """
+    Tests that byte-identical copies are recorded as duplicates and take over when the original goes away.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    index = get_index(str(kb_dir))
+
+    # Act
+    (kb_dir / "z_copy.md").write_bytes((kb_dir / "jamming.md").read_bytes())
+    index.refresh()
+
+    # Assert
+    assert index.manifest.entries["z_copy.md"]["duplicate_of"] == "jamming.md"
+    assert {r["filepath"] for r in index.search("jamming transition")} == {"jamming.md"}
+
+    # Act: remove the original
+    (kb_dir / "jamming.md").unlink()
+    index.refresh()
+
+    # Assert: the copy is now indexed in its own right
+    assert "duplicate_of" not in index.manifest.entries["z_copy.md"]
+    assert index.search("jamming transition")[0]["filepath"] == "z_copy.md"
+
+def test_change_log_is_replayed_on_load(tmp_path):
+    """
+    Tests that incremental changes are persisted through the log and survive a reload.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    index = get_index(str(kb_dir))
+    (kb_dir / "new.md").write_text("Cadherin mediates adhesion.", encoding="utf-8")
+    (kb_dir / "jamming.md").unlink()
+    index.refresh()
+    assert os.path.exists(index.log_path)
+
+    # Act
+    reloaded = KnowledgeBaseIndex(str(kb_dir))
+    assert reloaded.load()
+
+    # Assert
+    assert reloaded.generation == index.generation
+    assert reloaded.manifest.entries == index.manifest.entries
+    assert reloaded.chunks == index.chunks
+    assert reloaded.postings == index.postings
+    assert reloaded.is_fresh()
+
+def test_published_snapshots_are_not_modified_by_later_updates(tmp_path):
+    """
+    Tests that a search holding an older index keeps seeing a consistent snapshot.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    old = get_index(str(kb_dir))
+    old_postings = {term: dict(plist) for term, plist in old.postings.items()}
+    old_entries = dict(old.manifest.entries)
+
+    # Act
+    (kb_dir / "waves.md").write_text("Mechanical waves were not observed.", encoding="utf-8")
+    (kb_dir / "new.md").write_text("Mechanical waves and cadherin.", encoding="utf-8")
+    new = get_index(str(kb_dir))
+
+    # Assert
+    assert new is not old
+    assert new.generation == old.generation + 1
+    assert old.postings == old_postings
+    assert old.manifest.entries == old_entries
+    assert old.search("cadherin") == []
+    assert new.search("cadherin")[0]["filepath"] == "new.md"
@@ -0,0 +1,143 @@
+import re
+import threading
+from core.agent import ResearchAgent
+from core.prefetch import KnowledgePrefetcher
+from tools.ingest import IngestionWorker
+from tools.kb_index import get_index_if_loaded
+from tools.kb_namespaces import create_namespace, fan_out, list_namespaces
+from tools.knowledge_base import search_knowledge_base
+from tools.vector_store import VectorIndex, get_vector_index
+
+def _make_kb(tmp_path):
+    kb_dir = tmp_path / "kb"
+    kb_dir.mkdir()
+    (kb_dir / "general.md").write_text("Traction forces are measured with traction force microscopy.\n", encoding="utf-8")
+    for name, text in [("wound", "Traction forces peak at the leading edge of the wound.\n"),
+                       ("organoids", "Traction forces shape the crypts of intestinal organoids.\n")]:
+        assert create_namespace(str(kb_dir), name)[1] is None
+        (kb_dir / name / f"{name}.md").write_text(text, encoding="utf-8")
+    return kb_dir
+
+def test_search_targets_one_namespace_or_fans_out(tmp_path):
+    """
+    Tests that a search only touches the shards of the namespaces it names, and merges the results of several.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    query = {"query": "traction forces", "knowledge_base_dir": str(kb_dir), "rerank": False}
+
+    # Act
+    narrow = search_knowledge_base.invoke({**query, "namespaces": ["wound"]})
+    untouched = [get_index_if_loaded(str(kb_dir / "organoids")), get_index_if_loaded(str(kb_dir))]
+    wide = search_knowledge_base.invoke(query)
+    unknown = search_knowledge_base.invoke({**query, "namespaces": ["wound", "zebrafish"]})
+
+    # Assert
+    assert list_namespaces(str(kb_dir)) == ["default", "organoids", "wound"]
+    assert "From: wound/wound.md" in narrow and "Found 1 relevant snippet(s)" in narrow
+    assert untouched == [None, None]
+    assert "Found 3 relevant snippet(s)" in wide
+    assert all(f"From: {path}" in wide for path in ("general.md", "wound/wound.md", "organoids/organoids.md"))
+    assert unknown == "Error: Unknown namespace(s) zebrafish. Available: default, organoids, wound."
+    assert create_namespace(str(kb_dir), "wound")[1] == "Error: Namespace 'wound' already exists."
+    assert create_namespace(str(kb_dir), "../up")[1].startswith("Error: Invalid namespace name")
+
+def test_agent_searches_and_imports_into_selected_namespaces(tmp_path):
+    """
+    Tests that the agent's search tools and the prefetch default to the selected namespaces, and that files are
+    imported into a namespace.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    source = tmp_path / "crypts.md"
+    source.write_text("Crypt fission in organoids.\n", encoding="utf-8")
+    prefetcher = KnowledgePrefetcher(knowledge_base_dir=str(kb_dir))
+    agent = ResearchAgent(model="test", api_key="test", api_base="http://127.0.0.1:9/v1", prefetcher=prefetcher)
+    search = next(t for t in agent.tools if t.name == "search_knowledge_base")
+    worker = IngestionWorker(kb_dir=str(kb_dir), embed=False)
+
+    # Act
+    agent.namespaces = ["organoids"]
+    selected = search.invoke({"query": "traction forces", "knowledge_base_dir": str(kb_dir), "rerank": False})
+    named = search.invoke({"query": "traction forces", "knowledge_base_dir": str(kb_dir), "rerank": False,
+                           "namespaces": ["default"]})
+    prefetched = prefetcher.fetch("traction forces", agent.namespaces)
+    job_id, error = worker.submit(str(source), namespace="organoids")
+    assert worker.wait(timeout=10)
+
+    # Assert
+    assert "From: organoids/organoids.md" in selected and "Found 1 relevant snippet(s)" in selected
+    assert "From: general.md" in named and "Found 1 relevant snippet(s)" in named
+    assert "organoids/organoids.md" in prefetched and "wound" not in prefetched
+    assert error is None and (kb_dir / "organoids" / "crypts.md").exists()
+    assert worker.submit(str(source), namespace="zebrafish")[1].startswith("Error: Namespace 'zebrafish' does not exist")
+    worker.stop()
+    agent.close()
+
+def test_bm25_scores_are_normalized_per_shard_when_several_are_merged(tmp_path):
+    """
+    Tests that without re-ranking, the best match of every shard scores 1.0, whatever the term statistics of its shard.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    (kb_dir / "wound" / "other.md").write_text("Traction.\n", encoding="utf-8")
+    query = {"query": "traction forces", "knowledge_base_dir": str(kb_dir), "rerank": False}
+
+    # Act
+    wide = search_knowledge_base.invoke(query)
+    narrow = search_knowledge_base.invoke({**query, "namespaces": ["wound"]})
+
+    # Assert
+    assert re.findall(r"Score: ([\d.]+)", wide).count("1.0") == 3
+    assert "Score: 1.0" not in narrow
+
+def test_fan_out_normalizes_scores_of_several_shards_unless_told_otherwise(tmp_path):
+    """
+    Tests that merged shards are ranked on normalized scores by default, and on their own scores when they are comparable.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    scores = {"wound": [8.0, 4.0], "organoids": [0.5]}
+    def search_shard(shard_dir):
+        name = shard_dir.rsplit("/", 1)[-1]
+        return [{"filepath": f"{name}.md", "score": score} for score in scores[name]]
+
+    # Act
+    normalized = fan_out(search_shard, str(kb_dir), ["wound", "organoids"])
+    raw = fan_out(search_shard, str(kb_dir), ["wound", "organoids"], normalize=False)
+    single = fan_out(search_shard, str(kb_dir), ["wound"])
+
+    # Assert
+    assert [(m["namespace"], m["score"]) for m in normalized] == [("wound", 1.0), ("organoids", 1.0), ("wound", 0.5)]
+    assert [m["score"] for m in raw] == [8.0, 4.0, 0.5]
+    assert [m["score"] for m in single] == [8.0, 4.0]
+
+def test_vector_index_build_only_blocks_its_own_directory(tmp_path, monkeypatch):
+    """
+    Tests that building the vector index of one namespace does not hold up searches of another.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    get_vector_index(str(kb_dir / "organoids"))
+    started, release = threading.Event(), threading.Event()
+    original_build = VectorIndex.build
+    def slow_build(self):
+        if self.kb_dir.endswith("wound"):
+            started.set()
+            release.wait(10)
+        original_build(self)
+    monkeypatch.setattr(VectorIndex, "build", slow_build)
+    building = threading.Thread(target=get_vector_index, args=(str(kb_dir / "wound"),))
+
+    # Act
+    building.start()
+    assert started.wait(10)
+    other = get_vector_index(str(kb_dir / "organoids"))
+    still_building = building.is_alive()
+    release.set()
+    building.join(10)
+
+    # Assert
+    assert still_building
+    assert other.search("crypts")[0]["filepath"] == "organoids.md"
+    assert not building.is_alive()
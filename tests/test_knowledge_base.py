@@ -38,4 +38,28 @@ def test_search_knowledge_base_not_found(tmp_path):
     results = search_knowledge_base.invoke({"query": query, "knowledge_base_dir": str(kb_dir)})
 
     # Assert: Check that the specific "not found" message is returned
-    assert results == "No relevant information found in the knowledge base."
\ No newline at end of file
+    assert results == "No relevant information found in the knowledge base."
+def test_paging_continues_past_the_first_block_of_reranked_candidates(tmp_path):
+    """
+    Tests that paging through re-ranked results reaches every match, not only those among the first BM25 candidates.
+    """
+    # Arrange
+    kb_dir = tmp_path / "kb"
+    kb_dir.mkdir()
+    (kb_dir / "findings.md").write_text("\n\n".join(
+        f"Traction forces were measured in monolayer number {i} with sample code z{i}q{i * 7}." for i in range(70)),
+        encoding="utf-8")
+    query = {"query": "traction forces", "knowledge_base_dir": str(kb_dir), "score_cutoff": 60, "top_k": 10}
+
+    # Act
+    pages, cursor = [], 0
+    while True:
+        output = search_knowledge_base.invoke({**query, "cursor": cursor})
+        pages.append(output)
+        if "call again with cursor=" not in output:
+            break
+        cursor = int(output.rsplit("cursor=", 1)[1].split(".")[0])
+
+    # Assert
+    numbers = [int(part.split(" ")[0]) for page in pages for part in page.split("monolayer number ")[1:]]
+    assert sorted(numbers) == list(range(70))
@@ -0,0 +1,104 @@
+import pytest
+from typing import Any
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from core.llm_cache import CacheMissError, SQLiteLLMCache, cache_key
+
+class _CountingModel(BaseChatModel):
+    """
+    Answers every request with the number of requests it has served so far.
+    """
+    calls: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "counting"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.calls.append(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"answer {len(self.calls)}"))])
+
+def test_cache_serves_repeated_requests_and_counts_hits(tmp_path):
+    """
+    Tests that an identical request is answered from the cache and that the counters follow.
+    """
+    # Arrange
+    cache = SQLiteLLMCache(str(tmp_path / "cache.sqlite"))
+    model = _CountingModel(calls=[], cache=cache)
+
+    # Act
+    first = model.invoke([HumanMessage(content="What is jamming?")])
+    second = model.invoke([HumanMessage(content="What is jamming?")])
+    other = model.invoke([HumanMessage(content="What is a wave?")])
+
+    # Assert
+    assert first.content == second.content == "answer 1"
+    assert other.content == "answer 2"
+    assert len(model.calls) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.stats()["entries"] == 2
+
+def test_cache_persists_tool_calls_across_sessions(tmp_path):
+    """
+    Tests that a response with tool calls survives a round trip through the file, read by a new session.
+    """
+    path = str(tmp_path / "cache.sqlite")
+    message = AIMessage(content="", tool_calls=[{"name": "search_knowledge_base", "args": {"query": "waves"}, "id": "call_1"}])
+    SQLiteLLMCache(path).update("prompt", "llm", [ChatGeneration(message=message)])
+
+    cached = SQLiteLLMCache(path).lookup("prompt", "llm")
+
+    assert cached[0].message.tool_calls == message.tool_calls
+
+def test_cache_key_ignores_message_ids_and_usage():
+    """
+    Tests that per-response metadata does not change the key, while the content does.
+    """
+    plain = [HumanMessage(content="hi"), AIMessage(content="hello")]
+    decorated = [HumanMessage(content="hi"), AIMessage(content="hello", id="run-123",
+                                                       usage_metadata={"input_tokens": 1, "output_tokens": 1, "total_tokens": 2})]
+    changed = [HumanMessage(content="hi"), AIMessage(content="hello!")]
+
+    assert cache_key(dumps(plain), "llm") == cache_key(dumps(decorated), "llm")
+    assert cache_key(dumps(plain), "llm") != cache_key(dumps(changed), "llm")
+    assert cache_key(dumps(plain), "llm") != cache_key(dumps(plain), "other llm")
+
+def test_replay_mode_never_calls_the_model(tmp_path):
+    """
+    Tests that replay mode serves recorded responses and fails on anything else without recording.
+    """
+    # Arrange
+    path = str(tmp_path / "cache.sqlite")
+    _CountingModel(calls=[], cache=SQLiteLLMCache(path)).invoke([HumanMessage(content="recorded")])
+    replay = SQLiteLLMCache(path, mode="replay")
+    model = _CountingModel(calls=[], cache=replay)
+
+    # Act / Assert
+    assert model.invoke([HumanMessage(content="recorded")]).content == "answer 1"
+    with pytest.raises(CacheMissError):
+        model.invoke([HumanMessage(content="never recorded")])
+    assert model.calls == []
+    assert replay.stats()["entries"] == 1
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    """
+    Tests that going over the size limit evicts the responses that were used least recently.
+    """
+    # Arrange
+    cache = SQLiteLLMCache(str(tmp_path / "cache.sqlite"), max_size_mb=2500 / 1024 / 1024)
+    big = [ChatGeneration(message=AIMessage(content="x" * 500))]
+    for prompt in ["a", "b", "c"]:
+        cache.update(prompt, "llm", big)
+    cache.lookup("a", "llm")  # "a" becomes the most recently used
+
+    # Act
+    for prompt in ["d", "e"]:
+        cache.update(prompt, "llm", big)
+
+    # Assert
+    assert cache.lookup("a", "llm") is not None
+    assert cache.lookup("b", "llm") is None
+    assert cache.evictions >= 1
+    assert cache.stats()["size_bytes"] <= 2500
@@ -0,0 +1,96 @@
+from typing import Any
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from core.agent import ResearchAgent
+from core.prefetch import KnowledgePrefetcher
+
+class _RecordingFakeModel(BaseChatModel):
+    """
+    Replies with the given messages in turn and keeps the prompts it was sent.
+    """
+    messages: Any
+    prompts: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.prompts.append(messages)
+        return ChatResult(generations=[ChatGeneration(message=next(self.messages))])
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+def _make_kb(tmp_path):
+    kb_dir = tmp_path / "kb"
+    kb_dir.mkdir()
+    (kb_dir / "waves.md").write_text("# Waves\n\nTraction forces peak at the leading edge of the expanding monolayer.\n\n"
+                                     "Vinculin is recruited to cell junctions under tension.\n", encoding="utf-8")
+    return str(kb_dir)
+
+def test_prefetch_injects_results_and_counts_saved_searches(tmp_path):
+    """
+    Tests that prefetched snippets reach the first model call and that turns needing no search are counted as saved.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    prefetcher = KnowledgePrefetcher(knowledge_base_dir=kb_dir)
+    agent = ResearchAgent(model="test", api_key="test", api_base="http://127.0.0.1:9/v1", prefetcher=prefetcher)
+    agent.llm = _RecordingFakeModel(messages=iter([
+        AIMessage(content="**Final Answer:** At the leading edge."),
+        AIMessage(content="", tool_calls=[{"name": "search_knowledge_base", "id": "call_1",
+                                           "args": {"query": "vinculin", "knowledge_base_dir": kb_dir}}]),
+        AIMessage(content="**Final Answer:** At junctions."),
+        AIMessage(content="**Final Answer:** I do not know."),
+    ]), prompts=[])
+    agent.agent_executor = agent._build_executor()
+
+    # Act
+    first = agent.chat("Where do traction forces peak?")
+    agent.chat("Where is vinculin recruited?")
+    agent.chat("Quantum chromodynamics?")
+
+    # Assert
+    assert first == "**Final Answer:** At the leading edge."
+    first_prompt = agent.llm.prompts[0][-1].content
+    assert "retrieved in advance" in first_prompt
+    assert "Traction forces peak at the leading edge" in first_prompt
+    assert "retrieved in advance" not in agent.llm.prompts[-1][-1].content
+    assert "retrieved in advance" not in agent.chat_history[0].content  # Not kept in the history
+    assert prefetcher.stats() == {"turns": 3, "prefetched": 2, "searched_after_prefetch": 1,
+                                  "searched_without_prefetch": 0, "avoided": 1, "avoided_rate": 0.5}
+    agent.close()
+
+def test_prefetch_skips_missing_or_unrelated_knowledge_base(tmp_path):
+    """
+    Tests that nothing is prefetched without a knowledge base or for a question it does not cover.
+    """
+    kb_dir = _make_kb(tmp_path)
+
+    assert KnowledgePrefetcher(knowledge_base_dir=str(tmp_path / "missing")).fetch("traction forces") == ""
+    assert KnowledgePrefetcher(knowledge_base_dir=kb_dir).fetch("quantum chromodynamics") == ""
+
+def test_prefetch_normalizes_scores_of_several_namespaces(tmp_path):
+    """
+    Tests that a namespace where the question's terms are rare, and so score high in BM25, does not outrank a
+    namespace where they are common.
+    """
+    # Arrange
+    kb_dir = tmp_path / "kb"
+    (kb_dir / "wound").mkdir(parents=True)
+    (kb_dir / "zoo").mkdir()
+    (kb_dir / "wound" / "edge.md").write_text("\n\n".join(
+        f"Traction forces peak at the wound edge in experiment {i}." for i in range(10)), encoding="utf-8")
+    (kb_dir / "zoo" / "animals.md").write_text("\n\n".join(
+        [f"Elephants eat {i} kilograms of hay." for i in range(20)] + ["Forces of habit keep zebras together."]),
+        encoding="utf-8")
+    prefetcher = KnowledgePrefetcher(knowledge_base_dir=str(kb_dir), top_k=1)
+
+    # Act
+    prefetched = prefetcher.fetch("traction forces")
+
+    # Assert
+    assert "wound/edge.md" in prefetched and "zebras" not in prefetched
+    assert "Score: 1.0" in prefetched
@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from argparse import Namespace
+from types import SimpleNamespace
+from benchmarks.stub_server import StubChatServer
+from cli.server import ResearchServer, SessionManager, run_server_command
+from core import agent as agent_module
+from core.agent import ResearchAgent, create_http_clients
+from tools import kb_index
+
+def _request(method, url, body=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.read().decode("utf-8")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8")
+
+def _manager(stub, **kwargs):
+    http_client, http_async_client = create_http_clients()
+
+    def agent_factory(session_id):
+        return ResearchAgent(model="stub", api_key="test", api_base=stub.base_url,
+                             http_client=http_client, http_async_client=http_async_client)
+    return SessionManager(agent_factory, **kwargs)
+
+def test_concurrent_sessions_stream_answers_over_one_index(tmp_path, monkeypatch):
+    """
+    Tests that several sessions chat at the same time, each with its own history and mode, over one loaded index.
+    """
+    # Arrange
+    kb_dir = tmp_path / "kb"
+    kb_dir.mkdir()
+    (kb_dir / "waves.md").write_text("Mechanical waves propagate across the monolayer.\n", encoding="utf-8")
+    loaded = []
+    original_load = kb_index.KnowledgeBaseIndex.load
+    monkeypatch.setattr(kb_index.KnowledgeBaseIndex, "load", lambda self: loaded.append(self) or original_load(self))
+    with StubChatServer(tool_args={"knowledge_base_dir": str(kb_dir)}, answer_words=20, latency=0.05) as stub, \
+            ResearchServer(_manager(stub), port=0, knowledge_base_dir=str(kb_dir)) as server:
+        sessions = [json.loads(_request("POST", f"{server.base_url}/sessions", {"mode": mode})[1])["session_id"]
+                    for mode in ("convergent", "divergent", "convergent")]
+        results = {}
+
+        def chat(session_id):
+            results[session_id] = _request("POST", f"{server.base_url}/sessions/{session_id}/chat",
+                                           {"message": f"waves for {session_id}"})
+
+        # Act
+        threads = [threading.Thread(target=chat, args=(session_id,)) for session_id in sessions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        listed = json.loads(_request("GET", f"{server.base_url}/sessions")[1])["sessions"]
+        health = json.loads(_request("GET", f"{server.base_url}/health")[1])
+        agents = {session_id: server.manager.get(session_id).agent for session_id in sessions}
+
+        # Assert
+        for session_id, (status, body) in results.items():
+            events = [json.loads(line) for line in body.splitlines()]
+            assert status == 200
+            assert {"tool_start", "token"} <= {event["type"] for event in events}
+            assert events[-1]["type"] == "final" and session_id in events[-1]["output"]
+            history = agents[session_id].chat_history
+            assert len(history) == 2 and session_id in history[0].content
+        assert "DIVERGENT" in agents[sessions[1]].chat_history[0].content
+        assert [s["turns"] for s in listed] == [1, 1, 1]
+        assert health["sessions"] == 3 and health["index"]["files"] == 1
+        assert len(loaded) <= 1  # The index is loaded (or built) once for all sessions
+
+def test_idle_sessions_are_evicted_and_unknown_ones_rejected():
+    """
+    Tests that idle sessions are closed, that closed ones answer 404 and that invalid requests are refused.
+    """
+    with StubChatServer(tool_name=None, answer_words=5) as stub, \
+            ResearchServer(_manager(stub, idle_timeout=60, max_sessions=1), port=0) as server:
+        idle = json.loads(_request("POST", f"{server.base_url}/sessions", {})[1])["session_id"]
+
+        assert _request("POST", f"{server.base_url}/sessions", {"mode": "sideways"})[0] == 400
+        assert server.manager.evict_idle(now=time.monotonic() + 61) == [idle]
+        assert _request("POST", f"{server.base_url}/sessions/{idle}/chat", {"message": "hi"})[0] == 404
+
+        active = json.loads(_request("POST", f"{server.base_url}/sessions", {})[1])["session_id"]
+        status, body = _request("POST", f"{server.base_url}/sessions/{active}/chat", {"message": "hi", "stream": False})
+
+        assert status == 200 and "hi" in json.loads(body)["output"]
+        assert _request("POST", f"{server.base_url}/sessions/{active}/chat", {"message": ""})[0] == 400
+        assert _request("DELETE", f"{server.base_url}/sessions/{active}")[0] == 200
+        assert _request("GET", f"{server.base_url}/sessions")[1] == '{"sessions": []}'
+
+def test_sessions_in_flight_are_not_closed_and_failed_turns_are_not_counted():
+    """
+    Tests that eviction leaves a session running a turn alone and that a turn that raised does not count.
+    """
+    with StubChatServer(tool_name=None, answer_words=5) as stub, \
+            ResearchServer(_manager(stub, idle_timeout=60), port=0) as server:
+        session_id = json.loads(_request("POST", f"{server.base_url}/sessions", {})[1])["session_id"]
+        session = server.manager.get(session_id)
+
+        # Act: a turn in flight, then the same session once the turn is over
+        session.busy.acquire()
+        kept = server.manager.evict_idle(now=time.monotonic() + 61)
+        session.busy.release()
+        evicted = server.manager.evict_idle(now=time.monotonic() + 61)
+        late = _request("POST", f"{server.base_url}/sessions/{session_id}/chat", {"message": "hi"})
+
+        failing = server.manager.create()
+        failing.agent.agent_executor = SimpleNamespace(invoke=lambda *args, **kwargs: 1 / 0)
+        failed = _request("POST", f"{server.base_url}/sessions/{failing.id}/chat", {"message": "hi", "stream": False})
+
+        # Assert
+        assert kept == [] and evicted == [session_id]
+        assert late[0] == 404
+        assert failed[0] == 500 and "division by zero" in json.loads(failed[1])["error"]
+        assert failing.turns == 0
+
+def test_server_command_closes_the_shared_async_client(tmp_path, monkeypatch):
+    """
+    Tests that stopping `main.py serve` also closes the shared asynchronous HTTP client.
+    """
+    # Arrange
+    monkeypatch.chdir(tmp_path)
+    clients = []
+    monkeypatch.setattr(agent_module, "create_http_clients", lambda **kwargs: clients.extend(create_http_clients()) or clients)
+    monkeypatch.setattr(ResearchServer, "serve_forever", lambda self: (_ for _ in ()).throw(KeyboardInterrupt))
+    monkeypatch.setattr(ResearchServer, "stop", lambda self: self._server.server_close())
+    args = Namespace(api_key="test", api_base="http://127.0.0.1:9/v1", model="stub", max_sessions=2, trace=None,
+                     no_trace=True, prefetch=False, idle_timeout=60, host="127.0.0.1", port=0)
+
+    # Act
+    status = run_server_command(args)
+
+    # Assert
+    assert status == 0
+    assert all(client.is_closed for client in clients)
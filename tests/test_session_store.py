@@ -0,0 +1,96 @@
+import json
+from langchain_core.messages import AIMessage, HumanMessage
+from core.history import HistoryManager
+from core.session_store import SessionStore
+
+def _record_turns(log, history, count, words=50, start=0):
+    for i in range(start, start + count):
+        messages = [HumanMessage(content=f"question {i} " + "word " * words),
+                    AIMessage(content=f"answer {i} " + "word " * words,
+                              tool_calls=[{"name": "search_knowledge_base", "args": {"query": f"q{i}"}, "id": f"call_{i}"}])]
+        for message in messages:
+            history.append(message)
+        history.build_context()  # Folds older turns into the summary, as a real turn would
+        log.record_turn(messages, history)
+
+def test_session_round_trip_keeps_tool_calls(tmp_path):
+    """
+    Tests that a resumed session has the same messages, including their tool calls.
+    """
+    # Arrange
+    store = SessionStore(str(tmp_path))
+    log = store.new_session()
+    history = HistoryManager(token_budget=100_000)
+    _record_turns(log, history, 3)
+    log.close()
+
+    # Act
+    resumed = HistoryManager(token_budget=100_000)
+    loaded = store.open(log.id).restore(resumed)
+
+    # Assert
+    assert loaded == 6
+    assert [m.content for m in resumed.messages] == [m.content for m in history.messages]
+    assert resumed.messages[1].tool_calls[0]["args"] == {"query": "q0"}
+
+def test_resume_loads_only_the_unsummarized_tail(tmp_path):
+    """
+    Tests that resuming a long session reads only the turns its summary does not cover, with the summary and pins.
+    """
+    # Arrange
+    store = SessionStore(str(tmp_path))
+    log = store.new_session()
+    history = HistoryManager(token_budget=400)
+    _record_turns(log, history, 100)
+    history.pin(history.messages[-1])
+    log.save_state(history)
+    log.close()
+
+    # Act
+    resumed = HistoryManager(token_budget=400)
+    resumed_log = store.open(log.id)
+    loaded = resumed_log.restore(resumed)
+    context = resumed.build_context()
+
+    # Assert
+    assert loaded == len(history.messages) - history.summarized_upto
+    assert loaded < 20
+    assert resumed.summary == history.summary
+    assert resumed.pinned[0] is resumed.messages[-1]
+    assert sum(m is resumed.pinned[0] for m in context) == 1
+    assert resumed_log.message_count == 200
+
+def test_appending_after_resume_continues_the_log(tmp_path):
+    """
+    Tests that turns recorded after a resume are appended with continuing indexes, after a torn last line.
+    """
+    # Arrange
+    store = SessionStore(str(tmp_path))
+    log = store.new_session()
+    history = HistoryManager(token_budget=100_000)
+    _record_turns(log, history, 2)
+    log.close()
+    with open(log.path, "a", encoding="utf-8") as f:
+        f.write('{"index": 4, "message": {"ty')  # A crash in the middle of a write
+
+    # Act
+    resumed_log = store.open(log.id)
+    resumed = HistoryManager(token_budget=100_000)
+    resumed_log.restore(resumed)
+    _record_turns(resumed_log, resumed, 1, start=2)
+    resumed_log.close()
+
+    # Assert
+    records = [json.loads(line) for line in open(log.path, encoding="utf-8") if line.startswith('{"index": ') and line.endswith("}\n")]
+    assert [r["index"] for r in records] == [0, 1, 2, 3, 4, 5]
+    assert [m.content.split()[1] for m in resumed_log.iter_messages()] == ["0", "0", "1", "1", "2", "2"]
+    assert store.list_sessions()[0]["turns"] == 3
+
+def test_open_unknown_session_returns_none(tmp_path):
+    """
+    Tests that an unknown or malformed session id is not opened.
+    """
+    store = SessionStore(str(tmp_path))
+
+    assert store.open("0123456789ab") is None
+    assert store.open("../../etc/passwd") is None
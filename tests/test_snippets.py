@@ -0,0 +1,63 @@
+from core.history import estimate_tokens
+from tools.snippets import ELLIPSIS, best_span, format_results, snippet_window
+
+FILLER = "Cells were imaged every ten minutes on an inverted microscope. " * 20
+
+def _match(paragraph, score=90, filepath="paper.md"):
+    return {"filepath": filepath, "heading": "Paper > Results", "paragraph": paragraph, "score": score}
+
+def test_window_is_cut_around_the_best_match_verbatim():
+    """
+    Tests that a long paragraph is shown as an unaltered window around the densest cluster of query terms.
+    """
+    # Arrange
+    paragraph = FILLER + "Mechanical waves propagate slowly across the monolayer. " + FILLER
+
+    # Act
+    window, best_match = snippet_window(paragraph, "mechanical waves monolayer", width=300)
+
+    # Assert
+    assert len(window) <= 300 + 2 * len(ELLIPSIS)
+    assert window.startswith(ELLIPSIS) and window.endswith(ELLIPSIS)
+    assert window.strip(ELLIPSIS) in paragraph
+    assert "Mechanical waves propagate slowly across the monolayer." in window
+    assert best_match == "Mechanical waves propagate slowly across the monolayer"
+
+def test_best_span_matches_word_stems_and_none_without_terms():
+    """
+    Tests that query terms also match words sharing their stem, and that unrelated text has no span.
+    """
+    text = "Vinculin is recruited to cell junctions."
+
+    start, end = best_span(text, "vinculin recruitment")
+
+    assert text[start:end] == "Vinculin is recruited"
+    assert best_span(text, "kymograph") is None
+
+def test_results_are_bounded_and_paged_without_repeats():
+    """
+    Tests top-k limiting, the token budget, near-duplicate removal and paging with the cursor.
+    """
+    # Arrange
+    matches = [_match(f"Finding {i}: traction forces peak. " + " ".join(f"marker{i}x{k}" for k in range(40)), score=100 - i)
+               for i in range(30)]
+    matches.insert(1, _match(matches[0]["paragraph"], score=99, filepath="copy.md"))
+
+    # Act
+    first_page = format_results("traction forces", matches, top_k=4, max_tokens=100_000)
+    pages, cursor = [], 0
+    while True:
+        output = format_results("traction forces", matches, top_k=4, cursor=cursor, max_tokens=300)
+        pages.append(output)
+        if "call again with cursor=" not in output:
+            break
+        cursor = int(output.rsplit("cursor=", 1)[1].split(".")[0])
+
+    # Assert
+    assert first_page.count("--- From:") == 4
+    assert all(estimate_tokens(page) <= 300 for page in pages)
+    assert pages[0].startswith("Found 30 relevant snippet(s)")  # The near-duplicate is not counted
+    assert "1 near-duplicate snippet(s) omitted" in pages[0]
+    assert "From: copy.md" not in "".join(pages)
+    findings = [int(part.split(":")[0]) for page in pages for part in page.split("Finding ")[1:]]
+    assert findings == list(range(30))
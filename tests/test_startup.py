@@ -0,0 +1,45 @@
+import subprocess
+import sys
+from cli.startup import REPO_ROOT, parse_importtime, preload_modules
+
+def test_parse_importtime_reads_depth_and_times():
+    """
+    Tests that the `-X importtime` report is parsed into modules with their depth and times.
+    """
+    # Arrange
+    output = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       120 |        120 |     encodings.utf_8\n"
+              "import time:       300 |        420 |   encodings\n"
+              "import time:        50 |        470 | main\n")
+
+    # Act
+    entries = parse_importtime(output)
+
+    # Assert
+    assert [(e["name"], e["depth"]) for e in entries] == [("encodings.utf_8", 2), ("encodings", 1), ("main", 0)]
+    assert entries[-1]["self_us"] == 50 and entries[-1]["cumulative_us"] == 470
+
+def test_main_does_not_import_the_agent_stack():
+    """
+    Tests that starting the CLI does not import langchain, openai or faiss before the first prompt.
+    """
+    # Arrange
+    heavy = ["core.agent", "langchain_core", "langchain_openai", "openai", "langchain.agents", "faiss", "tools.ingest"]
+    statement = f"import sys, main; print([m for m in {heavy!r} if m in sys.modules])"
+
+    # Act
+    result = subprocess.run([sys.executable, "-c", statement], capture_output=True, text=True, cwd=REPO_ROOT, check=True)
+
+    # Assert
+    assert result.stdout.strip() == "[]"
+
+def test_preload_modules_reports_import_times():
+    """
+    Tests that preloading imports the modules and returns a duration for each of them.
+    """
+    # Act
+    durations = preload_modules(("json", "core.prompt_manager"))
+
+    # Assert
+    assert set(durations) == {"json", "core.prompt_manager"}
+    assert "core.prompt_manager" in sys.modules
@@ -0,0 +1,66 @@
+import queue
+from core.agent import ResearchAgent
+from core.streaming import FinalAnswerStream, QueueCallbackHandler
+
+class _FakeExecutor:
+    """
+    Stands in for the AgentExecutor: reports a tool call and two tokens to the callbacks, then answers.
+    """
+    def invoke(self, inputs, config=None):
+        handler = config["callbacks"][0]
+        handler.on_chat_model_start({}, [])
+        handler.on_tool_start({"name": "search_knowledge_base"}, "waves")
+        handler.on_tool_end("3 snippets", name="search_knowledge_base")
+        handler.on_chat_model_start({}, [])
+        handler.on_llm_new_token("")
+        handler.on_llm_new_token("**Final Answer:**")
+        handler.on_llm_new_token(" Yes.")
+        return {"output": "**Final Answer:** Yes."}
+
+def test_final_answer_stream_switches_to_answer_after_marker():
+    """
+    Tests that the reasoning is shown until the marker arrives, even when the marker is split across tokens.
+    """
+    stream = FinalAnswerStream()
+
+    for token in ["**Reasoning:** it moves. ", "**Final ", "Answer:**", " It is a wave."]:
+        stream.feed(token)
+        if token == "**Final ":
+            assert stream.display_text == "**Reasoning:** it moves. **Final "
+
+    assert stream.has_final_answer
+    assert stream.display_text == "It is a wave."
+
+def test_queue_callback_handler_skips_empty_tokens():
+    """
+    Tests that tool-call chunks (empty tokens) are not reported as text.
+    """
+    events = queue.Queue()
+    handler = QueueCallbackHandler(events)
+
+    handler.on_llm_new_token("")
+    handler.on_llm_new_token("Hi")
+
+    event = events.get_nowait()
+    assert event["type"] == "token" and event["text"] == "Hi"
+    assert events.empty()
+
+def test_stream_chat_yields_events_and_records_the_turn():
+    """
+    Tests the event sequence of a streamed turn, its latency report and that the turn is saved to history.
+    """
+    # Arrange
+    agent = ResearchAgent(model="test", api_key="test", api_base="http://127.0.0.1:9/v1")
+    agent.agent_executor = _FakeExecutor()
+
+    # Act
+    events = list(agent.stream_chat("Is it a wave?", mode="convergent"))
+
+    # Assert
+    assert [e["type"] for e in events] == ["llm_start", "tool_start", "tool_end", "llm_start", "token", "token", "final"]
+    final = events[-1]
+    assert final["output"] == "**Final Answer:** Yes."
+    assert 0 <= final["ttft"] <= final["total"]
+    assert agent.last_latency == {"ttft": final["ttft"], "total": final["total"]}
+    assert len(agent.chat_history) == 2
+    assert agent.chat_history[0].content.endswith("USER QUESTION: Is it a wave?")
@@ -0,0 +1,116 @@
+import json
+import threading
+from benchmarks.stub_server import StubChatServer
+from core.agent import ResearchAgent
+from core.tracing import SPAN_LLM, SPAN_TURN, TraceWriter, Tracer, disabled_tracer, percentile
+
+def test_tracer_stats_report_percentiles_and_totals():
+    """
+    Tests that recorded spans are summarized per name, with nearest-rank percentiles and token totals.
+    """
+    # Arrange
+    tracer = Tracer()
+
+    # Act
+    for ms in range(1, 21):
+        tracer.record("llm", ms / 1000, prompt_tokens=10, completion_tokens=2)
+    with tracer.span("tool.search_knowledge_base", tool_output_bytes=300):
+        pass
+    stats = tracer.stats()
+
+    # Assert
+    assert percentile([3, 1, 2], 50) == 2
+    assert stats["phases"]["llm"] == {"count": 20, "p50_ms": 10.0, "p95_ms": 19.0, "total_ms": 210.0}
+    assert stats["phases"]["tool.search_knowledge_base"]["count"] == 1
+    assert stats["totals"] == {"prompt_tokens": 200, "completion_tokens": 40, "tool_output_bytes": 300}
+
+def test_disabled_tracer_records_nothing():
+    """
+    Tests that a disabled tracer adds no callback handler and that its spans are no-ops.
+    """
+    # Arrange
+    tracer = disabled_tracer()
+
+    # Act
+    with tracer.span("agent.turn") as span:
+        span.set(question_chars=3)
+    tracer.record("llm", 1.0, prompt_tokens=5)
+
+    # Assert
+    assert tracer.callback_handler() is None
+    assert tracer.stats()["phases"] == {}
+
+def test_trace_writer_rotates_json_lines(tmp_path):
+    """
+    Tests that spans are written as JSON lines and that the file is rotated once it exceeds its size.
+    """
+    # Arrange
+    path = tmp_path / "traces.jsonl"
+    writer = TraceWriter(str(path), max_bytes=500, backups=2)
+    tracer = Tracer(writer, session_id="s1")
+
+    # Act
+    tracer.new_turn()
+    for i in range(20):
+        tracer.record("cli.render", 0.001, index=i)
+    writer.close()
+
+    # Assert
+    assert (tmp_path / "traces.jsonl.1").exists()
+    assert not (tmp_path / "traces.jsonl.3").exists()
+    last = json.loads(path.read_text(encoding="utf-8").splitlines()[-1])
+    assert last["session"] == "s1" and last["turn"] == 1 and last["index"] == 19
+
+def test_trace_writer_keeps_every_span_written_from_several_threads(tmp_path, capsys):
+    """
+    Tests that a writer shared by several threads keeps every span across rollovers, without logging errors.
+    """
+    # Arrange
+    path = tmp_path / "traces.jsonl"
+    writer = TraceWriter(str(path), max_bytes=2000, backups=1000)
+
+    def write_spans(thread_no):
+        for i in range(100):
+            writer.write({"thread": thread_no, "index": i})
+
+    # Act
+    threads = [threading.Thread(target=write_spans, args=(thread_no,)) for thread_no in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+
+    # Assert
+    lines = [line for file in tmp_path.glob("traces.jsonl*") for line in file.read_text(encoding="utf-8").splitlines()]
+    spans = {(span["thread"], span["index"]) for span in map(json.loads, lines)}
+    assert len(lines) == 800 and len(spans) == 800
+    assert len(list(tmp_path.glob("traces.jsonl.*"))) > 1
+    assert "Logging error" not in capsys.readouterr().err
+
+def test_agent_turn_is_traced(tmp_path):
+    """
+    Tests that an agent turn records its LLM calls with token counts, its tool call and the turn itself.
+    """
+    # Arrange
+    kb_dir = tmp_path / "kb"
+    kb_dir.mkdir()
+    (kb_dir / "waves.md").write_text("Mechanical waves propagate through the tissue.\n", encoding="utf-8")
+    tracer = Tracer()
+
+    with StubChatServer(tool_args={"knowledge_base_dir": str(kb_dir)}) as server:
+        agent = ResearchAgent(model="stub", api_key="stub", api_base=server.base_url, tracer=tracer)
+
+        # Act
+        response = agent.chat("How do waves propagate?")
+        agent.close()
+
+    # Assert
+    stats = tracer.stats()
+    assert "**Final Answer:**" in response
+    assert stats["turns"] == 1
+    assert stats["phases"][SPAN_LLM]["count"] == 2
+    assert stats["phases"][SPAN_TURN]["count"] == 1
+    assert stats["phases"]["tool.search_knowledge_base"]["count"] == 1
+    assert stats["totals"]["prompt_tokens"] > 0 and stats["totals"]["completion_tokens"] > 0
+    assert stats["totals"]["tool_output_bytes"] > 0
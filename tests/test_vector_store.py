@@ -0,0 +1,116 @@
+import numpy as np
+from tools import vector_store
+from tools.vector_store import HashingEmbedder, VectorIndex, semantic_search_knowledge_base
+
+def _make_kb(tmp_path):
+    kb_dir = tmp_path / "kb"
+    kb_dir.mkdir()
+    (kb_dir / "paper.md").write_text(
+        "Mechanical waves propagate through the expanding cell monolayer.\n\n"
+        "The jamming transition resembles granular matter.\n\n"
+        "Vinculin is recruited to adherens junctions under tension.",
+        encoding="utf-8")
+    return kb_dir
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    """
+    Tests that the default embedder needs no model, always returns the same vectors and normalizes them.
+    """
+    embedder = HashingEmbedder(dim=128)
+    first = embedder.embed(["mechanical waves", "granular jamming"])
+    second = HashingEmbedder(dim=128).embed(["mechanical waves", "granular jamming"])
+
+    assert first.shape == (2, 128)
+    assert first.dtype == np.float32
+    assert np.array_equal(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0, atol=1e-5)
+
+def test_hashing_embedder_prefers_related_wording():
+    """
+    Tests that texts sharing word fragments are closer than unrelated texts.
+    """
+    vectors = HashingEmbedder().embed([
+        "waves of mechanical stress",
+        "a mechanical wave of stresses",
+        "protein purification protocol",
+    ])
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+def test_vector_index_round_trip_for_every_index_type(tmp_path, monkeypatch):
+    """
+    Tests that each index type can be built, saved, memory-mapped back and queried.
+    """
+    # Arrange: allow IVF training on a tiny corpus
+    monkeypatch.setattr(vector_store, "IVF_MIN_VECTORS", 1)
+    kb_dir = _make_kb(tmp_path)
+
+    for index_type in vector_store.INDEX_TYPES:
+        built = VectorIndex(str(kb_dir), index_type=index_type)
+        built.build()
+        built.save()
+
+        # Act
+        loaded = VectorIndex(str(kb_dir), index_type=index_type)
+
+        # Assert
+        assert loaded.load()
+        assert loaded.is_fresh()
+        results = loaded.search("jamming of granular matter", top_k=1)
+        assert results[0]["paragraph"].startswith("The jamming transition")
+
+def test_load_rejects_index_built_with_another_embedder(tmp_path):
+    """
+    Tests that switching embedders forces a rebuild instead of mixing vector spaces.
+    """
+    kb_dir = _make_kb(tmp_path)
+    built = VectorIndex(str(kb_dir), embedder=HashingEmbedder(dim=64))
+    built.build()
+    built.save()
+
+    assert not VectorIndex(str(kb_dir), embedder=HashingEmbedder(dim=128)).load()
+
+def test_semantic_search_tool_formats_results(tmp_path):
+    """
+    Tests that the agent tool returns the top-k paragraphs in the usual result format.
+    """
+    kb_dir = _make_kb(tmp_path)
+
+    results = semantic_search_knowledge_base.invoke({
+        "query": "vinculin recruitment at junctions",
+        "knowledge_base_dir": str(kb_dir),
+        "top_k": 2,
+    })
+
+    assert "Found 2 relevant snippet(s)" in results
+    assert "From: paper.md" in results
+    assert "Vinculin is recruited" in results
+
+def test_update_embeds_only_new_paragraphs_and_tombstones_removed_ones(tmp_path):
+    """
+    Tests that incremental updates go to the delta index and that removed paragraphs are no longer returned.
+    """
+    # Arrange
+    kb_dir = _make_kb(tmp_path)
+    index = VectorIndex(str(kb_dir))
+    index.build()
+    index.save()
+    base_size = index.index.ntotal
+
+    # Act
+    (kb_dir / "cadherin.md").write_text("E-cadherin mediates cell-cell adhesion.", encoding="utf-8")
+    (kb_dir / "paper.md").unlink()
+    index.update()
+
+    # Assert
+    assert index.index.ntotal == base_size
+    assert index.delta.ntotal == 1
+    assert len(index.deleted) == base_size
+    assert [r["filepath"] for r in index.search("jamming of granular matter", top_k=5)] == ["cadherin.md"]
+
+    # Act: the delta and tombstones survive a reload
+    reloaded = VectorIndex(str(kb_dir))
+
+    # Assert
+    assert reloaded.load()
+    assert reloaded.is_fresh()
+    assert reloaded.search("cell adhesion", top_k=1)[0]["filepath"] == "cadherin.md"
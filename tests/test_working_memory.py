@@ -0,0 +1,96 @@
+import os
+from core.history import estimate_tokens
+from core.prompt_manager import format_turn_input
+from core.working_memory import WorkingMemory
+
+PAPER = """# Mechanical waves
+
+## Introduction
+
+Epithelial monolayers expand collectively on soft substrates.
+
+## Methods
+
+Traction forces were measured with monolayer stress microscopy.
+
+## Results
+
+A mechanical wave propagates from the leading edge towards the centre of the monolayer.
+"""
+
+def _filler(count):
+    return "\n\n".join(f"Filler paragraph {i} about unrelated topics, " + "lorem ipsum " * 40 for i in range(count))
+
+def test_add_document_builds_outline_and_chunks():
+    """
+    Tests that a loaded document is split into paragraphs and its headings form the outline.
+    """
+    memory = WorkingMemory()
+
+    document = memory.add_document("/tmp/paper.md", PAPER)
+
+    assert document.id == 1
+    assert document.name == "paper.md"
+    assert len(document.paragraphs) == 7
+    assert document.outline == ["Mechanical waves", "  Introduction", "  Methods", "  Results"]
+    assert memory.list_documents()[0]["paragraphs"] == 7
+
+def test_build_context_sends_relevant_excerpts_within_budget():
+    """
+    Tests that only the matching paragraphs of a large document are sent, and that the context stays in budget.
+    """
+    # Arrange
+    memory = WorkingMemory(token_budget=400)
+    content = PAPER + "\n\n" + _filler(100)
+    memory.add_document("/tmp/paper.md", content)
+
+    # Act
+    context = memory.build_context("How were traction forces measured?")
+
+    # Assert
+    assert "monolayer stress microscopy" in context
+    assert "Outline: Mechanical waves | Introduction | Methods | Results" in context
+    assert estimate_tokens(context) <= 400
+    assert estimate_tokens(context) * 10 < estimate_tokens(content)
+
+def test_build_context_falls_back_to_opening_paragraphs():
+    """
+    Tests that the opening of each document is sent when no paragraph matches the question.
+    """
+    memory = WorkingMemory()
+    memory.add_document("/tmp/paper.md", PAPER)
+
+    context = memory.build_context("xyzzy")
+
+    assert "# Mechanical waves" in context
+    assert "A mechanical wave propagates" not in context
+
+def test_unload_document_removes_it_from_search():
+    """
+    Tests that documents can be found by id or name and that unloading removes their paragraphs.
+    """
+    # Arrange
+    memory = WorkingMemory()
+    paper = memory.add_document("/tmp/paper.md", PAPER)
+    notes = memory.add_document("/tmp/notes.md", "Traction notes: check the gel stiffness.")
+
+    # Act
+    assert memory.find("paper.md") is paper
+    assert memory.find(str(notes.id)) is notes
+    memory.remove_document(paper.id)
+
+    # Assert
+    hits = memory.search("traction")
+    assert {hit["name"] for hit in hits} == {"notes.md"}
+    assert memory.find("paper.md") is None
+    memory.clear()
+    assert memory.build_context("traction") == ""
+
+def test_format_turn_input_wraps_mode_and_documents():
+    """
+    Tests the layout of the message sent for one turn.
+    """
+    assert format_turn_input("hello") == "hello"
+    message = format_turn_input("hello", "divergent", "--- SESSION DOCUMENTS ---")
+    assert message.startswith("[SYSTEM INSTRUCTION: For this turn, you MUST operate in DIVERGENT mode.]")
+    assert message.endswith("--- SESSION DOCUMENTS ---\n\nUSER QUESTION: hello")
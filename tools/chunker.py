@@ -0,0 +1,208 @@
+import mmap
+import os
+import re
+
+# Chunks are cut at blocks (paragraphs, lists, tables, math and code blocks) and never
+# across a heading. A block larger than MAX_CHUNK_BYTES is split, preferably at a line,
+# then at a sentence end, then between words; fragments smaller than MIN_CHUNK_BYTES
+# (author lines, stray labels) are merged with the block that follows them, and blocks
+# without any word (rules, lone symbols) are dropped.
+MAX_CHUNK_BYTES = 1200
+MIN_CHUNK_BYTES = 48
+# Files from this size on are read through a memory map rather than a buffered file
+MMAP_MIN_BYTES = 1 << 20
+
+BREADCRUMB_SEPARATOR = " > "
+
+_HEADING_RE = re.compile(rb"^(#{1,6})[ \t]+(.*?)[ \t#]*$")
+_CODE_FENCES = (b"```", b"~~~")
+# A word character, or any non-ASCII byte (CJK text has no ASCII word characters)
+_WORD_RE = re.compile(rb"[0-9A-Za-z_\x80-\xff]")
+# Sentence ends, in order of preference when a block must be split inside a line
+_SENTENCE_ENDS = (b". ", b"? ", b"! ", "。".encode("utf-8"), "？".encode("utf-8"), "！".encode("utf-8"), b"; ")
+
+
+def iter_lines(path: str, max_line_bytes: int = MAX_CHUNK_BYTES):
+    """
+    Yields the lines of a file with their byte offset, without reading the whole file.
+
+    Lines longer than `max_line_bytes` are yielded in pieces, so memory stays bounded
+    even for a file made of a single huge line.
+
+    Yields:
+        (offset, line) tuples, `line` being bytes that include the line break.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size >= MMAP_MIN_BYTES:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                position = 0
+                while position < size:
+                    newline = mm.find(b"\n", position, position + max_line_bytes)
+                    end = newline + 1 if newline != -1 else min(position + max_line_bytes, size)
+                    yield position, mm[position:end]
+                    position = end
+        else:
+            position = 0
+            while True:
+                line = f.readline(max_line_bytes)
+                if not line:
+                    break
+                yield position, line
+                position += len(line)
+
+
+def _split_point(data: bytes, limit: int) -> int:
+    """
+    Returns where to cut `data` so that the first part is at most `limit` bytes, at the
+    most natural boundary available in its second half.
+    """
+    floor = limit // 2
+    cut = data.rfind(b"\n", floor, limit)
+    if cut != -1:
+        return cut + 1
+    for end in _SENTENCE_ENDS:
+        cut = data.rfind(end, floor, limit - len(end) + 1)
+        if cut != -1:
+            return cut + len(end)
+    cut = data.rfind(b" ", floor, limit)
+    if cut != -1:
+        return cut + 1
+    # No boundary at all (e.g. CJK text without punctuation): cut between two UTF-8 characters
+    cut = limit
+    while cut > 0 and data[cut] & 0xC0 == 0x80:
+        cut -= 1
+    return cut or limit
+
+
+class _ChunkBuilder:
+    """
+    Accumulates the lines of one chunk and turns them into chunk dicts.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.start = 0
+        self.heading = ""
+        self.block_start = None  # Position in the buffer of the block being read
+
+    def add(self, offset: int, line: bytes, heading: str):
+        if not self.buffer:
+            self.start = offset
+            self.heading = heading
+        if self.block_start is None:
+            self.block_start = len(self.buffer)
+        self.buffer += line
+
+    def end_block(self):
+        """
+        Ends the current block, dropping it if it has no words (a rule, a lone symbol).
+        """
+        if self.block_start is not None and _WORD_RE.search(self.buffer, self.block_start) is None:
+            del self.buffer[self.block_start:]
+        self.block_start = None
+
+    def size(self) -> int:
+        return len(self.buffer.strip())
+
+    def flush(self, length: int | None = None) -> dict | None:
+        """
+        Returns the first `length` bytes of the buffer (all of it by default) as a chunk,
+        without surrounding whitespace, and keeps the rest for the next chunk.
+        """
+        length = len(self.buffer) if length is None else length
+        data = bytes(self.buffer[:length])
+        del self.buffer[:length]
+        self.block_start = None if self.block_start is None else max(0, self.block_start - length)
+        start = self.start
+        self.start += length
+        text = data.strip()
+        if not text or _WORD_RE.search(text) is None:
+            return None
+        leading = len(data) - len(data.lstrip())
+        return {"start": start + leading, "end": start + leading + len(text), "heading": self.heading,
+                "text": text.decode("utf-8", errors="replace")}
+
+
+def iter_chunks(path: str, max_bytes: int = MAX_CHUNK_BYTES, min_bytes: int = MIN_CHUNK_BYTES):
+    """
+    Splits a markdown file into size-bounded chunks, streaming it line by line.
+
+    Headings are not part of any chunk: they form the breadcrumb of the chunks of their
+    section ("Title > Section > Subsection"). Blank lines inside fenced code and display
+    math do not end a block.
+
+    Args:
+        path: The file to split.
+        max_bytes: The maximum size of a chunk, in UTF-8 bytes.
+        min_bytes: Blocks smaller than this are merged with the next block of their section.
+
+    Yields:
+        Dicts with the chunk "text", its "start" and "end" byte offsets in the file
+        (`text` is exactly the decoded bytes in between) and its "heading" breadcrumb.
+    """
+    headings: list[tuple[int, str]] = []
+    chunk = _ChunkBuilder()
+    fence = None  # The closing marker of the code or math block being read, if any
+
+    def breadcrumb() -> str:
+        return BREADCRUMB_SEPARATOR.join(title for _, title in headings)
+
+    for offset, line in iter_lines(path, max_bytes):
+        stripped = line.strip()
+        if fence is not None:
+            chunk.add(offset, line, breadcrumb())
+            if (fence == b"$$" and stripped.count(b"$$") % 2 == 1) or (fence != b"$$" and stripped.startswith(fence)):
+                fence = None
+        elif not stripped:
+            # End of a block: the chunk ends here unless it is a fragment to merge with the next block
+            chunk.end_block()
+            if chunk.size() >= min_bytes:
+                yielded = chunk.flush()
+                if yielded is not None:
+                    yield yielded
+            elif chunk.buffer:
+                chunk.buffer += line
+        else:
+            heading = _HEADING_RE.match(stripped)
+            if heading is not None:
+                yielded = chunk.flush()
+                if yielded is not None:
+                    yield yielded
+                level = len(heading.group(1))
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, heading.group(2).decode("utf-8", errors="replace")))
+                continue
+            chunk.add(offset, line, breadcrumb())
+            if stripped.startswith(_CODE_FENCES):
+                fence = stripped[:3]
+            elif stripped.count(b"$$") % 2 == 1:
+                fence = b"$$"
+
+        while len(chunk.buffer) > max_bytes:
+            yielded = chunk.flush(_split_point(bytes(chunk.buffer), max_bytes))
+            if yielded is not None:
+                yield yielded
+
+    yielded = chunk.flush()
+    if yielded is not None:
+        yield yielded
+
+
+def read_spans(path: str, spans: list[tuple[int, int]]) -> list[str]:
+    """
+    Reads byte ranges of a file, in one pass over an open file.
+
+    Args:
+        path: The file to read.
+        spans: (start, end) byte offsets, e.g. those of chunks.
+
+    Returns:
+        The decoded text of every span, in the order given.
+    """
+    texts = []
+    with open(path, "rb") as f:
+        for start, end in spans:
+            f.seek(start)
+            texts.append(f.read(end - start).decode("utf-8", errors="replace"))
+    return texts
@@ -0,0 +1,96 @@
+from collections.abc import MutableMapping
+
+# Marks a key deleted in a layer that shadows an older one
+_DELETED = object()
+_MISSING = object()
+
+
+class CopyOnWriteDict(MutableMapping):
+    """
+    A dict whose copies share its contents instead of duplicating them.
+
+    The contents are a stack of layers, newest first. Only the newest layer is ever
+    written; `copy` freezes it and gives both dicts a new empty layer on top, so a copy
+    costs the number of layers rather than the number of keys. A key deleted while older
+    layers still hold it is shadowed by a marker. To keep lookups short, a frozen layer
+    is merged into the one below it once it is at least half its size (as in a binary
+    counter), which keeps about log2(n) layers and costs O(log n) copied entries per
+    written key over time. Layers are merged into new dicts, never in place, so dicts
+    sharing them are unaffected.
+    """
+    def __init__(self, data: dict | None = None):
+        self._layers = [data if data is not None else {}]
+        self._len = len(self._layers[0])
+
+    def __getitem__(self, key):
+        for layer in self._layers:
+            value = layer.get(key, _MISSING)
+            if value is not _MISSING:
+                if value is _DELETED:
+                    raise KeyError(key)
+                return value
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        for layer in self._layers:
+            value = layer.get(key, _MISSING)
+            if value is not _MISSING:
+                return default if value is _DELETED else value
+        return default
+
+    def getter(self):
+        """
+        Returns the fastest callable equivalent to `self[key]`, for hot loops: the plain
+        dict lookup when there is a single layer. Only valid until the dict is next modified.
+        """
+        return self._layers[0].__getitem__ if len(self._layers) == 1 else self.__getitem__
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._len += 1
+        self._layers[0][key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if len(self._layers) == 1:
+            del self._layers[0][key]
+        else:
+            self._layers[0][key] = _DELETED
+        self._len -= 1
+
+    def __iter__(self):
+        for depth, layer in enumerate(self._layers):
+            newer = self._layers[:depth]
+            for key, value in layer.items():
+                if value is not _DELETED and not any(key in shadowing for shadowing in newer):
+                    yield key
+
+    def __len__(self) -> int:
+        return self._len
+
+    def copy(self) -> "CopyOnWriteDict":
+        """
+        Returns a copy sharing this dict's contents. Both can be modified independently afterwards.
+        """
+        frozen = [layer for layer in self._layers if layer]
+        while len(frozen) >= 2 and 2 * len(frozen[0]) >= len(frozen[1]):
+            newer, older = frozen[0], frozen[1]
+            merged = {**older, **newer}
+            if len(frozen) == 2:  # Nothing left for deletion markers to shadow
+                merged = {key: value for key, value in merged.items() if value is not _DELETED}
+            frozen[:2] = [merged]
+        self._layers = [{}] + frozen
+        clone = CopyOnWriteDict()
+        clone._layers = [{}] + frozen
+        clone._len = self._len
+        return clone
+
+    def to_dict(self) -> dict:
+        """
+        Returns the contents as a plain dict.
+        """
+        return dict(self.items())
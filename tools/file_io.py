@@ -1,16 +1,68 @@
 import os
+import re
 import shutil
+import tempfile
 from datetime import datetime
-from langchain.tools import tool
+from langchain_core.tools import tool
 from langchain_core.messages import AIMessage, HumanMessage
 
+from tools.kb_index import find_duplicate, update_file
+from tools.kb_manifest import file_sha256
+
+
+# Lines returned by one read_file_range call, at most
+READ_RANGE_MAX_LINES = 200
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def _atomic_write(filepath: str, parts):
+    """
+    Writes the strings of `parts` to a temporary file next to `filepath`, then renames it
+    over `filepath`, so that readers see either the old or the new content, never a mix.
+    """
+    dir_name = os.path.dirname(filepath)
+    if not os.path.exists(dir_name):
+        os.makedirs(dir_name)
+    fd, tmp_path = tempfile.mkstemp(dir=dir_name, prefix=f".{os.path.basename(filepath)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            for part in parts:
+                f.write(part)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(filepath):
+            shutil.copymode(filepath, tmp_path)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _line_ending(filepath: str) -> str:
+    """
+    Returns the line ending used by an existing file ("\n" if it has none).
+    """
+    with open(filepath, "r", encoding="utf-8", newline="") as f:
+        first = f.readline()
+    return "\r\n" if first.endswith("\r\n") else "\n"
+
+
+def _as_lines(content: str, line_ending: str) -> list[str]:
+    """
+    Splits text into lines ending with `line_ending`; the last one keeps no ending if the text has none.
+    """
+    lines = content.splitlines(keepends=True)
+    return [line.rstrip("\r\n") + line_ending if line.endswith(("\n", "\r")) else line for line in lines]
+
 
 @tool
 def write_file(filepath: str, content: str) -> str:
     """
     Writes or overwrites a file with the given content.
     Use with caution, as this will replace any existing content.
-    If you want to modify a file, first read it, then provide the full new content here.
+    To change part of an existing file, use replace_lines, apply_patch or append_to_file instead:
+    they only need the changed lines.
 
     Args:
         filepath: The absolute path to the file to be written.
@@ -23,18 +75,245 @@ def write_file(filepath: str, content: str) -> str:
         return f"Error: File path must be absolute. You provided: {filepath}"
     
     try:
-        # Ensure the directory exists
-        dir_name = os.path.dirname(filepath)
-        if not os.path.exists(dir_name):
-            os.makedirs(dir_name)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
+        _atomic_write(filepath, [content])
         return f"Successfully wrote content to {filepath}"
     except Exception as e:
         return f"Error: An unexpected error occurred while writing the file: {e}"
 
 
+@tool
+def read_file_range(filepath: str, start_line: int = 1, max_lines: int = READ_RANGE_MAX_LINES) -> str:
+    """
+    Reads part of a text file, with line numbers, without loading the whole file.
+    Use it to look at a long file piece by piece, and to find the line numbers replace_lines needs.
+
+    Args:
+        filepath: The absolute path to the file.
+        start_line: The first line to return (1-based).
+        max_lines: The maximum number of lines to return.
+
+    Returns:
+        The numbered lines and the total line count, or an error message.
+    """
+    if not os.path.isabs(filepath):
+        return f"Error: File path must be absolute. You provided: {filepath}"
+    start_line = max(1, start_line)
+    max_lines = max(1, min(max_lines, READ_RANGE_MAX_LINES))
+    try:
+        lines, total = [], 0
+        with open(filepath, "r", encoding="utf-8", errors="replace") as f:
+            for total, line in enumerate(f, start=1):
+                if start_line <= total < start_line + max_lines:
+                    text = line.rstrip("\n")
+                    lines.append(f"{total:>6}| {text}")
+    except FileNotFoundError:
+        return f"Error: File not found at the specified path: {filepath}"
+    except Exception as e:
+        return f"Error: An unexpected error occurred while reading the file: {e}"
+
+    if not lines:
+        return f"{filepath} has {total} line(s); there is nothing from line {start_line} on."
+    end_line = start_line + len(lines) - 1
+    result = f"Lines {start_line}-{end_line} of {total} in {filepath}:\n" + "\n".join(lines)
+    if end_line < total:
+        result += f"\n(Call again with start_line={end_line + 1} to read on.)"
+    return result
+
+
+@tool
+def append_to_file(filepath: str, content: str) -> str:
+    """
+    Adds content at the end of a file, creating the file if needed.
+    Use it to add a new section to a draft without rewriting what is already there.
+
+    Args:
+        filepath: The absolute path to the file.
+        content: The text to add. Start it with a newline if it must not continue the last line.
+
+    Returns:
+        A status message indicating success or failure.
+    """
+    if not os.path.isabs(filepath):
+        return f"Error: File path must be absolute. You provided: {filepath}"
+
+    def parts():
+        if os.path.exists(filepath):
+            with open(filepath, "r", encoding="utf-8", newline="") as f:
+                yield from iter(lambda: f.read(1 << 16), "")
+        yield content
+
+    try:
+        _atomic_write(filepath, parts())
+        return f"Successfully appended {len(content)} character(s) to {filepath}"
+    except Exception as e:
+        return f"Error: An unexpected error occurred while appending to the file: {e}"
+
+
+@tool
+def replace_lines(filepath: str, start_line: int, end_line: int, new_content: str, expected_content: str | None = None) -> str:
+    """
+    Replaces lines start_line to end_line (inclusive, 1-based) of a file with new content.
+    An empty new_content deletes the lines; end_line = start_line - 1 inserts before start_line.
+    Read the lines with read_file_range first, as line numbers change after every edit.
+
+    Args:
+        filepath: The absolute path to the file.
+        start_line: The first line to replace.
+        end_line: The last line to replace.
+        new_content: The text that takes the place of the lines.
+        expected_content: The current text of the lines, if you want the edit to fail when they are not what you expect.
+
+    Returns:
+        A status message indicating success or failure.
+    """
+    if not os.path.isabs(filepath):
+        return f"Error: File path must be absolute. You provided: {filepath}"
+    if start_line < 1 or end_line < start_line - 1:
+        return f"Error: Invalid line range {start_line}-{end_line}."
+    try:
+        line_ending = _line_ending(filepath)
+        with open(filepath, "r", encoding="utf-8", newline="") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return f"Error: File not found at the specified path: {filepath}"
+    except Exception as e:
+        return f"Error: An unexpected error occurred while reading the file: {e}"
+    if end_line > len(lines):
+        return f"Error: The file has only {len(lines)} line(s); cannot replace lines {start_line}-{end_line}."
+
+    old = lines[start_line - 1:end_line]
+    if expected_content is not None and [l.rstrip("\r\n") for l in old] != expected_content.splitlines():
+        return (f"Error: Lines {start_line}-{end_line} do not match expected_content; "
+                f"the file may have changed. Read them again with read_file_range.")
+    new = _as_lines(new_content, line_ending)
+    if new and not new[-1].endswith(("\n", "\r")) and end_line < len(lines):
+        new[-1] += line_ending  # The lines that follow must stay on their own lines
+    try:
+        _atomic_write(filepath, lines[:start_line - 1] + new + lines[end_line:])
+    except Exception as e:
+        return f"Error: An unexpected error occurred while writing the file: {e}"
+    return f"Successfully replaced {len(old)} line(s) with {len(new)} line(s) in {filepath}"
+
+
+def _parse_hunks(patch: str) -> list[dict]:
+    """
+    Parses the hunks of a unified diff into {"start", "old", "new", "old_eof", "new_eof"} dicts,
+    where "old" and "new" are the lines (without endings) the hunk removes and puts in their
+    place, and "old_eof"/"new_eof" tell whether the last old/new line has no line ending.
+
+    A hunk ends once it holds the numbers of lines given by its "@@ -a,b +c,d @@" header,
+    so a removed line reading "-- x" is never taken for a "--- " file header, and blank
+    lines after the last hunk are not taken for context lines.
+    """
+    hunks, hunk, last_sign = [], None, None
+    old_left = new_left = 0
+    for line in patch.splitlines():
+        match = _HUNK_RE.match(line)
+        if line.startswith("\\"):
+            # "\ No newline at end of file" applies to the line before it: removed, added or both (context)
+            if hunk is not None and last_sign in (" ", "-"):
+                hunk["old_eof"] = True
+            if hunk is not None and last_sign in (" ", "+"):
+                hunk["new_eof"] = True
+        elif old_left > 0 or new_left > 0:
+            if line[:1] not in (" ", "-", "+") and line != "":
+                raise ValueError(f"Hunk {len(hunks)} has fewer lines than its header says; unexpected line: {line!r}")
+            sign, text = (line[:1] or " "), line[1:]
+            if sign in (" ", "-"):
+                hunk["old"].append(text)
+                old_left -= 1
+            if sign in (" ", "+"):
+                hunk["new"].append(text)
+                new_left -= 1
+            if old_left < 0 or new_left < 0:
+                raise ValueError(f"Hunk {len(hunks)} has more lines than its header says.")
+            last_sign = sign
+        elif match:
+            old_start, old_count = int(match.group(1)), int(match.group(2) if match.group(2) is not None else 1)
+            old_left, new_left = old_count, int(match.group(4) if match.group(4) is not None else 1)
+            # A hunk that removes nothing inserts after its start line
+            hunk = {"start": old_start if old_count == 0 else old_start - 1, "old": [], "new": [], "old_eof": False, "new_eof": False}
+            hunks.append(hunk)
+            last_sign = None
+        elif hunk is not None and line[:1] in (" ", "-", "+") and not line.startswith(("--- ", "+++ ")):
+            raise ValueError(f"Hunk {len(hunks)} has more lines than its header says: {line!r}")
+        # Anything else between hunks (file headers, "diff" and "index" lines, blank lines) is skipped
+    if old_left > 0 or new_left > 0:
+        raise ValueError(f"Hunk {len(hunks)} has fewer lines than its header says.")
+    if not hunks:
+        raise ValueError("The patch has no hunk (no line starting with '@@ -').")
+    return hunks
+
+
+def _find_block(lines: list[str], block: list[str], near: int) -> int | None:
+    """
+    Returns the index of the occurrence of `block` in `lines` closest to `near`, or None.
+    """
+    if not block:
+        return min(max(near, 0), len(lines))
+    for distance in range(max(near, len(lines) - near) + 1):
+        for position in (near - distance, near + distance):
+            if 0 <= position <= len(lines) - len(block) and lines[position:position + len(block)] == block:
+                return position
+    return None
+
+
+@tool
+def apply_patch(filepath: str, patch: str) -> str:
+    """
+    Applies a unified diff (the format of `diff -u` and `git diff`) to a file.
+    Each hunk starts with a line like "@@ -12,3 +12,4 @@", followed by context lines
+    (starting with a space), removed lines ("-") and added lines ("+"). Hunks are located
+    by their content, so slightly wrong line numbers are tolerated, but the line counts of
+    the "@@" line must match the lines of the hunk. Either every hunk is
+    applied or, if one does not match the file, none is.
+
+    Args:
+        filepath: The absolute path to the file.
+        patch: The unified diff.
+
+    Returns:
+        A status message indicating success or failure.
+    """
+    if not os.path.isabs(filepath):
+        return f"Error: File path must be absolute. You provided: {filepath}"
+    try:
+        hunks = _parse_hunks(patch)
+    except ValueError as e:
+        return f"Error: Could not parse the patch: {e}"
+    try:
+        line_ending = _line_ending(filepath)
+        with open(filepath, "r", encoding="utf-8", newline="") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return f"Error: File not found at the specified path: {filepath}"
+    except Exception as e:
+        return f"Error: An unexpected error occurred while reading the file: {e}"
+
+    stripped = [line.rstrip("\r\n") for line in lines]
+    offset = 0  # How much the hunks applied so far moved the lines that follow them
+    for number, hunk in enumerate(hunks, start=1):
+        position = _find_block(stripped, hunk["old"], hunk["start"] + offset)
+        if position is None:
+            return (f"Error: Hunk {number} does not apply: the lines it changes near line {hunk['start'] + 1} "
+                    f"are not in the file. Read them again with read_file_range. No change was made.")
+        end = position + len(hunk["old"])
+        new = [text + line_ending for text in hunk["new"]]
+        # A patch without any "\ No newline" marker keeps the file's missing final line ending
+        at_eof_without_ending = (end == len(lines) and lines and not lines[-1].endswith(("\n", "\r"))
+                                 and not hunk["old_eof"])
+        if new and end == len(lines) and (hunk["new_eof"] or at_eof_without_ending):
+            new[-1] = hunk["new"][-1]
+        lines[position:end] = new
+        stripped[position:end] = hunk["new"]
+        offset += len(hunk["new"]) - len(hunk["old"])
+    try:
+        _atomic_write(filepath, lines)
+    except Exception as e:
+        return f"Error: An unexpected error occurred while writing the file: {e}"
+    return f"Successfully applied {len(hunks)} hunk(s) to {filepath}"
+
+
 def read_file(filepath: str) -> tuple[str | None, str | None]:
     """
     Reads the content of a specified file.
@@ -61,7 +340,8 @@ def read_file(filepath: str) -> tuple[str | None, str | None]:
 
 def add_file_to_kb(source_path: str, kb_dir: str = "knowledge_base") -> tuple[str | None, str | None]:
     """
-    Copies a file from a source path to the knowledge base directory.
+    Copies a file from a source path to the knowledge base directory and indexes it.
+    Files whose content is byte-identical to a file already in the knowledge base are skipped.
 
     Args:
         source_path: The absolute path of the file to be copied.
@@ -82,13 +362,27 @@ def add_file_to_kb(source_path: str, kb_dir: str = "knowledge_base") -> tuple[st
         except Exception as e:
             return None, f"Error: Could not create knowledge base directory at {kb_dir}. Reason: {e}"
 
+    filename = os.path.basename(source_path)
+    try:
+        sha256 = file_sha256(source_path)
+        duplicate = find_duplicate(kb_dir, source_path, sha256)
+    except Exception as e:
+        return None, f"Error: Could not check the knowledge base for duplicates. Reason: {e}"
+    if duplicate is not None:
+        return f"Skipped '{filename}': identical content is already in the knowledge base as '{duplicate}'.", None
+
     try:
         shutil.copy(source_path, kb_dir)
-        filename = os.path.basename(source_path)
-        return f"Successfully copied '{filename}' to the knowledge base.", None
     except Exception as e:
         return None, f"Error: Could not copy file. Reason: {e}"
 
+    # Only this file is read and indexed, even if it replaced one of the same name;
+    # the rest of the knowledge base is not scanned
+    entry = update_file(kb_dir, filename, sha256).manifest.entries.get(filename)
+    if entry is None or "duplicate_of" in entry:
+        return f"Successfully copied '{filename}' to the knowledge base.", None
+    return f"Successfully copied '{filename}' to the knowledge base and indexed {len(entry['chunk_ids'])} paragraph(s).", None
+
 def save_session_history(history: list, filepath: str) -> tuple[str | None, str | None]:
     """
     Saves the conversation history to a file.
@@ -0,0 +1,258 @@
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from thefuzz import fuzz
+
+# Candidates are only sent to the process pool when there is enough work to amortize it
+PARALLEL_MIN_CHARS = 1_000_000
+BATCH_CHARS = 200_000
+# Paragraphs read at a time when a whole corpus is streamed
+STREAM_BATCH_SIZE = 1000
+# Characters whose per-paragraph counts are kept for a streamed corpus; the oldest are dropped first
+MAX_CORPUS_COLUMNS = 256
+
+
+def _partial_ratio_batch(query_lower: str, texts: list[str]) -> list[int]:
+    """
+    Scores a batch of normalized paragraphs; runs in the worker processes.
+    """
+    return [fuzz.partial_ratio(query_lower, text) for text in texts]
+
+
+def partial_ratio_upper_bound(query_lower: str, query_counts: Counter, text: str, text_counts: Counter) -> float:
+    """
+    Returns an upper bound of `fuzz.partial_ratio(query_lower, text)` computed from character counts only.
+
+    partial_ratio compares the shorter string (length n) with windows of at most n
+    characters of the longer one and scores 200 * LCS / (n + window length). The
+    LCS cannot exceed the number of characters both strings have in common
+    (multiset intersection, `overlap`), nor the window length, which bounds the
+    score by 200 * overlap / (n + overlap) whatever the window.
+    """
+    n = min(len(query_lower), len(text))
+    if n == 0:
+        return 100.0
+    overlap = sum(min(count, text_counts.get(char, 0)) for char, count in query_counts.items())
+    return 200.0 * overlap / (n + overlap)
+
+
+class FuzzyScorer:
+    """
+    Scores paragraphs with `fuzz.partial_ratio`, exactly like a plain loop would, but faster.
+
+    - Lowercased paragraphs and their character counts are cached by key, so they
+      are computed once rather than on every query.
+    - Paragraphs whose character-count upper bound (see `partial_ratio_upper_bound`)
+      is below the cutoff are skipped; the bound is exact, so no match is lost.
+    - A whole corpus (`score_corpus`) is streamed instead of cached: only the length
+      of every paragraph and its count of each character queried so far are kept, so
+      that later queries only read the paragraphs that may match.
+    - The remaining paragraphs are scored in batches on a process pool when there is
+      enough text to make it worthwhile.
+    """
+    def __init__(self, max_workers: int | None = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._cache: dict = {}
+        self._corpus = None   # (corpus_id, lengths, {char: counts column}) of the last streamed corpus
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def normalized(self, key, text: str) -> tuple[str, Counter]:
+        """
+        Returns the cached (lowercased text, character counts) pair of a paragraph.
+        """
+        cached = self._cache.get(key)
+        if cached is None:
+            lower = text.lower()
+            cached = self._cache[key] = (lower, Counter(lower))
+        return cached
+
+    def clear(self):
+        self._cache.clear()
+        self._corpus = None
+
+    @staticmethod
+    def _upper_bounds(query_lower: str, query_counts: Counter, lengths: np.ndarray, columns: dict) -> np.ndarray:
+        """
+        Vectorized `partial_ratio_upper_bound`, from the paragraph lengths and the count
+        columns of the query characters.
+        """
+        overlap = np.zeros(len(lengths), dtype=np.int64)
+        for char, count in query_counts.items():
+            overlap += np.minimum(columns[char], count)
+        n = np.minimum(lengths, len(query_lower))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bounds = 200.0 * overlap / (n + overlap)
+        bounds[n == 0] = 100.0
+        return bounds
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # Workers are spawned, not forked: the process runs other threads (fan-out pool, server
+                # handlers, ingestion worker) whose locks a forked child could inherit held
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def score(self, query: str, items: list[tuple], score_cutoff: int = 0, parallel: bool | None = None) -> list[tuple]:
+        """
+        Scores paragraphs against a query.
+
+        Args:
+            query: The query, as typed.
+            items: (key, text) pairs; the key identifies the text in the cache.
+            score_cutoff: The minimum score (0-100) to keep.
+            parallel: Force (True) or forbid (False) the process pool; by default it
+                is used when the candidates add up to more than PARALLEL_MIN_CHARS.
+
+        Returns:
+            A list of (key, score) pairs with score >= score_cutoff, in input order.
+        """
+        query_lower = query.lower()
+        query_counts = Counter(query_lower)
+
+        normalized = [self.normalized(key, text) for key, text in items]
+        if score_cutoff <= 0:
+            candidates = [(key, lower) for (key, _), (lower, _) in zip(items, normalized)]
+        else:
+            lengths = np.fromiter((len(lower) for lower, _ in normalized), dtype=np.int64, count=len(normalized))
+            columns = {char: np.fromiter((counts.get(char, 0) for _, counts in normalized), dtype=np.int64, count=len(normalized))
+                       for char in query_counts}
+            bounds = self._upper_bounds(query_lower, query_counts, lengths, columns)
+            candidates = [(items[i][0], normalized[i][0]) for i in np.flatnonzero(bounds >= _threshold(score_cutoff))]
+        return self._score_candidates(query_lower, candidates, score_cutoff, parallel)
+
+    def score_corpus(self, query: str, keys: list, read_texts, score_cutoff: int = 0, parallel: bool | None = None,
+                     corpus_id=None) -> list[tuple]:
+        """
+        Scores every paragraph of a corpus whose texts are read on demand, e.g. from the knowledge base files.
+
+        The texts are never cached. What is kept for the last `corpus_id` is the length of
+        every paragraph and, for each character that appeared in a query (at most
+        MAX_CORPUS_COLUMNS), its count in every paragraph: 8 bytes per paragraph plus 4 per
+        paragraph and character, e.g. about 17 MB for 100k paragraphs and 40 characters,
+        and at most about 100 MB for 100k paragraphs. When the counts of all the query
+        characters are known, only the paragraphs whose bound reaches the cutoff are read;
+        otherwise the corpus is read once, in batches, filling in the missing counts.
+
+        Args:
+            query: The query, as typed.
+            keys: The keys of every paragraph, in the order they are best read in.
+            read_texts: Called with a list of keys; returns their texts as a {key: text} dict.
+            score_cutoff: The minimum score (0-100) to keep.
+            parallel: See `score`.
+            corpus_id: Any hashable value identifying `keys` and their texts, or None to keep nothing.
+
+        Returns:
+            A list of (key, score) pairs with score >= score_cutoff, in key order.
+        """
+        query_lower = query.lower()
+        query_counts = Counter(query_lower)
+        threshold = _threshold(score_cutoff)
+        lengths, columns = None, {}
+        if corpus_id is not None and self._corpus is not None and self._corpus[0] == corpus_id:
+            _, lengths, columns = self._corpus
+        missing = [char for char in query_counts if char not in columns] if score_cutoff > 0 else []
+
+        candidates = []
+        if lengths is not None and not missing:
+            selected = keys
+            if score_cutoff > 0:
+                bounds = self._upper_bounds(query_lower, query_counts, lengths, columns)
+                selected = [keys[i] for i in np.flatnonzero(bounds >= threshold)]
+            for start in range(0, len(selected), STREAM_BATCH_SIZE):
+                batch = selected[start:start + STREAM_BATCH_SIZE]
+                texts = read_texts(batch)
+                candidates.extend((key, texts[key].lower()) for key in batch)
+        else:
+            lengths = np.zeros(len(keys), dtype=np.int64)
+            columns = dict(columns)
+            for char in missing:
+                columns[char] = np.zeros(len(keys), dtype=np.int32)
+            for start in range(0, len(keys), STREAM_BATCH_SIZE):
+                batch = keys[start:start + STREAM_BATCH_SIZE]
+                texts = read_texts(batch)
+                for i, key in enumerate(batch, start):
+                    lower = texts[key].lower()
+                    counts = Counter(lower)
+                    lengths[i] = len(lower)
+                    for char in missing:
+                        columns[char][i] = counts.get(char, 0)
+                    if score_cutoff <= 0 or partial_ratio_upper_bound(query_lower, query_counts, lower, counts) >= threshold:
+                        candidates.append((key, lower))
+            if corpus_id is not None:
+                while len(columns) > MAX_CORPUS_COLUMNS:
+                    del columns[next(iter(columns))]
+                self._corpus = (corpus_id, lengths, columns)
+        return self._score_candidates(query_lower, candidates, score_cutoff, parallel)
+
+    def _score_candidates(self, query_lower: str, candidates: list[tuple], score_cutoff: int, parallel: bool | None) -> list[tuple]:
+        total_chars = sum(len(lower) for _, lower in candidates)
+        if parallel is None:
+            parallel = self.max_workers > 1 and total_chars >= PARALLEL_MIN_CHARS
+        if parallel and candidates:
+            scores = self._score_parallel(query_lower, [lower for _, lower in candidates])
+        else:
+            scores = _partial_ratio_batch(query_lower, [lower for _, lower in candidates])
+        return [(key, score) for (key, _), score in zip(candidates, scores) if score >= score_cutoff]
+
+    def _score_parallel(self, query_lower: str, texts: list[str]) -> list[int]:
+        batches, batch, batch_chars = [], [], 0
+        for text in texts:
+            batch.append(text)
+            batch_chars += len(text)
+            if batch_chars >= BATCH_CHARS:
+                batches.append(batch)
+                batch, batch_chars = [], 0
+        if batch:
+            batches.append(batch)
+
+        pool = self._get_pool()
+        futures = [pool.submit(_partial_ratio_batch, query_lower, batch) for batch in batches]
+        scores = []
+        for future in futures:
+            scores.extend(future.result())
+        return scores
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+def _threshold(score_cutoff: int) -> float:
+    # partial_ratio returns int(round(raw)), so raw scores down to cutoff - 0.5 still count
+    return score_cutoff - 0.5 - 1e-9
+
+
+_SCORERS: dict[str, tuple[str, FuzzyScorer]] = {}
+_SCORERS_LOCK = threading.Lock()
+
+
+def get_scorer(kb_dir: str, build_id: str) -> FuzzyScorer:
+    """
+    Returns the scorer whose caches hold the paragraphs of a knowledge base.
+
+    Chunk ids never change meaning within one build of the index, so the cache only
+    has to be dropped when the index is rebuilt from scratch.
+
+    Args:
+        kb_dir: The knowledge base directory.
+        build_id: The `build_id` of the current index snapshot.
+
+    Returns:
+        A FuzzyScorer keyed by chunk id.
+    """
+    key = os.path.abspath(kb_dir)
+    with _SCORERS_LOCK:
+        current = _SCORERS.get(key)
+        if current is None or current[0] != build_id:
+            scorer = current[1] if current is not None else FuzzyScorer()
+            scorer.clear()
+            _SCORERS[key] = current = (build_id, scorer)
+        return current[1]
@@ -0,0 +1,278 @@
+import os
+import queue
+import threading
+import time
+import itertools
+
+from tools.file_io import add_file_to_kb
+from tools.kb_index import get_index, get_index_if_loaded
+from tools.kb_namespaces import DEFAULT_NAMESPACE, list_namespaces, namespace_dir
+from tools.vector_store import get_vector_index, get_vector_index_if_loaded
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class IngestionJob:
+    """
+    A unit of background work: importing a file or a directory, or refreshing the index.
+    """
+    def __init__(self, job_id: int, source: str | None, files: list[str], namespace: str = DEFAULT_NAMESPACE):
+        self.id = job_id
+        self.source = source      # None for refresh jobs triggered by the watcher
+        self.files = files
+        self.namespace = namespace  # Where the files are imported
+        self.status = JOB_QUEUED
+        self.done = 0
+        self.added = 0
+        self.skipped = 0
+        self.errors = []
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def description(self) -> str:
+        if self.source is None:
+            return "refresh knowledge base index"
+        return self.source if self.namespace == DEFAULT_NAMESPACE else f"{self.source} → {self.namespace}"
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "source": self.description,
+            "namespace": self.namespace,
+            "status": self.status,
+            "total": len(self.files),
+            "done": self.done,
+            "added": self.added,
+            "skipped": self.skipped,
+            "errors": list(self.errors),
+        }
+
+
+def _collect_files(source_path: str) -> list[str]:
+    """
+    Lists the files to import: the file itself, or every .md file under a directory.
+    """
+    if os.path.isfile(source_path):
+        return [source_path]
+    files = []
+    for root, dirs, filenames in os.walk(source_path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        files.extend(os.path.join(root, name) for name in sorted(filenames) if name.endswith(".md"))
+    return files
+
+
+class IngestionWorker:
+    """
+    Imports files into the knowledge base on a background thread.
+
+    Jobs are processed one at a time from a queue, so the chat loop never waits for
+    copying, indexing or embedding. Each file is indexed as soon as it is copied, and
+    every index update is published as a new snapshot (see `tools.kb_index.get_index`),
+    so searches running concurrently see either the old or the new index, never a mix.
+
+    Optionally, the knowledge base directory is polled for changes made outside the
+    agent, which are indexed in the background too.
+    """
+    def __init__(self, kb_dir: str = "knowledge_base", watch_interval: float | None = None, embed: bool = True):
+        self.kb_dir = kb_dir
+        self.embed = embed
+        self._queue = queue.Queue()
+        self._jobs: dict[int, IngestionJob] = {}
+        self._finished = []
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="kb-ingest", daemon=True)
+        self._thread.start()
+        self._watch_interval = None
+        self._watch_stop = None
+        if watch_interval:
+            self.watch(watch_interval)
+
+    # --- Submitting work ---
+
+    def submit(self, source_path: str, namespace: str = DEFAULT_NAMESPACE) -> tuple[int | None, str | None]:
+        """
+        Queues a file or a directory for import into the knowledge base.
+
+        Args:
+            source_path: The absolute path of a file, or of a directory whose .md files are imported.
+            namespace: The knowledge base namespace to import into; it must exist.
+
+        Returns:
+            A tuple containing the job id and an error message.
+        """
+        if not os.path.isabs(source_path):
+            return None, f"Error: Source path must be absolute. You provided: {source_path}"
+        if not os.path.exists(source_path):
+            return None, f"Error: Source path not found at {source_path}"
+        if namespace != DEFAULT_NAMESPACE and namespace not in list_namespaces(self.kb_dir):
+            return None, f"Error: Namespace '{namespace}' does not exist. Create it with !ns create {namespace}"
+
+        files = _collect_files(source_path)
+        if not files:
+            return None, f"Error: No .md files found under {source_path}"
+        return self._enqueue(source_path, files, namespace), None
+
+    def request_refresh(self) -> int:
+        """
+        Queues a refresh of the index from the current directory contents.
+        """
+        return self._enqueue(None, [])
+
+    def _enqueue(self, source: str | None, files: list[str], namespace: str = DEFAULT_NAMESPACE) -> int:
+        with self._lock:
+            job = IngestionJob(next(self._job_ids), source, files, namespace)
+            self._jobs[job.id] = job
+        self._queue.put(job)
+        return job.id
+
+    # --- Watching ---
+
+    def watch(self, interval: float):
+        """
+        Starts polling the knowledge base directory (every namespace) every `interval` seconds.
+        Calling it again changes the interval.
+        """
+        self.unwatch()
+        self._watch_interval = interval
+        self._watch_stop = threading.Event()
+        threading.Thread(target=self._poll, args=(interval, self._watch_stop), name="kb-watch", daemon=True).start()
+
+    def unwatch(self):
+        """
+        Stops polling the knowledge base directory.
+        """
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+        self._watch_stop = None
+        self._watch_interval = None
+
+    def _poll(self, interval: float, stop: threading.Event):
+        while not stop.wait(interval):
+            if not os.path.isdir(self.kb_dir) or self.is_busy():
+                continue
+            if any(self._is_stale(namespace_dir(self.kb_dir, name)) for name in list_namespaces(self.kb_dir)):
+                self.request_refresh()
+
+    def _is_stale(self, shard_dir: str) -> bool:
+        # `is_fresh` compares every file, so files edited in place are noticed too
+        index = get_index_if_loaded(shard_dir)
+        try:
+            stale = index is None or not index.is_fresh()
+            if not stale and self.embed:
+                vectors = get_vector_index_if_loaded(shard_dir)
+                stale = vectors is not None and not vectors.is_fresh()
+        except OSError:
+            return False
+        return stale
+
+    # --- Processing ---
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            try:
+                self._process(job)
+                # A job only fails as a whole if none of its files could be imported
+                failed = job.files and len(job.errors) == len(job.files)
+                job.status = JOB_FAILED if failed else JOB_DONE
+            except Exception as e:
+                job.errors.append(str(e))
+                job.status = JOB_FAILED
+            job.finished_at = time.time()
+            with self._lock:
+                self._finished.append(job)
+            self._queue.task_done()
+
+    def _process(self, job: IngestionJob):
+        target_dir = namespace_dir(self.kb_dir, job.namespace)
+        for filepath in job.files:
+            if self._stop.is_set():
+                break
+            success_msg, error_msg = add_file_to_kb(filepath, kb_dir=target_dir)
+            if error_msg:
+                job.errors.append(error_msg)
+            elif success_msg.startswith("Skipped"):
+                job.skipped += 1
+            else:
+                job.added += 1
+            job.done += 1
+        # Refresh jobs bring every namespace up to date
+        shards = ([target_dir] if job.source is not None
+                  else [namespace_dir(self.kb_dir, name) for name in list_namespaces(self.kb_dir)])
+        for shard_dir in shards:
+            if os.path.isdir(shard_dir):
+                get_index(shard_dir, check_files=True)
+                if self.embed:
+                    get_vector_index(shard_dir)
+
+    # --- Reporting ---
+
+    def is_busy(self) -> bool:
+        return any(job.status in (JOB_QUEUED, JOB_RUNNING) for job in list(self._jobs.values()))
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until every queued job has finished.
+
+        Returns:
+            True if the queue drained, False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self.is_busy():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def pop_finished(self) -> list[dict]:
+        """
+        Returns the jobs that finished since the last call, for one-off notifications.
+        """
+        with self._lock:
+            finished, self._finished = self._finished, []
+        return [job.to_dict() for job in finished]
+
+    def status(self) -> dict:
+        """
+        Summarizes the queue, the jobs and the current index snapshot of every namespace.
+
+        Returns:
+            A dict with "jobs" (a list of job dicts, oldest first), "watching" (the polling
+            interval or None), "namespaces" (a list of {"namespace", "index"} dicts) and
+            "index", the "index" of the default namespace. An "index" gives the file, chunk
+            and generation counts of the published snapshot, or is None if no index of the
+            namespace has been loaded yet.
+        """
+        with self._lock:
+            jobs = [job.to_dict() for job in self._jobs.values()]
+        namespaces = []
+        for name in list_namespaces(self.kb_dir) or [DEFAULT_NAMESPACE]:
+            index = get_index_if_loaded(namespace_dir(self.kb_dir, name))
+            index_info = None
+            if index is not None:
+                index_info = {
+                    "files": len(index.manifest.entries),
+                    "chunks": len(index.chunks),
+                    "generation": index.generation,
+                }
+            namespaces.append({"namespace": name, "index": index_info})
+        return {"jobs": jobs, "watching": self._watch_interval, "namespaces": namespaces, "index": namespaces[0]["index"]}
+
+    def stop(self):
+        """
+        Stops the worker and the watcher. Jobs still in the queue are abandoned.
+        """
+        self.unwatch()
+        self._stop.set()
+        self._thread.join(timeout=5)
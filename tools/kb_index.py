@@ -0,0 +1,714 @@
+import json
+import math
+import os
+import heapq
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from tools.chunker import iter_chunks, read_spans
+from tools.cow_dict import CopyOnWriteDict
+from tools.kb_manifest import Manifest, file_sha256, scan_directory
+from tools.tokens import tokenize
+
+INDEX_DIRNAME = ".index"
+INDEX_FILENAME = "bm25.json"
+INDEX_LOG_FILENAME = "bm25.log"
+INDEX_VERSION = 3
+
+# BM25 free parameters (standard Okapi defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# The change log is folded into a new snapshot once it outgrows this fraction of the snapshot
+LOG_COMPACT_RATIO = 0.5
+LOG_COMPACT_MIN_BYTES = 1 << 20
+
+# A published index is compared with the files of its directory at most this often, unless the directory itself changed
+FRESHNESS_CHECK_SECONDS = 1.0
+# The chunk ids added and removed by this many recent updates are kept, for dependent indexes (see `changes_since`)
+RECENT_CHANGES_KEPT = 64
+
+
+def split_paragraphs(content: str) -> list[str]:
+    """
+    Splits a document into non-empty paragraphs based on blank lines.
+
+    Args:
+        content: The full text of a document.
+
+    Returns:
+        A list of stripped paragraphs.
+    """
+    return [para.strip() for para in content.split('\n\n') if para.strip()]
+
+
+class InvertedIndex:
+    """
+    An in-memory inverted index over text chunks, scored with BM25.
+
+    Chunks are identified by integer ids and carry the name of the document they come
+    from. Postings lists can be shared copy-on-write with a clone (see
+    `KnowledgeBaseIndex.copy`).
+    """
+    def __init__(self):
+        self.chunks = {}      # chunk_id -> {"file": document name, "text": str, "length": int}
+        self.postings = {}    # term -> {chunk_id: term frequency}
+        self.total_length = 0
+        self.next_chunk_id = 0
+        self._owned_terms = None  # None: every postings list belongs to this instance
+
+    def _writable_postings(self, term: str) -> dict:
+        plist = self.postings.get(term)
+        if self._owned_terms is not None and term not in self._owned_terms:
+            plist = dict(plist) if plist else {}
+            self.postings[term] = plist
+            self._owned_terms.add(term)
+        elif plist is None:
+            plist = self.postings[term] = {}
+        return plist
+
+    def _add_terms(self, chunk_id: int | None, record: dict, terms: Counter) -> int:
+        if chunk_id is None:
+            chunk_id = self.next_chunk_id
+        self.next_chunk_id = max(self.next_chunk_id, chunk_id + 1)
+
+        record["length"] = sum(terms.values())
+        self.chunks[chunk_id] = record
+        self.total_length += record["length"]
+        for term, tf in terms.items():
+            self._writable_postings(term)[chunk_id] = tf
+        return chunk_id
+
+    def add_chunk(self, filename: str, text: str, chunk_id: int | None = None) -> int:
+        """
+        Adds a single paragraph to the index and returns its chunk id.
+        """
+        return self._add_terms(chunk_id, {"file": filename, "text": text}, Counter(tokenize(text)))
+
+    def _chunk_terms(self, chunk_id: int, chunk: dict):
+        return set(tokenize(chunk["text"]))
+
+    def remove_chunk(self, chunk_id: int):
+        """
+        Removes a paragraph and its postings from the index.
+        """
+        chunk = self.chunks.pop(chunk_id)
+        self.total_length -= chunk["length"]
+        for term in self._chunk_terms(chunk_id, chunk):
+            plist = self._writable_postings(term)
+            del plist[chunk_id]
+            if not plist:
+                del self.postings[term]
+
+    def _chunk_getter(self):
+        return self.chunks.__getitem__
+
+    def chunk_texts(self, chunk_ids) -> dict[int, str]:
+        """
+        Returns the text of the given chunks, by chunk id.
+        """
+        return {chunk_id: self.chunks[chunk_id]["text"] for chunk_id in chunk_ids}
+
+    def search(self, query: str, top_k: int = 10) -> list[dict]:
+        """
+        Ranks chunks against a query with BM25.
+        Only the postings lists of the query terms are visited.
+
+        Args:
+            query: The free-text query.
+            top_k: The maximum number of chunks to return.
+
+        Returns:
+            A list of {"chunk_id", "filepath", "heading", "paragraph", "score", "coverage"} dicts,
+            best first. "coverage" is the idf-weighted share of the query terms found in the
+            chunk (terms absent from the index weigh the most), from 0 to 1.
+        """
+        num_chunks = len(self.chunks)
+        if num_chunks == 0:
+            return []
+        avg_length = self.total_length / num_chunks or 1.0
+
+        chunk = self._chunk_getter()
+        scores, covered, query_weight = {}, {}, 0.0
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term) or {}
+            df = len(plist)
+            idf = math.log(1 + (num_chunks - df + 0.5) / (df + 0.5))
+            query_weight += idf
+            for chunk_id, tf in plist.items():
+                length = chunk(chunk_id)["length"]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+                covered[chunk_id] = covered.get(chunk_id, 0.0) + idf
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        texts = self.chunk_texts(chunk_id for chunk_id, _ in best)
+        return [{
+            "chunk_id": chunk_id,
+            "filepath": self.chunks[chunk_id]["file"],
+            "heading": self.chunks[chunk_id].get("heading", ""),
+            "paragraph": texts[chunk_id],
+            "score": score,
+            "coverage": covered[chunk_id] / query_weight,
+        } for chunk_id, score in best]
+
+
+class KnowledgeBaseIndex(InvertedIndex):
+    """
+    The inverted index of the paragraphs of a knowledge base directory.
+
+    What has been indexed is tracked by a `Manifest` (size, mtime, content hash and
+    chunk ids per file), so `refresh` only processes new or changed files and drops
+    the chunks of deleted ones, and `update_file` processes a single known file.
+    Files are compared by their own size and mtime: rewriting a file in place does not
+    change the mtime of its directory.
+
+    Files are split by `tools.chunker` while they are streamed, and the index keeps only
+    the byte offsets and heading breadcrumb of every chunk, not its text: texts are read
+    back from the files when a search returns them. To remove a chunk's postings without
+    its text, the distinct terms of every chunk are kept in `chunk_terms`.
+
+    On disk the index is a snapshot, `<kb_dir>/.index/bm25.json`, plus an append-only
+    log of the changes made since, `bm25.log`. An update costs time proportional to
+    the files it touches; the log is folded into a new snapshot once it grows large.
+    """
+    def __init__(self, kb_dir: str):
+        self.kb_dir = kb_dir
+        self._reset()
+
+    def _reset(self):
+        InvertedIndex.__init__(self)
+        self.chunks = CopyOnWriteDict()
+        self.postings = CopyOnWriteDict()
+        self.chunk_terms = CopyOnWriteDict()  # chunk_id -> distinct terms of the chunk
+        self.manifest = Manifest()
+        self.build_id = None  # identifies one full build; chunk ids are only comparable within a build
+        self.generation = 0   # incremented on every change, lets dependent indexes detect staleness
+        self.recent_changes = ()  # (generation, added chunk ids, removed chunk ids) of the last updates
+        self._added_ids, self._removed_ids = [], []  # since the last generation
+        self.dir_mtime_ns = None
+        self.checked_at = None  # when the files were last compared with the manifest (time.monotonic)
+
+    def copy(self) -> "KnowledgeBaseIndex":
+        """
+        Returns a copy-on-write clone of the index.
+
+        The clone shares the chunk records, terms, postings lists and manifest of this
+        index (see `tools.cow_dict.CopyOnWriteDict`) and copies a postings list only the
+        first time it modifies it, so a clone costs what the update touches rather than
+        the size of the corpus, and the original can keep serving searches unchanged
+        while the clone is being updated.
+        """
+        clone = KnowledgeBaseIndex(self.kb_dir)
+        clone.manifest = self.manifest.copy()
+        clone.chunks = self.chunks.copy()
+        clone.chunk_terms = self.chunk_terms.copy()
+        clone.postings = self.postings.copy()
+        clone.total_length = self.total_length
+        clone.next_chunk_id = self.next_chunk_id
+        clone.build_id = self.build_id
+        clone.generation = self.generation
+        clone.recent_changes = self.recent_changes
+        clone.dir_mtime_ns = self.dir_mtime_ns
+        clone.checked_at = self.checked_at
+        # The postings lists are now shared: neither index may modify one without copying it
+        self._owned_terms = set()
+        clone._owned_terms = set()
+        return clone
+
+    @property
+    def index_dir(self) -> str:
+        return os.path.join(self.kb_dir, INDEX_DIRNAME)
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.index_dir, INDEX_FILENAME)
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.index_dir, INDEX_LOG_FILENAME)
+
+    # --- Chunks ---
+
+    def add_span(self, filename: str, start: int, end: int, heading: str, terms: Counter,
+                 chunk_id: int | None = None) -> int:
+        """
+        Adds a chunk, given by its byte offsets in a file and its term frequencies, and returns its chunk id.
+        """
+        terms = Counter({sys.intern(term): tf for term, tf in terms.items()})
+        chunk_id = self._add_terms(chunk_id, {"file": filename, "start": start, "end": end, "heading": heading}, terms)
+        self.chunk_terms[chunk_id] = tuple(terms)
+        self._added_ids.append(chunk_id)
+        return chunk_id
+
+    def _chunk_terms(self, chunk_id: int, chunk: dict):
+        return self.chunk_terms.pop(chunk_id)
+
+    def _chunk_getter(self):
+        return self.chunks.getter()
+
+    def remove_chunk(self, chunk_id: int):
+        super().remove_chunk(chunk_id)
+        self._removed_ids.append(chunk_id)
+
+    def chunk_texts(self, chunk_ids) -> dict[int, str]:
+        """
+        Reads the text of the given chunks from their files, opening each file once.
+
+        A file that changed since it was indexed is not read through its old offsets: its
+        chunks come back empty, and the next `get_index` compares every file again.
+        """
+        by_file = {}
+        for chunk_id in chunk_ids:
+            by_file.setdefault(self.chunks[chunk_id]["file"], []).append(chunk_id)
+        texts = {}
+        for filename, ids in by_file.items():
+            filepath = os.path.join(self.kb_dir, filename)
+            spans = [(self.chunks[cid]["start"], self.chunks[cid]["end"]) for cid in ids]
+            entry = self.manifest.entries.get(filename)
+            try:
+                stat = os.stat(filepath)
+                if entry is None or (stat.st_size, stat.st_mtime_ns) != (entry["size"], entry["mtime_ns"]):
+                    self.checked_at = None
+                    texts.update((cid, "") for cid in ids)
+                else:
+                    texts.update(zip(ids, read_spans(filepath, spans)))
+            except OSError:
+                texts.update((cid, "") for cid in ids)  # Deleted since the last refresh
+        return texts
+
+    def changes_since(self, generation: int) -> tuple[set, set] | None:
+        """
+        Returns the chunk ids added and removed since a generation of this build.
+
+        Args:
+            generation: An earlier generation of the index.
+
+        Returns:
+            A tuple containing the sets of added and removed chunk ids, or None if the
+            updates since that generation are no longer all recorded.
+        """
+        records = [record for record in self.recent_changes if record[0] > generation]
+        if generation != self.generation and (not records or records[0][0] != generation + 1):
+            return None
+        added, removed = set(), set()
+        for _, added_ids, removed_ids in records:
+            for chunk_id in removed_ids:
+                if chunk_id in added:
+                    added.discard(chunk_id)  # Chunk ids are never reused within a build
+                else:
+                    removed.add(chunk_id)
+            added.update(added_ids)
+        return added, removed
+
+    def chunk_ids_in_file_order(self) -> list[int]:
+        """
+        Returns every chunk id, sorted by file and position, the order in which they are cheapest to read.
+        """
+        chunk = self.chunks.getter()
+        return sorted(self.chunks, key=lambda cid: (chunk(cid)["file"], chunk(cid)["start"]))
+
+    def iter_chunk_texts(self, batch_size: int = 1000):
+        """
+        Yields the texts of every chunk as {chunk_id: text} batches, in file order, so that
+        the corpus is never held in memory as a whole.
+        """
+        chunk_ids = self.chunk_ids_in_file_order()
+        for i in range(0, len(chunk_ids), batch_size):
+            yield self.chunk_texts(chunk_ids[i:i + batch_size])
+
+    # --- Building ---
+
+    def remove_file(self, filename: str):
+        """
+        Removes a file and all of its chunks from the index.
+        """
+        entry = self.manifest.pop_entry(filename)
+        for chunk_id in entry["chunk_ids"]:
+            self.remove_chunk(chunk_id)
+
+    def _index_file(self, filename: str, sha256: str, signature: tuple[int, int]) -> dict:
+        """
+        Streams, splits and indexes one file, unless its content is already indexed under another name.
+
+        Returns:
+            The change-log record describing what was added.
+        """
+        entry = {"size": signature[0], "mtime_ns": signature[1], "sha256": sha256, "chunk_ids": []}
+        chunks = []
+        original = self.manifest.find_by_hash(sha256)
+        if original is not None and original != filename:
+            entry["duplicate_of"] = original
+        else:
+            filepath = os.path.join(self.kb_dir, filename)
+            try:
+                for chunk in iter_chunks(filepath):
+                    terms = Counter(tokenize(chunk["heading"] + "\n" + chunk["text"]))
+                    chunk_id = self.add_span(filename, chunk["start"], chunk["end"], chunk["heading"], terms)
+                    entry["chunk_ids"].append(chunk_id)
+                    chunks.append([chunk_id, chunk["start"], chunk["end"], chunk["heading"], terms])
+            except Exception as e:
+                print(f"Could not read file {filepath}: {e}")
+                entry["error"] = str(e)
+                for chunk_id in entry["chunk_ids"]:
+                    self.remove_chunk(chunk_id)
+                entry["chunk_ids"], chunks = [], []
+        self.manifest.set_entry(filename, entry)
+        return {"op": "add", "file": filename, "entry": entry, "chunks": chunks}
+
+    def _apply_plan(self, plan: dict, signatures: dict[str, tuple[int, int]]) -> list[dict]:
+        """
+        Applies a manifest plan to the index.
+
+        Returns:
+            The list of change-log records, in the order they were applied.
+        """
+        ops = []
+        dropped = set(plan["removed"]) | set(plan["changed"])
+        # Duplicates of a dropped file lose their original and must be indexed themselves
+        orphans = {name: entry for name, entry in self.manifest.entries.items()
+                   if entry.get("duplicate_of") in dropped and name not in dropped} if dropped else {}
+
+        for filename in sorted(dropped | orphans.keys()):
+            self.remove_file(filename)
+            ops.append({"op": "remove", "file": filename})
+
+        for filename in plan["touched"]:
+            size, mtime_ns = signatures[filename]
+            entry = {**self.manifest.entries[filename], "size": size, "mtime_ns": mtime_ns}
+            self.manifest.set_entry(filename, entry)
+            ops.append({"op": "entry", "file": filename, "entry": entry})
+
+        hashes = {**{name: entry["sha256"] for name, entry in orphans.items()}, **plan["hashes"]}
+        signatures = {**{name: (entry["size"], entry["mtime_ns"]) for name, entry in orphans.items()}, **signatures}
+        for filename in sorted(set(plan["added"]) | set(plan["changed"]) | orphans.keys()):
+            ops.append(self._index_file(filename, hashes[filename], signatures[filename]))
+        return ops
+
+    def build(self):
+        """
+        (Re)builds the whole index from the files currently in the directory and saves a snapshot.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._reset()
+        self.build_id = uuid.uuid4().hex
+        dir_mtime_ns = os.stat(self.kb_dir).st_mtime_ns
+        signatures = scan_directory(self.kb_dir)
+        self._apply_plan(self.manifest.plan(self.kb_dir, signatures), signatures)
+        self._added_ids, self._removed_ids = [], []
+        self.generation = 1
+        self.save()
+        self.mark_checked(dir_mtime_ns)
+
+    def _commit(self, ops: list[dict]):
+        """
+        Starts a new generation for the changes just applied and logs them.
+        """
+        self.generation += 1
+        record = (self.generation, tuple(self._added_ids), tuple(self._removed_ids))
+        self.recent_changes = (self.recent_changes + (record,))[-RECENT_CHANGES_KEPT:]
+        self._added_ids, self._removed_ids = [], []
+        self._append_log(ops)
+
+    def refresh(self, signatures: dict[str, tuple[int, int]] | None = None, dir_mtime_ns: int | None = None) -> bool:
+        """
+        Brings the index up to date with the directory, processing only what changed.
+
+        The size and mtime of every file are compared with the manifest; only files
+        with a new size or mtime are read and hashed.
+
+        Args:
+            signatures: A `scan_directory` result taken after `dir_mtime_ns`, to avoid scanning again.
+            dir_mtime_ns: The directory mtime read before the scan.
+
+        Returns:
+            True if the index changed, False if it was already up to date.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        if signatures is None:
+            dir_mtime_ns = os.stat(self.kb_dir).st_mtime_ns
+            signatures = scan_directory(self.kb_dir)
+        changed = False
+        if not self.manifest.is_current(signatures):
+            ops = self._apply_plan(self.manifest.plan(self.kb_dir, signatures), signatures)
+            if ops:
+                self._commit(ops)
+                changed = True
+        self.mark_checked(dir_mtime_ns)
+        return changed
+
+    def update_file(self, filename: str, sha256: str | None = None) -> bool:
+        """
+        Brings a single file of the directory up to date in the index, e.g. right after
+        writing it, without looking at the other files.
+
+        Args:
+            filename: The name of the file in the knowledge base directory.
+            sha256: The content hash of the file, if already known.
+
+        Returns:
+            True if the index changed, False if the file was already up to date.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        filepath = os.path.join(self.kb_dir, filename)
+        entry = self.manifest.entries.get(filename)
+        plan = {"added": [], "changed": [], "removed": [], "touched": [], "hashes": {}}
+        signatures = {}
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            if entry is None:
+                return False
+            plan["removed"].append(filename)
+        else:
+            signatures[filename] = (stat.st_size, stat.st_mtime_ns)
+            if entry is not None and (entry["size"], entry["mtime_ns"]) == signatures[filename]:
+                return False
+            plan["hashes"][filename] = sha256 = sha256 or file_sha256(filepath)
+            if entry is None:
+                plan["added"].append(filename)
+            else:
+                plan["touched" if entry["sha256"] == sha256 else "changed"].append(filename)
+        ops = self._apply_plan(plan, signatures)
+        if ops:
+            self._commit(ops)
+        return bool(ops)
+
+    def needs_check(self) -> bool:
+        """
+        Tells whether the files should be compared with the manifest again: the directory
+        changed (files were added or removed), or the last comparison is too old to vouch
+        for files edited in place.
+        """
+        if self.checked_at is None or time.monotonic() - self.checked_at >= FRESHNESS_CHECK_SECONDS:
+            return True
+        return os.stat(self.kb_dir).st_mtime_ns != self.dir_mtime_ns
+
+    def mark_checked(self, dir_mtime_ns: int | None):
+        """
+        Records that the files were found to match the manifest.
+        """
+        self.dir_mtime_ns = dir_mtime_ns
+        self.checked_at = time.monotonic()
+
+    # --- Persistence ---
+
+    def save(self):
+        """
+        Writes a full snapshot atomically (temporary file + rename) and clears the change log.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        data = {
+            "version": INDEX_VERSION,
+            "build_id": self.build_id,
+            "generation": self.generation,
+            "manifest": self.manifest.to_dict(),
+            "chunks": [[cid, c["file"], c["start"], c["end"], c["heading"], c["length"]] for cid, c in self.chunks.items()],
+            "postings": {term: list(plist.items()) for term, plist in self.postings.items()},
+            "total_length": self.total_length,
+            "next_chunk_id": self.next_chunk_id,
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+        # Log records are tagged with their generation, so a crash right here is harmless:
+        # records already contained in the snapshot are skipped when the log is replayed.
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+    def _append_log(self, ops: list[dict]):
+        """
+        Appends change records to the log, compacting into a new snapshot when it grows too large.
+        """
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            for op in ops:
+                f.write(json.dumps({**op, "generation": self.generation}, ensure_ascii=False) + "\n")
+        log_size = os.path.getsize(self.log_path)
+        snapshot_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        if log_size > max(LOG_COMPACT_MIN_BYTES, snapshot_size * LOG_COMPACT_RATIO):
+            self.save()
+
+    def _replay_log(self, base_generation: int):
+        try:
+            f = open(self.log_path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    break  # A torn final record from an interrupted write
+                if op["generation"] <= base_generation:
+                    continue
+                if op["op"] == "remove":
+                    self.remove_file(op["file"])
+                elif op["op"] == "entry":
+                    self.manifest.set_entry(op["file"], op["entry"])
+                elif op["op"] == "add":
+                    for chunk_id, start, end, heading, terms in op["chunks"]:
+                        self.add_span(op["file"], start, end, heading, Counter(terms), chunk_id=chunk_id)
+                    self.manifest.set_entry(op["file"], op["entry"])
+                self.generation = op["generation"]
+
+    def load(self) -> bool:
+        """
+        Loads the saved snapshot and replays the change log on top of it.
+
+        Returns:
+            True if a compatible index was found and loaded, False otherwise.
+        """
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        if data.get("version") != INDEX_VERSION:
+            return False
+
+        self._reset()
+        self.manifest = Manifest.from_dict(data["manifest"])
+        self.chunks = CopyOnWriteDict({cid: {"file": fname, "start": start, "end": end, "heading": heading, "length": length}
+                                       for cid, fname, start, end, heading, length in data["chunks"]})
+        postings, chunk_terms = {}, {}
+        for term, plist in data["postings"].items():
+            term = sys.intern(term)
+            postings[term] = dict(plist)
+            for chunk_id, _ in plist:
+                chunk_terms.setdefault(chunk_id, []).append(term)
+        self.postings = CopyOnWriteDict(postings)
+        self.chunk_terms = CopyOnWriteDict({chunk_id: tuple(terms) for chunk_id, terms in chunk_terms.items()})
+        self.total_length = data["total_length"]
+        self.next_chunk_id = data["next_chunk_id"]
+        self.build_id = data["build_id"]
+        self.generation = data["generation"]
+        self._replay_log(self.generation)
+        self._added_ids, self._removed_ids = [], []
+        return True
+
+    def is_fresh(self) -> bool:
+        """
+        Checks, without modifying anything, whether the index still reflects the directory
+        contents, comparing the size and mtime of every file with the manifest.
+        """
+        return self.manifest.is_current(scan_directory(self.kb_dir))
+
+
+_INDEXES: dict[str, KnowledgeBaseIndex] = {}
+_UPDATE_LOCKS: dict[str, threading.Lock] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def _update_lock(key: str) -> threading.Lock:
+    with _INDEXES_LOCK:
+        return _UPDATE_LOCKS.setdefault(key, threading.Lock())
+
+
+def _load_or_build(key: str) -> KnowledgeBaseIndex:
+    index = KnowledgeBaseIndex(key)
+    if not index.load():
+        index.build()
+    return index
+
+
+def get_index(kb_dir: str, force_rebuild: bool = False, check_files: bool = False) -> KnowledgeBaseIndex:
+    """
+    Returns the index of a knowledge base directory, loading or building it on first use.
+
+    The index is cached per directory for the lifetime of the process. Cached indexes
+    are never modified: when the directory changes, a copy-on-write clone is updated
+    incrementally and then published in place of the old one, so a search that
+    already holds an index always sees a consistent snapshot.
+
+    The files are compared with the index whenever the directory changed, and at most
+    every FRESHNESS_CHECK_SECONDS otherwise, to notice files edited in place; files
+    written by the agent itself are indexed at once (see `update_file`).
+
+    Args:
+        kb_dir: The knowledge base directory.
+        force_rebuild: Rebuild the index from scratch even if it looks up to date.
+        check_files: Compare the files with the index now, even if they were compared recently.
+
+    Returns:
+        An up-to-date KnowledgeBaseIndex.
+    """
+    key = os.path.abspath(kb_dir)
+    index = _INDEXES.get(key)
+    if index is not None and not force_rebuild and not check_files and not index.needs_check():
+        return index
+
+    with _update_lock(key):
+        index = _INDEXES.get(key)
+        if force_rebuild:
+            index = KnowledgeBaseIndex(key)
+            index.build()
+        elif index is None:
+            index = _load_or_build(key)
+        if check_files or index.needs_check():
+            dir_mtime_ns = os.stat(key).st_mtime_ns
+            signatures = scan_directory(key)
+            if index.manifest.is_current(signatures):
+                # Nothing indexed changed; nothing to republish
+                index.mark_checked(dir_mtime_ns)
+            else:
+                index = index.copy()
+                index.refresh(signatures, dir_mtime_ns)
+        _INDEXES[key] = index
+        return index
+
+
+def update_file(kb_dir: str, filename: str, sha256: str | None = None) -> KnowledgeBaseIndex:
+    """
+    Indexes one file that was just written to (or removed from) a knowledge base directory,
+    without comparing the other files, and publishes the result like `get_index`.
+
+    Args:
+        kb_dir: The knowledge base directory.
+        filename: The name of the file in the directory.
+        sha256: The content hash of the file, if already known.
+
+    Returns:
+        The published KnowledgeBaseIndex, including the file.
+    """
+    key = os.path.abspath(kb_dir)
+    with _update_lock(key):
+        index = _INDEXES.get(key) or _load_or_build(key)
+        clone = index.copy()
+        if clone.update_file(filename, sha256):
+            index = clone
+        _INDEXES[key] = index
+        return index
+
+
+def get_index_if_loaded(kb_dir: str) -> KnowledgeBaseIndex | None:
+    """
+    Returns the currently published index of a directory without loading, building or refreshing it.
+
+    Args:
+        kb_dir: The knowledge base directory.
+
+    Returns:
+        The latest published KnowledgeBaseIndex, or None if none has been loaded in this process.
+    """
+    return _INDEXES.get(os.path.abspath(kb_dir))
+
+
+def find_duplicate(kb_dir: str, filepath: str, sha256: str | None = None) -> str | None:
+    """
+    Looks for a file in the knowledge base whose content is byte-identical to the given file.
+    The published index is used as it is, without comparing it with the files again.
+
+    Args:
+        kb_dir: The knowledge base directory.
+        filepath: The file to look for.
+        sha256: The content hash of the file, if already known.
+
+    Returns:
+        The name of the identical file in the knowledge base, or None.
+    """
+    index = get_index_if_loaded(kb_dir) or get_index(kb_dir)
+    return index.manifest.find_by_hash(sha256 or file_sha256(filepath))
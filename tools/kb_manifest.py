@@ -0,0 +1,149 @@
+import hashlib
+import os
+
+from tools.cow_dict import CopyOnWriteDict
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_sha256(filepath: str) -> str:
+    """
+    Computes the SHA-256 digest of a file, reading it in blocks.
+
+    Args:
+        filepath: The path of the file to hash.
+
+    Returns:
+        The hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_directory(kb_dir: str) -> dict[str, tuple[int, int]]:
+    """
+    Lists the .md files of a knowledge base with their size and modification time.
+    Only the directory entries are inspected, no file is read.
+
+    Args:
+        kb_dir: The knowledge base directory.
+
+    Returns:
+        A dict mapping file names to (size, mtime_ns).
+    """
+    signatures = {}
+    with os.scandir(kb_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".md") and entry.is_file():
+                stat = entry.stat()
+                signatures[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return signatures
+
+
+class Manifest:
+    """
+    Records which files of a knowledge base have been processed.
+
+    Each entry keeps the file's size, mtime, content hash and the ids of the chunks
+    created from it. Files whose content is byte-identical to an already processed
+    file are recorded with `duplicate_of` and no chunks of their own. The processed
+    files are also kept by content hash, so duplicates are found without a scan.
+
+    Entries must be changed through `set_entry` and `pop_entry`. Copies share their
+    contents (see `tools.cow_dict.CopyOnWriteDict`).
+    """
+    def __init__(self, entries: dict | None = None):
+        self.entries = CopyOnWriteDict(entries)
+        self.by_hash = CopyOnWriteDict({entry["sha256"]: filename for filename, entry in self.entries.items()
+                                        if not entry.get("duplicate_of")})
+
+    def copy(self) -> "Manifest":
+        clone = Manifest.__new__(Manifest)
+        clone.entries = self.entries.copy()
+        clone.by_hash = self.by_hash.copy()
+        return clone
+
+    def to_dict(self) -> dict:
+        return self.entries.to_dict()
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Manifest":
+        return cls(data)
+
+    def set_entry(self, filename: str, entry: dict):
+        """
+        Records (or replaces) the entry of a file.
+        """
+        if filename in self.entries:
+            self.pop_entry(filename)
+        self.entries[filename] = entry
+        if not entry.get("duplicate_of"):
+            self.by_hash[entry["sha256"]] = filename
+
+    def pop_entry(self, filename: str) -> dict:
+        """
+        Removes and returns the entry of a file.
+        """
+        entry = self.entries.pop(filename)
+        if self.by_hash.get(entry["sha256"]) == filename:
+            del self.by_hash[entry["sha256"]]
+        return entry
+
+    def find_by_hash(self, sha256: str) -> str | None:
+        """
+        Returns the name of a processed (non-duplicate) file with the given content hash, if any.
+        """
+        return self.by_hash.get(sha256)
+
+    def is_current(self, signatures: dict[str, tuple[int, int]]) -> bool:
+        """
+        Checks whether the manifest matches a directory scan without hashing anything.
+        """
+        if signatures.keys() != self.entries.keys():
+            return False
+        return all((entry["size"], entry["mtime_ns"]) == tuple(signatures[name])
+                   for name, entry in self.entries.items())
+
+    def plan(self, kb_dir: str, signatures: dict[str, tuple[int, int]] | None = None) -> dict:
+        """
+        Compares the manifest with the directory and classifies every file.
+
+        Files whose size and mtime are unchanged are trusted without reading them; other
+        files are hashed, so a file that was only touched is reported as `touched`
+        rather than `changed`.
+
+        Args:
+            kb_dir: The knowledge base directory.
+            signatures: A precomputed `scan_directory` result, to avoid scanning twice.
+
+        Returns:
+            A dict with the keys "added", "changed", "removed" and "touched", each a
+            sorted list of file names, and "hashes", mapping every hashed file to its digest.
+        """
+        if signatures is None:
+            signatures = scan_directory(kb_dir)
+        plan = {"added": [], "changed": [], "removed": [], "touched": [], "hashes": {}}
+
+        for filename in sorted(self.entries.keys() - signatures.keys()):
+            plan["removed"].append(filename)
+
+        for filename, (size, mtime_ns) in sorted(signatures.items()):
+            entry = self.entries.get(filename)
+            if entry is not None and (entry["size"], entry["mtime_ns"]) == (size, mtime_ns):
+                continue
+            try:
+                sha256 = file_sha256(os.path.join(kb_dir, filename))
+            except OSError as e:
+                print(f"Could not read file {os.path.join(kb_dir, filename)}: {e}")
+                continue
+            plan["hashes"][filename] = sha256
+            if entry is None:
+                plan["added"].append(filename)
+            elif entry["sha256"] == sha256:
+                plan["touched"].append(filename)
+            else:
+                plan["changed"].append(filename)
+        return plan
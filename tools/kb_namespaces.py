@@ -0,0 +1,146 @@
+import heapq
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# The files at the top of the knowledge base directory; every subdirectory is a namespace of its own
+DEFAULT_NAMESPACE = "default"
+# Namespace names are used as directory names
+_NAME_RE = re.compile(r"[\w-]+")
+# Shards searched at the same time by a fan-out search
+FANOUT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+def namespace_dir(kb_dir: str, namespace: str) -> str:
+    """
+    Returns the directory holding the files (and the index shard) of a namespace.
+    """
+    return kb_dir if namespace == DEFAULT_NAMESPACE else os.path.join(kb_dir, namespace)
+
+
+def list_namespaces(kb_dir: str) -> list[str]:
+    """
+    Lists the namespaces of a knowledge base: the default one, then its subdirectories by name.
+
+    Args:
+        kb_dir: The knowledge base directory.
+
+    Returns:
+        A list of namespace names, empty if the directory does not exist.
+    """
+    if not os.path.isdir(kb_dir):
+        return []
+    with os.scandir(kb_dir) as entries:
+        names = sorted(entry.name for entry in entries if entry.is_dir() and _NAME_RE.fullmatch(entry.name))
+    return [DEFAULT_NAMESPACE] + [name for name in names if name != DEFAULT_NAMESPACE]
+
+
+def create_namespace(kb_dir: str, name: str) -> tuple[str | None, str | None]:
+    """
+    Creates an empty namespace in a knowledge base.
+
+    Args:
+        kb_dir: The knowledge base directory.
+        name: The name of the new namespace (letters, digits, "_" and "-").
+
+    Returns:
+        A tuple containing a success message and an error message.
+    """
+    if not _NAME_RE.fullmatch(name) or name == DEFAULT_NAMESPACE:
+        return None, f"Error: Invalid namespace name '{name}'. Use letters, digits, '_' and '-' only."
+    path = namespace_dir(kb_dir, name)
+    if os.path.isdir(path):
+        return None, f"Error: Namespace '{name}' already exists."
+    try:
+        os.makedirs(path)
+    except Exception as e:
+        return None, f"Error: Could not create namespace '{name}'. Reason: {e}"
+    return f"Created namespace '{name}' at {path}.", None
+
+
+def resolve_namespaces(kb_dir: str, namespaces: list[str] | None) -> tuple[list[str] | None, str | None]:
+    """
+    Checks a selection of namespaces against the knowledge base.
+
+    Args:
+        kb_dir: The knowledge base directory.
+        namespaces: The namespaces to search, or None (or an empty list) for all of them.
+
+    Returns:
+        A tuple containing the list of namespaces and an error message.
+    """
+    available = list_namespaces(kb_dir)
+    if not namespaces:
+        return available, None
+    unknown = [name for name in namespaces if name not in available]
+    if unknown:
+        return None, f"Error: Unknown namespace(s) {', '.join(unknown)}. Available: {', '.join(available)}."
+    return list(dict.fromkeys(namespaces)), None
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="kb-fanout")
+        return _POOL
+
+
+def normalize_scores(matches: list[dict]) -> list[dict]:
+    """
+    Divides the scores of one shard's matches (best first) by the best of them, in place.
+
+    Scores that only mean something within a shard, such as BM25 scores (which depend on
+    the shard's term statistics), then range from 0 to 1 in every shard and can be merged.
+
+    Returns:
+        The same list.
+    """
+    best = matches[0]["score"] if matches else 0
+    if best > 0:
+        for match in matches:
+            match["score"] = round(match["score"] / best, 2)
+    return matches
+
+
+def fan_out(search_shard, kb_dir: str, namespaces: list[str], normalize: bool = True) -> list[dict]:
+    """
+    Runs a search on the index shard of every given namespace and merges the results.
+
+    A single namespace is searched on the calling thread, so a narrow search costs
+    exactly one shard. Several are searched in parallel on a shared thread pool; chunk
+    reads, faiss searches and the fuzzy scoring process pool run outside the GIL, so
+    the shards of a wide search overlap instead of adding up.
+
+    Args:
+        search_shard: Called with the directory of a shard; returns its matches, best first.
+        kb_dir: The knowledge base directory.
+        namespaces: The namespaces to search (see `resolve_namespaces`).
+        normalize: Whether the scores of several shards are normalized (see `normalize_scores`)
+            before they are merged. Only pass False for scores that are comparable across
+            shards, such as fuzzy scores or cosine similarities.
+
+    Returns:
+        The matches of all shards, best first, each with its "namespace". The "filepath"
+        of matches outside the default namespace is prefixed with the namespace.
+    """
+    if len(namespaces) == 1:
+        shard_results = [search_shard(namespace_dir(kb_dir, namespaces[0]))]
+    else:
+        pool = _get_pool()
+        futures = [pool.submit(search_shard, namespace_dir(kb_dir, name)) for name in namespaces]
+        shard_results = [future.result() for future in futures]
+
+    for name, matches in zip(namespaces, shard_results):
+        if normalize and len(namespaces) > 1:
+            normalize_scores(matches)
+        for match in matches:
+            match["namespace"] = name
+            if name != DEFAULT_NAMESPACE:
+                match["filepath"] = f"{name}/{match['filepath']}"
+    return list(heapq.merge(*shard_results, key=lambda match: match["score"], reverse=True))
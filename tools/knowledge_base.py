@@ -1,18 +1,100 @@
-
 import os
-from thefuzz import fuzz
-from langchain.tools import tool
+from langchain_core.tools import tool
+
+from tools.fuzzy_search import get_scorer
+from tools.kb_index import get_index
+from tools.kb_namespaces import fan_out, resolve_namespaces
+from tools.snippets import DEFAULT_TOP_K, format_results
+
+# Number of BM25 candidates handed to the fuzzy re-ranker at a time
+RERANK_CANDIDATES = 50
+
+def find_matches(query: str, knowledge_base_dir: str, score_cutoff: int = 80, rerank: bool = True, exhaustive: bool = False,
+                 min_results: int = 0) -> list[dict]:
+    """
+    Returns every knowledge base paragraph matching the query, best first.
+
+    Candidate paragraphs are retrieved from a persistent BM25 index and then re-ranked
+    with fuzzy string matching (see `search_knowledge_base` for the arguments). The BM25
+    candidates are re-ranked in blocks of RERANK_CANDIDATES, each block ranked after the
+    one before, until there are `min_results` matches or no candidates left; fetching
+    more blocks for a later page therefore never reorders the matches of earlier pages.
+
+    Returns:
+        A list of {"filepath", "heading", "paragraph", "score"} dicts.
+    """
+    index = get_index(knowledge_base_dir)
+    if exhaustive:
+        # The paragraphs are streamed from the files; only their prefilter data stays in memory between queries
+        scorer = get_scorer(knowledge_base_dir, index.build_id)
+        scored = scorer.score_corpus(query, index.chunk_ids_in_file_order(), index.chunk_texts,
+                                     score_cutoff=score_cutoff, corpus_id=(index.build_id, index.generation))
+        texts = index.chunk_texts(chunk_id for chunk_id, _ in scored)
+        matches = [{
+            "filepath": index.chunks[chunk_id]["file"],
+            "heading": index.chunks[chunk_id]["heading"],
+            "paragraph": texts[chunk_id],
+            "score": score
+        } for chunk_id, score in scored]
+    elif rerank:
+        # Use partial_ratio for better matching of phrases within larger paragraphs
+        scorer = get_scorer(knowledge_base_dir, index.build_id)
+        matches, pool = [], RERANK_CANDIDATES
+        while True:
+            candidates = index.search(query, top_k=pool)
+            by_id = {candidate["chunk_id"]: candidate for candidate in candidates[pool - RERANK_CANDIDATES:]}
+            scored = scorer.score(query, [(cid, c["paragraph"]) for cid, c in by_id.items()], score_cutoff=score_cutoff)
+            block = [{
+                "filepath": by_id[chunk_id]["filepath"],
+                "heading": by_id[chunk_id]["heading"],
+                "paragraph": by_id[chunk_id]["paragraph"],
+                "score": score
+            } for chunk_id, score in scored]
+            block.sort(key=lambda x: x['score'], reverse=True)
+            matches.extend(block)
+            if len(candidates) < pool or len(matches) >= min_results:
+                return matches
+            pool += RERANK_CANDIDATES
+    else:
+        candidates = index.search(query, top_k=RERANK_CANDIDATES)
+        matches = [{
+            "filepath": candidate["filepath"],
+            "heading": candidate["heading"],
+            "paragraph": candidate["paragraph"],
+            "score": round(candidate["score"], 2)
+        } for candidate in candidates]
+
+    # Sort matches by score, highest first
+    matches.sort(key=lambda x: x['score'], reverse=True)
+    return matches
 
 @tool
-def search_knowledge_base(query: str, knowledge_base_dir: str = "knowledge_base", score_cutoff: int = 80) -> str:
+def search_knowledge_base(query: str, knowledge_base_dir: str = "knowledge_base", score_cutoff: int = 80, rerank: bool = True,
+                          exhaustive: bool = False, top_k: int = DEFAULT_TOP_K, cursor: int = 0,
+                          namespaces: list[str] | None = None) -> str:
     """
-    Searches through all .md files in a directory using fuzzy string matching
-    and returns paragraphs that are similar to the query.
+    Searches through all .md files in a directory and returns paragraphs that are similar to the query.
+    Candidate paragraphs are retrieved from a persistent BM25 index and then re-ranked
+    with fuzzy string matching. Only the best results are shown, each cut down to the
+    text around its best match; if more are available, the output ends with a cursor
+    to pass in another call to read them.
+
+    The knowledge base is divided into namespaces (one per project or topic), each with
+    its own index; the selected namespaces are searched in parallel and their results
+    merged into one ranking (without re-ranking, the BM25 scores of each namespace are
+    first divided by its best score).
 
     Args:
         query: The string to search for.
         knowledge_base_dir: The directory containing the knowledge base files.
-        score_cutoff: The minimum similarity score (0-100) to consider a match.
+        score_cutoff: The minimum fuzzy similarity score (0-100) to consider a match. Ignored when only the BM25 ranking is used.
+        rerank: Whether to re-rank the BM25 candidates with fuzzy matching. If False, the BM25 ranking is returned as is.
+        exhaustive: Score every paragraph with fuzzy matching instead of only the BM25 candidates.
+            Slower, but also finds paragraphs that share no whole word with the query.
+        top_k: The maximum number of results to return.
+        cursor: The cursor given at the end of a previous result, to get the results that follow it.
+        namespaces: The namespaces to search, e.g. ["default", "wound-healing"]. By default, the
+            namespaces selected for this session, or all of them.
 
     Returns:
         A formatted string containing the search results, or a message if no results were found.
@@ -20,39 +102,13 @@ def search_knowledge_base(query: str, knowledge_base_dir: str = "knowledge_base"
     if not os.path.isdir(knowledge_base_dir):
         return f"Error: Knowledge base directory not found at '{knowledge_base_dir}'"
 
-    matches = []
-    for filename in os.listdir(knowledge_base_dir):
-        if filename.endswith(".md"):
-            filepath = os.path.join(knowledge_base_dir, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    # Split content into paragraphs based on blank lines
-                    paragraphs = f.read().split('\n\n')
-                    for para in paragraphs:
-                        if not para.strip():
-                            continue
-                        # Use partial_ratio for better matching of phrases within larger paragraphs
-                        score = fuzz.partial_ratio(query.lower(), para.lower())
-                        if score >= score_cutoff:
-                            matches.append({
-                                "filepath": filename,
-                                "paragraph": para.strip(),
-                                "score": score
-                            })
-            except Exception as e:
-                print(f"Could not read file {filepath}: {e}")
-
-    if not matches:
-        return "No relevant information found in the knowledge base."
-
-    # Sort matches by score, highest first
-    matches.sort(key=lambda x: x['score'], reverse=True)
-
-    # Format the results
-    results_str = f"Found {len(matches)} relevant snippet(s) for '{query}':\n"
-    for match in matches:
-        results_str += f"\n--- From: {match['filepath']} (Similarity Score: {match['score']}) ---\n"
-        results_str += match['paragraph']
-        results_str += "\n"
-    
-    return results_str
+    shards, error_msg = resolve_namespaces(knowledge_base_dir, namespaces)
+    if error_msg:
+        return error_msg
+    # Fuzzy scores are comparable across shards; BM25 scores only within one, so they are normalized per shard
+    # Enough re-ranked matches for this page and the cursor of the next, with room for near-duplicates
+    min_results = 2 * (cursor + top_k) + 1
+    matches = fan_out(lambda shard_dir: find_matches(query, shard_dir, score_cutoff=score_cutoff, rerank=rerank,
+                                                     exhaustive=exhaustive, min_results=min_results),
+                      knowledge_base_dir, shards, normalize=not (rerank or exhaustive))
+    return format_results(query, matches, top_k=top_k, cursor=cursor)
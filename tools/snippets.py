@@ -0,0 +1,184 @@
+from tools.tokens import TOKEN_RE, estimate_tokens, tokenize
+
+# Results shown per call, and the token budget of the whole tool output
+DEFAULT_TOP_K = 5
+RESULT_TOKEN_BUDGET = 1500
+# Characters of a paragraph shown around its best match; shorter paragraphs are shown whole
+SNIPPET_CHARS = 400
+# Longest span quoted on the "Best match:" line
+BEST_MATCH_CHARS = 120
+# Two snippets sharing at least this share of their terms are near-duplicates; only the better one is shown
+DUPLICATE_SIMILARITY = 0.9
+
+ELLIPSIS = "…"
+# Tokens kept aside for the closing notes (omitted duplicates, next cursor)
+_FOOTER_TOKENS = 40
+
+# A word shares a stem with a query term when they agree on this many leading characters
+_STEM_CHARS = 5
+
+
+def _matches_term(word: str, terms: set[str]) -> str | None:
+    """
+    Returns the query term a lowercase word matches, exactly or by a shared stem ("waves" for "wave").
+    """
+    if word in terms:
+        return word
+    for term in terms:
+        length = min(len(term), len(word), _STEM_CHARS)
+        if length >= 4 and word[:length] == term[:length]:
+            return term
+    return None
+
+
+def best_span(text: str, query: str, width: int = SNIPPET_CHARS) -> tuple[int, int] | None:
+    """
+    Finds the part of a paragraph that matches the query best.
+
+    The best cluster of query-term occurrences is the one that fits in `width` characters
+    and covers the most distinct terms (then the most occurrences); the span returned is
+    the shortest stretch of it that still covers all of those terms.
+
+    Returns:
+        The (start, end) character offsets of the span, or None if no query term occurs.
+    """
+    terms = set(tokenize(query))
+    hits = []
+    for match in TOKEN_RE.finditer(text):
+        term = _matches_term(match.group().lower(), terms)
+        if term is not None:
+            hits.append((match.start(), match.end(), term))
+    if not hits:
+        return None
+
+    best, best_key, j = (0, 0), None, 0
+    for i in range(len(hits)):
+        j = max(j, i)
+        while j + 1 < len(hits) and hits[j + 1][1] - hits[i][0] <= width:
+            j += 1
+        key = (len({term for _, _, term in hits[i:j + 1]}), j - i + 1)
+        if best_key is None or key > best_key:
+            best, best_key = (i, j), key
+
+    # The shortest run of hits, inside the best cluster, that has all of its distinct terms
+    cluster = hits[best[0]:best[1] + 1]
+    wanted = best_key[0]
+    span = (cluster[0][0], cluster[-1][1])
+    for i in range(len(cluster)):
+        seen = set()
+        for j in range(i, len(cluster)):
+            seen.add(cluster[j][2])
+            if len(seen) == wanted:
+                if cluster[j][1] - cluster[i][0] < span[1] - span[0]:
+                    span = (cluster[i][0], cluster[j][1])
+                break
+    return span
+
+
+def snippet_window(text: str, query: str, width: int = SNIPPET_CHARS) -> tuple[str, str | None]:
+    """
+    Cuts a paragraph down to about `width` characters around its best match.
+
+    The window is cut between words and marked with an ellipsis where text was left out;
+    the text itself is not altered, so it can be quoted as is.
+
+    Returns:
+        A (window, best_match) tuple; `best_match` is the quoted best-matching span, or
+        None if no query term occurs in the paragraph.
+    """
+    text = text.strip()
+    span = best_span(text, query, width)
+    best_match = None
+    if span is not None:
+        best_match = text[span[0]:span[1]]
+        if len(best_match) > BEST_MATCH_CHARS:
+            best_match = best_match[:BEST_MATCH_CHARS].rsplit(" ", 1)[0] + ELLIPSIS
+    if len(text) <= width:
+        return text, best_match
+
+    center = (span[0] + span[1]) // 2 if span is not None else 0
+    start = max(0, min(center - width // 2, len(text) - width))
+    end = start + width
+    if start > 0:
+        space = text.find(" ", start, start + width // 4)
+        start = space + 1 if space != -1 else start
+    if end < len(text):
+        space = text.rfind(" ", end - width // 4, end)
+        end = space if space != -1 else end
+    window = text[start:end].strip()
+    return (ELLIPSIS if start > 0 else "") + window + (ELLIPSIS if end < len(text) else ""), best_match
+
+
+def _is_duplicate(terms: set[str], shown: list[set[str]]) -> bool:
+    for other in shown:
+        union = len(terms | other)
+        if union and len(terms & other) / union >= DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+
+def format_results(query: str, matches: list[dict], top_k: int = DEFAULT_TOP_K, cursor: int = 0,
+                   max_tokens: int = RESULT_TOKEN_BUDGET, score_format: str = "{}") -> str:
+    """
+    Formats ranked search matches into a tool output of bounded size.
+
+    Only the `top_k` best results from `cursor` on are shown, each as a window around
+    its best match, and only while they fit in `max_tokens`. Snippets that nearly repeat
+    a better one are skipped, and not counted in the header. When more results remain,
+    the output ends with the cursor to pass to get them; cursors count distinct
+    snippets, so paging never repeats one.
+
+    Args:
+        query: The search query.
+        matches: {"filepath", "heading", "paragraph", "score"} dicts, best first.
+        top_k: The maximum number of results to show.
+        cursor: The number of (distinct) results already shown by previous calls.
+        max_tokens: The token budget of the whole output.
+        score_format: The format of the scores in the result headers.
+
+    Returns:
+        The formatted results, or a message if there are none.
+    """
+    if not matches:
+        return "No relevant information found in the knowledge base."
+
+    distinct, shown, skipped = [], [], 0
+    for match in matches:
+        window, best_match = snippet_window(match["paragraph"], query)
+        terms = set(tokenize(window))
+        if _is_duplicate(terms, shown):
+            skipped += len(distinct) >= cursor
+            continue
+        shown.append(terms)
+        distinct.append((match, window, best_match))
+
+    header = f"Found {len(distinct)} relevant snippet(s) for '{query}':\n"
+    budget = max_tokens - estimate_tokens(header) - _FOOTER_TOKENS
+    parts, more = [], False
+    for match, window, best_match in distinct[cursor:]:
+        if len(parts) == top_k:
+            more = True
+            break
+
+        part = f"\n--- From: {match['filepath']} (Similarity Score: {score_format.format(match['score'])}) ---\n"
+        if match["heading"]:
+            part += f"[Section: {match['heading']}]\n"
+        if best_match is not None and best_match != window:
+            part += f"Best match: \"{best_match}\"\n"
+        part += window + "\n"
+        cost = estimate_tokens(part)
+        if cost > budget and parts:  # The first result is always shown; its window bounds its size
+            more = True
+            break
+        parts.append(part)
+        budget -= cost
+
+    footer = ""
+    if skipped:
+        footer += f"\n({skipped} near-duplicate snippet(s) omitted.)"
+    if more:
+        footer += (f"\n[Showing results {cursor + 1}-{cursor + len(parts)}. "
+                   f"More results are available: call again with cursor={cursor + len(parts)}.]")
+    if not parts:
+        return header + f"\nNo more results after cursor={cursor}."
+    return header + "".join(parts) + footer
@@ -0,0 +1,33 @@
+import re
+
+# CJK characters are indexed one by one, everything else as runs of word characters
+TOKEN_RE = re.compile(r"[一-鿿]|\w+")
+# CJK characters are roughly one model token each; other text averages about four characters per token
+_CJK_RE = re.compile(r"[一-鿿]")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits text into lowercase index terms.
+
+    Args:
+        text: The text to tokenize.
+
+    Returns:
+        A list of terms, in order of appearance.
+    """
+    return TOKEN_RE.findall(text.lower())
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in a text without needing a tokenizer download.
+
+    Args:
+        text: The text to measure.
+
+    Returns:
+        An approximate token count.
+    """
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
@@ -0,0 +1,439 @@
+import json
+import os
+import threading
+import uuid
+
+import faiss
+import numpy as np
+from langchain_core.tools import tool
+
+from tools.kb_index import INDEX_DIRNAME, get_index
+from tools.kb_namespaces import fan_out, resolve_namespaces
+from tools.snippets import format_results
+
+VECTOR_INDEX_FILENAME = "vectors.faiss"
+VECTOR_DELTA_FILENAME = "vectors.delta.faiss"
+VECTOR_META_FILENAME = "vectors.json"
+VECTOR_DELTA_META_FILENAME = "vectors.delta.json"
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+# Below this many paragraphs an IVF index cannot be trained meaningfully, so a flat index is used
+IVF_MIN_VECTORS = 1024
+IVF_NPROBE = 8
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+
+# Pending delta vectors and tombstones are merged into a new base index past this share of it
+DELTA_COMPACT_RATIO = 0.1
+DELTA_COMPACT_MIN = 256
+# Paragraphs read and embedded at a time when building the base index
+EMBED_BATCH_SIZE = 1000
+
+# Odd 64-bit multipliers used to hash character n-grams
+_NGRAM_PRIMES = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                          0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD], dtype=np.uint64)
+
+
+def _write_json(path: str, data: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class HashingEmbedder:
+    """
+    An offline, deterministic embedder based on hashed character n-gram counts.
+
+    Every n-gram of the lowercased text is hashed into one of `dim` buckets with a
+    pseudo-random sign (the "hashing trick"); counts are square-rooted and the vector
+    is L2-normalized so that inner product equals cosine similarity.
+
+    Any object exposing `name`, `dim` and `embed(texts) -> np.ndarray` can be used
+    in its place (see `configure_vector_search`).
+    """
+    def __init__(self, dim: int = 512, ngram_sizes: tuple[int, ...] = (3, 4, 5)):
+        if max(ngram_sizes) > len(_NGRAM_PRIMES):
+            raise ValueError(f"n-grams longer than {len(_NGRAM_PRIMES)} characters are not supported")
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+        self.name = f"hashing-{dim}-{'-'.join(map(str, ngram_sizes))}"
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        normalized = " " + " ".join(text.lower().split()) + " "
+        codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        with np.errstate(over="ignore"):
+            for n in self.ngram_sizes:
+                if len(codes) < n:
+                    continue
+                hashes = np.zeros(len(codes) - n + 1, dtype=np.uint64)
+                for offset in range(n):
+                    hashes += codes[offset:len(codes) - n + 1 + offset] * _NGRAM_PRIMES[offset]
+                hashes ^= hashes >> np.uint64(31)
+                hashes *= _NGRAM_PRIMES[-1]
+                buckets = (hashes % np.uint64(self.dim)).astype(np.int64)
+                signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+                vector += np.bincount(buckets, weights=signs, minlength=self.dim).astype(np.float32)
+        vector = np.sign(vector) * np.sqrt(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Embeds a batch of texts.
+
+        Args:
+            texts: The texts to embed.
+
+        Returns:
+            A float32 array of shape (len(texts), dim) with L2-normalized rows.
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self._embed_one(text) for text in texts])
+
+
+def _new_faiss_index(index_type: str, dim: int, vectors: np.ndarray) -> faiss.Index:
+    """
+    Creates (and trains, if needed) an empty inner-product faiss index that accepts explicit ids.
+    """
+    if index_type == "ivf" and len(vectors) >= IVF_MIN_VECTORS:
+        nlist = max(1, min(int(4 * np.sqrt(len(vectors))), len(vectors) // 39))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        return index
+    if index_type == "hnsw":
+        return faiss.IndexIDMap2(faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT))
+    return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+
+class VectorIndex:
+    """
+    A dense-vector index over the paragraphs of a knowledge base directory.
+
+    Paragraphs and their ids come from the BM25 index (`tools.kb_index`), so both
+    retrieval modes agree on what a paragraph is. The bulk of the vectors lives in a
+    base faiss index, `<kb_dir>/.index/vectors.faiss`, which is memory-mapped when
+    loaded. Incremental updates go to a small in-memory delta index and removed
+    paragraphs are tombstoned; both are merged into a new base once they grow past
+    a fraction of it. The ids of the base vectors are only written when the base is;
+    an update writes the delta and its ids, so it costs what changed, not the corpus.
+    """
+    def __init__(self, kb_dir: str, embedder=None, index_type: str = "flat"):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+        self.kb_dir = kb_dir
+        self.embedder = embedder or HashingEmbedder()
+        self.index_type = index_type
+        self.index = None
+        self.delta = None
+        self.base_id = None       # identifies one base index, which its delta refers to
+        self.base_ids = frozenset()  # chunk ids in the base index, shared by copies
+        self.delta_ids = set()
+        self.deleted = set()      # chunk ids still present in the base index but no longer live
+        self.kb_version = None    # (build_id, generation) of the BM25 index the vectors reflect
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.kb_dir, INDEX_DIRNAME, VECTOR_INDEX_FILENAME)
+
+    @property
+    def delta_path(self) -> str:
+        return os.path.join(self.kb_dir, INDEX_DIRNAME, VECTOR_DELTA_FILENAME)
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.kb_dir, INDEX_DIRNAME, VECTOR_META_FILENAME)
+
+    @property
+    def delta_meta_path(self) -> str:
+        return os.path.join(self.kb_dir, INDEX_DIRNAME, VECTOR_DELTA_META_FILENAME)
+
+    @property
+    def chunk_ids(self) -> set:
+        """
+        Every live chunk id covered by the base or the delta index.
+        """
+        return (self.base_ids - self.deleted) | self.delta_ids
+
+    def copy(self) -> "VectorIndex":
+        """
+        Returns a clone that shares the read-only base index but owns its delta index,
+        so it can be updated while the original keeps serving searches.
+        """
+        clone = VectorIndex(self.kb_dir, embedder=self.embedder, index_type=self.index_type)
+        clone.index = self.index
+        clone.delta = faiss.clone_index(self.delta)
+        clone.base_id = self.base_id
+        clone.base_ids = self.base_ids
+        clone.delta_ids = set(self.delta_ids)
+        clone.deleted = set(self.deleted)
+        clone.kb_version = self.kb_version
+        return clone
+
+    def _new_delta(self) -> faiss.Index:
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.embedder.dim))
+
+    def build(self):
+        """
+        Embeds every paragraph of the knowledge base and builds a new base index.
+        """
+        kb = get_index(self.kb_dir)
+        # Texts are read from the files and embedded a batch at a time; only the vectors are kept
+        chunk_ids, batches = [], []
+        for texts in kb.iter_chunk_texts(EMBED_BATCH_SIZE):
+            chunk_ids.extend(texts)
+            batches.append(self.embedder.embed(list(texts.values())))
+        vectors = np.vstack(batches) if batches else np.zeros((0, self.embedder.dim), dtype=np.float32)
+        chunk_ids = np.array(chunk_ids, dtype=np.int64)
+        self.index = _new_faiss_index(self.index_type, self.embedder.dim, vectors)
+        if len(chunk_ids):
+            self.index.add_with_ids(vectors, chunk_ids)
+        self.delta = self._new_delta()
+        self.base_id = uuid.uuid4().hex
+        self.base_ids = frozenset(chunk_ids.tolist())
+        self.delta_ids = set()
+        self.deleted = set()
+        self.kb_version = [kb.build_id, kb.generation]
+
+    def update(self):
+        """
+        Embeds only the paragraphs added to the BM25 index since the last update and
+        tombstones the removed ones. Falls back to a full rebuild when the BM25 index
+        was rebuilt or the pending changes outgrow the base index.
+        """
+        kb = get_index(self.kb_dir)
+        if self.kb_version is None or self.kb_version[0] != kb.build_id:
+            self.build()
+            self.save()
+            return
+
+        changes = kb.changes_since(self.kb_version[1])
+        if changes is None:
+            # Too many updates ago to replay: compare every chunk id
+            live, covered = set(kb.chunks), self.chunk_ids
+            changes = (live - covered, covered - live)
+        added, removed = sorted(changes[0]), changes[1]
+
+        removed_from_delta = removed & self.delta_ids
+        if removed_from_delta:
+            self.delta.remove_ids(np.array(sorted(removed_from_delta), dtype=np.int64))
+            self.delta_ids -= removed_from_delta
+        self.deleted |= removed - removed_from_delta
+        if added:
+            texts = kb.chunk_texts(added)
+            vectors = self.embedder.embed([texts[cid] for cid in added])
+            self.delta.add_with_ids(vectors, np.array(added, dtype=np.int64))
+            self.delta_ids.update(added)
+        self.kb_version = [kb.build_id, kb.generation]
+
+        pending = len(self.delta_ids) + len(self.deleted)
+        if pending > max(DELTA_COMPACT_MIN, DELTA_COMPACT_RATIO * self.index.ntotal):
+            self.build()
+            self.save()
+        else:
+            self._save_delta()
+
+    def save(self):
+        """
+        Writes the base index, the delta index and their metadata to disk atomically.
+        """
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_index_path = self.index_path + ".tmp"
+        faiss.write_index(self.index, tmp_index_path)
+        os.replace(tmp_index_path, self.index_path)
+        meta = {"embedder": self.embedder.name, "dim": self.embedder.dim, "index_type": self.index_type,
+                "base_id": self.base_id, "base_ids": sorted(self.base_ids)}
+        _write_json(self.meta_path, meta)
+        self._save_delta()
+
+    def _save_delta(self):
+        tmp_delta_path = self.delta_path + ".tmp"
+        faiss.write_index(self.delta, tmp_delta_path)
+        os.replace(tmp_delta_path, self.delta_path)
+        meta = {"base_id": self.base_id, "kb_version": self.kb_version,
+                "delta_ids": sorted(self.delta_ids), "deleted": sorted(self.deleted)}
+        _write_json(self.delta_meta_path, meta)
+
+    def load(self) -> bool:
+        """
+        Memory-maps a previously saved index if it was built with the same embedder and index type.
+
+        Returns:
+            True if the index was loaded, False otherwise.
+        """
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self.delta_meta_path, 'r', encoding='utf-8') as f:
+                delta_meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        if (meta.get("embedder") != self.embedder.name or meta.get("dim") != self.embedder.dim
+                or meta.get("index_type") != self.index_type or "base_id" not in meta
+                or delta_meta.get("base_id") != meta["base_id"]):
+            return False
+        try:
+            self.index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            self.delta = faiss.read_index(self.delta_path)
+        except RuntimeError:
+            self.index = self.delta = None
+            return False
+        self.base_id = meta["base_id"]
+        self.base_ids = frozenset(meta["base_ids"])
+        self.kb_version = delta_meta["kb_version"]
+        self.delta_ids = set(delta_meta["delta_ids"])
+        self.deleted = set(delta_meta["deleted"])
+        return True
+
+    def is_fresh(self) -> bool:
+        """
+        Checks whether the vectors reflect the current state of the BM25 index.
+        """
+        kb = get_index(self.kb_dir)
+        return self.kb_version == [kb.build_id, kb.generation]
+
+    def search(self, query: str, top_k: int = 5) -> list[dict]:
+        """
+        Returns the paragraphs whose embeddings are closest to the query embedding.
+
+        Args:
+            query: The free-text query.
+            top_k: The maximum number of paragraphs to return.
+
+        Returns:
+            A list of {"chunk_id", "filepath", "paragraph", "score"} dicts, best first,
+            where score is the cosine similarity.
+        """
+        if self.index is None:
+            return []
+        query_vector = self.embedder.embed([query])
+        if self.index_type == "ivf" and isinstance(self.index, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(nprobe=IVF_NPROBE)
+        elif self.index_type == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=max(HNSW_EF_SEARCH, top_k + len(self.deleted)))
+        else:
+            params = None
+
+        hits = []
+        if self.index.ntotal:
+            # Ask for extra neighbours so that tombstoned ones do not shrink the result
+            base_k = min(top_k + len(self.deleted), self.index.ntotal)
+            scores, ids = self.index.search(query_vector, base_k, params=params)
+            hits.extend((int(cid), float(score)) for cid, score in zip(ids[0], scores[0])
+                        if cid >= 0 and cid not in self.deleted)
+        if self.delta.ntotal:
+            scores, ids = self.delta.search(query_vector, min(top_k, self.delta.ntotal))
+            hits.extend((int(cid), float(score)) for cid, score in zip(ids[0], scores[0]) if cid >= 0)
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+
+        kb = get_index(self.kb_dir)
+        hits = [(chunk_id, score) for chunk_id, score in hits[:top_k] if chunk_id in kb.chunks]
+        texts = kb.chunk_texts(chunk_id for chunk_id, _ in hits)
+        return [{"chunk_id": chunk_id, "filepath": kb.chunks[chunk_id]["file"], "heading": kb.chunks[chunk_id]["heading"],
+                 "paragraph": texts[chunk_id], "score": score} for chunk_id, score in hits]
+
+
+_EMBEDDER = None
+_INDEX_TYPE = "flat"
+_VECTOR_INDEXES: dict[str, VectorIndex] = {}
+_VECTOR_UPDATE_LOCKS: dict[str, threading.Lock] = {}
+_VECTOR_INDEXES_LOCK = threading.Lock()
+
+
+def configure_vector_search(embedder=None, index_type: str | None = None):
+    """
+    Sets the embedder and/or faiss index type used by `semantic_search_knowledge_base`.
+    Cached indexes are dropped so that the next search loads or rebuilds with the new settings.
+
+    Args:
+        embedder: An object with `name`, `dim` and `embed(texts)`; None keeps the current one.
+        index_type: One of "flat", "ivf" or "hnsw"; None keeps the current one.
+    """
+    global _EMBEDDER, _INDEX_TYPE
+    if index_type is not None and index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+    with _VECTOR_INDEXES_LOCK:
+        if embedder is not None:
+            _EMBEDDER = embedder
+        if index_type is not None:
+            _INDEX_TYPE = index_type
+        _VECTOR_INDEXES.clear()
+
+
+def get_vector_index(kb_dir: str) -> VectorIndex:
+    """
+    Returns the vector index of a knowledge base directory, loading or building it on first use.
+    Like `tools.kb_index.get_index`, a cached index is never modified in place.
+
+    Args:
+        kb_dir: The knowledge base directory.
+
+    Returns:
+        A VectorIndex in sync with the BM25 index of the directory.
+    """
+    global _EMBEDDER
+    key = os.path.abspath(kb_dir)
+    with _VECTOR_INDEXES_LOCK:
+        if _EMBEDDER is None:
+            _EMBEDDER = HashingEmbedder()
+        settings = (_EMBEDDER, _INDEX_TYPE)
+        update_lock = _VECTOR_UPDATE_LOCKS.setdefault(key, threading.Lock())
+
+    # Only searches of the same directory wait for a build or an update
+    with update_lock:
+        index = _VECTOR_INDEXES.get(key)
+        if index is None or (index.embedder, index.index_type) != settings:
+            index = VectorIndex(key, embedder=settings[0], index_type=settings[1])
+            index.load()
+        if index.index is None:
+            index.build()
+            index.save()
+        elif not index.is_fresh():
+            # Update a clone and publish it, so concurrent searches keep a consistent index
+            index = index.copy()
+            index.update()
+        with _VECTOR_INDEXES_LOCK:
+            if (_EMBEDDER, _INDEX_TYPE) == settings:  # Not reconfigured in the meantime
+                _VECTOR_INDEXES[key] = index
+        return index
+
+
+def get_vector_index_if_loaded(kb_dir: str) -> VectorIndex | None:
+    """
+    Returns the currently published vector index of a directory without loading or updating it.
+    """
+    return _VECTOR_INDEXES.get(os.path.abspath(kb_dir))
+
+
+@tool
+def semantic_search_knowledge_base(query: str, knowledge_base_dir: str = "knowledge_base", top_k: int = 5,
+                                   namespaces: list[str] | None = None) -> str:
+    """
+    Searches the knowledge base by meaning rather than exact wording, using vector embeddings.
+    Use this when a keyword search finds nothing or the question is phrased differently
+    from the source text. Long paragraphs are cut down to the text around their best match.
+
+    Args:
+        query: A natural-language description of the information you are looking for.
+        knowledge_base_dir: The directory containing the knowledge base files.
+        top_k: The number of most similar paragraphs to return.
+        namespaces: The knowledge base namespaces to search, e.g. ["default", "wound-healing"].
+            By default, the namespaces selected for this session, or all of them.
+
+    Returns:
+        A formatted string containing the search results, or a message if no results were found.
+    """
+    if not os.path.isdir(knowledge_base_dir):
+        return f"Error: Knowledge base directory not found at '{knowledge_base_dir}'"
+
+    shards, error_msg = resolve_namespaces(knowledge_base_dir, namespaces)
+    if error_msg:
+        return error_msg
+    # Each shard returns its own top k; cosine similarities rank them together as they are
+    matches = fan_out(lambda shard_dir: get_vector_index(shard_dir).search(query, top_k=top_k), knowledge_base_dir, shards,
+                      normalize=False)
+    return format_results(query, matches, top_k=top_k, score_format="{:.2f}")